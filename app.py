@@ -320,6 +320,10 @@ def get_model_param_details(metrics_dict):
         ic2v.ANALOGY_ACC_KEY,
         ic2v.DETAILED_ANALOGY_KEY,
         ic2v.CONTEXTS_PATH_KEY,
+        ic2v.TRAINING_SECONDS_KEY,
+        ic2v.COLD_START_ANALOGY_ACC_KEY,
+        ic2v.COLD_START_TRAINING_SECONDS_KEY,
+        *ic2v.TELEMETRY_SUMMARY_KEYS,
     ]
     num_users = tmp_dict.pop(ic2v.NUM_USERS_KEY)
     max_comments = tmp_dict.pop(ic2v.MAX_COMMENTS_KEY)
@@ -377,8 +381,8 @@ def load_vector_model(selected_month):
     """
     logger.info("Selected month: %s", selected_month)
     current_model_path = pathlib.Path(MODEL_DIRS[selected_month])
-    c2v_model = ic2v.GensimCommunity2Vec.load(current_model_path)
-    logger.info("Community2Vec model loaded from %s", current_model_path)
+    c2v_model = ic2v.load_vectors(current_model_path)
+    logger.info("Community2Vec vectors loaded from %s", current_model_path)
 
     sorted_subreddits = sorted(c2v_model.get_index_to_key())
 
@@ -419,12 +423,12 @@ def train_clusters(n_clicks, n_clusters, random_seed, c2v_identifier, tsne_json_
     """
     tsne_df = iv.unjsonify_stored_df(tsne_json_data)
 
-    c2v_model = ic2v.GensimCommunity2Vec.load(MODEL_DIRS[c2v_identifier])
-    model_name = f"{c2v_identifier} Kmeans Cluster Assignment {n_clusters} clusters and random state {random_seed}"
+    c2v_model = ic2v.load_vectors(MODEL_DIRS[c2v_identifier])
+    model_name = f"{c2v_identifier} Spherical Kmeans Cluster Assignment {n_clusters} clusters and random state {random_seed}"
 
     # TODO: eventually we may want to support different types of models. The ClusteringModelFactory should allow that fairly easily
     cluster_model = ihop.clustering.ClusteringModelFactory.init_clustering_model(
-        ihop.clustering.ClusteringModelFactory.KMEANS,
+        ihop.clustering.ClusteringModelFactory.SPHERICAL_KMEANS,
         c2v_model.get_normed_vectors(),
         c2v_model.get_index_as_dict(),
         model_name=model_name,
@@ -3,16 +3,20 @@
 A list of ideas for clustering based on text (not users):
 .. TODO: Support clustering of documents based on TF-IDF, not just c2v embeddings
 .. TODO: Implement training of topic models on text: tf-idf-> KMeans, Hierarchical Dirichlet Processes
-.. TODO: Gensim Coherence model supported with Spark LDA implementation
 .. TODO: Lift document level clusters to subreddit level (will we need spark again or will pandas be sufficient?)
 .. TODO: AuthorTopic models with subreddits as the metadata field (instead of author)
 """
 import argparse
+import collections
+import functools
+import itertools
 import json
 import logging
 import os
 import pathlib
 import pickle
+import time
+import tracemalloc
 
 import gensim.models as gm
 import gensim.corpora as gc
@@ -23,11 +27,22 @@ import pyspark.ml.clustering as sparkmc
 import pyspark.sql.functions as fn
 import pyspark.sql.types as sparktypes
 import pytimeparse
+import scipy.optimize
+import scipy.sparse
+import scipy.sparse.csgraph
 from scipy.stats import entropy
-from sklearn.cluster import KMeans, AffinityPropagation, AgglomerativeClustering
+from sklearn.base import BaseEstimator, ClusterMixin
+from sklearn.cluster import (
+    KMeans,
+    AffinityPropagation,
+    AgglomerativeClustering,
+    SpectralClustering,
+)
 from sklearn import metrics
 
+from ihop.community2vec import NeighborIndex
 import ihop.utils
+from ihop.utils import DEFAULT_VECTOR_DTYPE
 import ihop.text_processing
 
 logger = logging.getLogger(__name__)
@@ -60,6 +75,31 @@ ADJUSTED_RAND_INDEX = "adjusted_rand_index"
 RAND_INDEX = "rand_index"
 NORM_MUTUAL_INFO = "normalized_mutual_info"
 
+# Contingency tables with more cells than this are stored as scipy sparse matrices by default
+SPARSE_CONTINGENCY_CELLS = 1000000
+
+# Extra metrics and columns of the table written when sweeping the number of clusters
+INERTIA = "Inertia"
+TRAINING_SECONDS = "Training seconds"
+N_CLUSTERS_COL = "n_clusters"
+METRIC_COL = "metric"
+VALUE_COL = "value"
+SWEEP_METRICS_CSV = "sweep_metrics.csv"
+
+# Column for the stability of each data point's cluster in consensus clustering results
+STABILITY_COL = "stability"
+
+# Ways to pair up clusters between clusterings for the Maximum Match Measure
+GREEDY_MATCHING = "greedy"
+HUNGARIAN_MATCHING = "hungarian"
+
+# Topic coherence measures that can be computed directly in Spark
+UMASS = "u_mass"
+NPMI = "npmi"
+
+# Smoothing constant for coherence measures, matches gensim.topic_coherence
+COHERENCE_EPSILON = 1e-12
+
 
 def get_probabilities(counts_dict, keys_to_keep, default_count_value=0):
     """Returns the probabilities for a list of datapoints keys given
@@ -86,9 +126,14 @@ def get_cluster_probabilities(cluster_assignments, datapoint_counts, cluster_ind
     :param cluster_indexes: list or array, used to track which cluster is stored at the index in the array
     """
     total_counts = np.sum(datapoint_counts)
-    cluster_probs = np.zeros((len(cluster_indexes)))
-    for i, c in enumerate(cluster_indexes):
-        cluster_probs[i] = np.sum(datapoint_counts[np.where(cluster_assignments == c)])
+    cluster_positions = pd.Index(cluster_indexes).get_indexer(cluster_assignments)
+    # Datapoints in clusters missing from cluster_indexes don't add to any cluster
+    in_index = cluster_positions >= 0
+    cluster_probs = np.bincount(
+        cluster_positions[in_index],
+        weights=np.asarray(datapoint_counts)[in_index],
+        minlength=len(cluster_indexes),
+    )
 
     return cluster_probs / total_counts
 
@@ -100,8 +145,9 @@ def get_contingency_table(
     cluster_2_counts,
     cluster_1_indices,
     cluster_2_indices,
+    sparse=None,
 ):
-    """Returns the frequency distributions of datapoints between two clusterings as numpy matrix. If a count
+    """Returns the frequency distributions of datapoints between two clusterings as numpy matrix or scipy sparse CSR matrix. If a count
     Clustering 1 is the first axis, clustering 2 is the second axis.
 
     :param cluster_1_assignments: list or array storing cluster assignment for each datapoint in clustering 1
@@ -110,35 +156,49 @@ def get_contingency_table(
     :param cluster_2_counts:  list or array of int, same length as cluster_2_assignments, frequency counts of each datapoint in cluster assignment 2
     :param cluster_1_indices: list of int/string, index pointer that tells which rows store which clusters from clustering 1 (ideally use sorted list of cluster id/labels)
     :param cluster_2_indices: list of int/string, index pointer that tells which rows store which clusters from clustering 2 (ideally use sorted list of cluster id/labels)
+    :param sparse: boolean or None, True to return a scipy sparse CSR matrix, False for a dense numpy array. The default None returns a sparse matrix when the table has more than SPARSE_CONTINGENCY_CELLS cells
     """
-    contingency_table = np.zeros((len(cluster_1_indices), len(cluster_2_indices)))
-    for i, c1 in enumerate(cluster_1_assignments):
-        c2 = cluster_2_assignments[i]
-        c1_count = cluster_1_counts[i]
-        c2_count = cluster_2_counts[i]
-        # Values can be added to contingency matrix only if both values are non-zero
-        if c1_count > 0 and c2_count > 0:
-            c1_index = cluster_1_indices.index(c1)
-            c2_index = cluster_2_indices.index(c2)
-
-            contingency_table[c1_index, c2_index] += (
-                cluster_1_counts[i] + cluster_2_counts[i]
-            )
-
-    return contingency_table
+    shape = (len(cluster_1_indices), len(cluster_2_indices))
+    if sparse is None:
+        sparse = shape[0] * shape[1] > SPARSE_CONTINGENCY_CELLS
+    rows = pd.Index(cluster_1_indices).get_indexer(cluster_1_assignments)
+    cols = pd.Index(cluster_2_indices).get_indexer(cluster_2_assignments)
+    if (rows < 0).any() or (cols < 0).any():
+        raise ValueError(
+            "Cluster assignments contain clusters missing from the indices"
+        )
+    cluster_1_counts = np.asarray(cluster_1_counts)
+    cluster_2_counts = np.asarray(cluster_2_counts)
+    # Values can be added to contingency matrix only if both values are non-zero
+    both_counted = (cluster_1_counts > 0) & (cluster_2_counts > 0)
+    # Duplicate cells are summed when converting from COO format
+    contingency_table = scipy.sparse.coo_matrix(
+        (
+            (cluster_1_counts + cluster_2_counts)[both_counted].astype(np.float64),
+            (rows[both_counted], cols[both_counted]),
+        ),
+        shape=shape,
+    )
+    if sparse:
+        return contingency_table.tocsr()
+    return contingency_table.toarray()
 
 
 def get_mutual_information(contingency_table, cluster_1_probs, cluster_2_probs):
     """Returns the mutual information between clusterings 1 and 2 as a float
-    based on the contingency table used to calculate joint distribution and the probability distribution of individual clusterings
+    based on the contingency table used to calculate joint distribution and the probability distribution of individual clusterings.
+    Only non-zero cells of the contingency table are visited, so sparse tables are never densified.
 
-    :param contingency_table: Frequency counts of cluster assignments comparison between both clustering 1 on first axis and clustering 2 on second axis
+    :param contingency_table: Frequency counts of cluster assignments comparison between both clustering 1 on first axis and clustering 2 on second axis, numpy array or scipy sparse matrix
     :param cluster_1_probs: np array, probability of cluster assignments in clustering 1
     :param cluster_2_probs: np array, probability of cluster assignments in clustering 2
     """
-    probs_products = np.outer(cluster_1_probs, cluster_2_probs)
-    total_freqs = np.sum(contingency_table)
-    joint_probs = contingency_table / total_freqs
+    cells = scipy.sparse.coo_matrix(contingency_table)
+    probs_products = np.asarray(cluster_1_probs)[cells.row] * np.asarray(
+        cluster_2_probs
+    )[cells.col]
+    total_freqs = cells.sum()
+    joint_probs = cells.data / total_freqs
     # Can safely ignore divide by zero in log2 warnings, they aren't included in the final sum
     with np.errstate(divide="ignore", invalid="ignore"):
         mi_components = joint_probs * (np.log2(joint_probs / probs_products))
@@ -146,6 +206,17 @@ def get_mutual_information(contingency_table, cluster_1_probs, cluster_2_probs):
     return mi
 
 
+def get_keyed_series(mapping):
+    """Returns the mapping as a pandas Series indexed by its keys. Series are returned unchanged.
+
+    :param mapping: dict or pandas Series, maps data point keys to values such as cluster assignments or counts
+    """
+    if isinstance(mapping, pd.Series):
+        return mapping
+    # Building from arrays is several times faster than letting pandas infer types from a dict
+    return pd.Series(np.array(list(mapping.values())), index=list(mapping.keys()))
+
+
 def remap_clusters(
     cluster_mapping_1,
     cluster_mapping_2,
@@ -153,31 +224,37 @@ def remap_clusters(
     missing_cluster_value=MISSING_CLUSTER_ASSIGNMENT,
 ):
     """Remaps clusterings so that they are partitions of the same data, returning cluster assignments as two arrays.
-    Also returns the data point keys as a third array for indexing.
+    Also returns the data point keys as a third array for indexing, in sorted order.
     Uses the intersection of data points by default.
 
-    :param cluster_mapping_1: dict, maps a data point to its cluster assignment for the first clustering
-    :param cluster_mapping_2: dict, maps a data point to its cluster assignment for the second clustering
+    :param cluster_mapping_1: dict or pandas Series, maps a data point to its cluster assignment for the first clustering
+    :param cluster_mapping_2: dict or pandas Series, maps a data point to its cluster assignment for the second clustering
     :param use_union: boolean, set to True to use union of data points by having an additional cluster that consists of those values in only one cluster, defaults to False using the intersection of datapoints
     """
+    cluster_mapping_1 = get_keyed_series(cluster_mapping_1)
+    cluster_mapping_2 = get_keyed_series(cluster_mapping_2)
+    # Hash based set operations without sorting, then a single sort of the keys, are much faster than pandas sorting object indexes
     if use_union:
-        all_datapoints = cluster_mapping_1.keys() | cluster_mapping_2.keys()
+        all_datapoints = cluster_mapping_1.index.union(
+            cluster_mapping_2.index, sort=False
+        )
         logger.info("Computed cluster partitions using union.")
     else:
-        all_datapoints = cluster_mapping_1.keys() & cluster_mapping_2.keys()
+        all_datapoints = cluster_mapping_1.index.intersection(
+            cluster_mapping_2.index, sort=False
+        )
         logger.info("Computed cluster partitions using intersection.")
-    all_datapoints = np.array(sorted(all_datapoints))
+    all_datapoints = pd.Index(sorted(all_datapoints), dtype=all_datapoints.dtype)
     logger.info("Number of datapoints: %s", len(all_datapoints))
-    cluster_assignments_1 = list()
-    cluster_assignments_2 = list()
-    for d in all_datapoints:
-        cluster_assignments_1.append(cluster_mapping_1.get(d, missing_cluster_value))
-        cluster_assignments_2.append(cluster_mapping_2.get(d, missing_cluster_value))
 
     return (
-        np.array(cluster_assignments_1),
-        np.array(cluster_assignments_2),
-        all_datapoints,
+        cluster_mapping_1.reindex(
+            all_datapoints, fill_value=missing_cluster_value
+        ).to_numpy(),
+        cluster_mapping_2.reindex(
+            all_datapoints, fill_value=missing_cluster_value
+        ).to_numpy(),
+        all_datapoints.to_numpy(),
     )
 
 
@@ -194,11 +271,11 @@ def compare_cluterings(
     2) if uniform probabilities for each data point to cluster (subreddit) or probability counts of data point to cluster (subreddit, probability determined by number of comments over the time period)
     Returned dictionary like {comparison style: {metric name: metric value}}
 
-    :param cluster_mapping_1: dict, maps a data point to its cluster assignment for the first clustering
-    :param cluster_mapping_2: dict, maps a data point to its cluster assignment for the second clustering
+    :param cluster_mapping_1: dict or pandas Series, maps a data point to its cluster assignment for the first clustering
+    :param cluster_mapping_2: dict or pandas Series, maps a data point to its cluster assignment for the second clustering
     :param use_union: boolean, set to True to use union of data points by having an additional cluster that consists of those values in only one cluster, defaults to False using the intersection of datapoints
-    :param cluster_1_counts: dict, maps a datapoint to an integer value, used to compute probabilities
-    :param cluster_2_counts: dict, maps a datapoint to an integer, used to compute probabilities
+    :param cluster_1_counts: dict or pandas Series, maps a datapoint to an integer value, used to compute probabilities
+    :param cluster_2_counts: dict or pandas Series, maps a datapoint to an integer, used to compute probabilities
     :param missing_cluster_assignment: constant value to assign clusters when using the union of the partition. User is responsible for ensuring this value doesn't conflict with any actual cluster ids.
     """
     cluster_assignment_1, cluster_assignment_2, datapoint_keys = remap_clusters(
@@ -216,17 +293,11 @@ def compare_cluterings(
     if not use_union and cluster_1_counts is not None and cluster_2_counts is not None:
         results_key = INTERSECT_COMMENT_PROB
         # Order the counts in the same way as cluster assignments
-        cluster_1_counts_reordered = []
-        cluster_2_counts_reordered = []
-        for d in datapoint_keys:
-            cluster_1_counts_reordered.append(cluster_1_counts[d])
-            cluster_2_counts_reordered.append(cluster_2_counts[d])
-
         results_dict[VOI] = variation_of_information(
             cluster_assignment_1,
             cluster_assignment_2,
-            np.array(cluster_1_counts_reordered),
-            np.array(cluster_2_counts_reordered),
+            get_keyed_series(cluster_1_counts).loc[datapoint_keys].to_numpy(),
+            get_keyed_series(cluster_2_counts).loc[datapoint_keys].to_numpy(),
         )
     else:
 
@@ -259,6 +330,7 @@ def variation_of_information(
     cluster_assignment_2,
     cluster_1_datapoint_counts=None,
     cluster_2_datapoint_counts=None,
+    sparse=None,
 ):
     """Computes variation of information between two partitions of the same data points.
 
@@ -268,6 +340,7 @@ def variation_of_information(
     :param cluster_assignment_2: array type, the cluster assignments for each data point under the second partitioning
     :param cluster_1_datapoint_counts: array type, same length as cluster_assignments_1, counts of occurences of a particular datapoint under the first partitioning, used to calculate probabilities for entropy and mutual information. If this is not given a uniform probability of all clusters will be used.
     :param cluster_2_datapoint_counts: array type, same length as cluster_assignments_2, counts of occurences of a particular datapoint under the second partitioning, used to calculate probabilities for entropy and mutual information. If this is not given a uniform probability of all clusters will be used.
+    :param sparse: boolean or None, whether to use a scipy sparse contingency table, see get_contingency_table. Defaults to choosing by table size
     :return: float, the computed variation of information value
     """
     if len(cluster_assignment_1) != len(cluster_assignment_2):
@@ -287,12 +360,12 @@ def variation_of_information(
         logger.error(msg)
 
     # Sorted list of clusters for indexint
-    cluster_1_indices = sorted(set(cluster_assignment_1))
+    cluster_1_indices = np.unique(cluster_assignment_1)
     cluster_1_probs = get_cluster_probabilities(
         cluster_assignment_1, cluster_1_datapoint_counts, cluster_1_indices
     )
 
-    cluster_2_indices = sorted(set(cluster_assignment_2))
+    cluster_2_indices = np.unique(cluster_assignment_2)
     cluster_2_probs = get_cluster_probabilities(
         cluster_assignment_2, cluster_2_datapoint_counts, cluster_2_indices
     )
@@ -307,6 +380,7 @@ def variation_of_information(
         cluster_2_datapoint_counts,
         cluster_1_indices,
         cluster_2_indices,
+        sparse,
     )
 
     mi = get_mutual_information(contingency_table, cluster_1_probs, cluster_2_probs)
@@ -315,47 +389,884 @@ def variation_of_information(
     return voi
 
 
-def get_maximum_matching_pairs(contingency_table, row_mapping, col_mapping, missing_fill_value = -1):
+def get_greedy_matching(contingency_table):
+    """Returns the row and column indices of greedily matched cells as two numpy int arrays, ordered by decreasing cell value.
+    Repeatedly matches the largest remaining cell whose row and column are both unmatched, breaking ties in row-major order.
+    Non-zero cells are sorted once, so this takes O(nnz log nnz) time for nnz non-zero cells.
+
+    :param contingency_table: 2D numpy array or scipy sparse matrix of non-negative values
+    """
+    cells = scipy.sparse.coo_matrix(contingency_table)
+    positive = cells.data > 0
+    rows = cells.row[positive]
+    cols = cells.col[positive]
+    flat_index = rows.astype(np.int64) * cells.shape[1] + cols
+    order = np.lexsort((flat_index, -cells.data[positive]))
+    row_taken = np.zeros(cells.shape[0], dtype=bool)
+    col_taken = np.zeros(cells.shape[1], dtype=bool)
+    max_matches = min(cells.shape)
+    matched = list()
+    for cell in order:
+        r = rows[cell]
+        c = cols[cell]
+        if not (row_taken[r] or col_taken[c]):
+            row_taken[r] = True
+            col_taken[c] = True
+            matched.append(cell)
+            if len(matched) == max_matches:
+                break
+    matched = np.array(matched, dtype=np.int64)
+    return rows[matched], cols[matched]
+
+
+def get_optimal_matching(contingency_table):
+    """Returns the row and column indices of matched cells maximizing the total value of matched cells as two numpy int arrays, ordered by decreasing cell value.
+    Dense tables use the Hungarian algorithm from scipy.optimize.linear_sum_assignment.
+    Sparse tables stay sparse and use scipy.sparse.csgraph.min_weight_full_bipartite_matching, with a dummy column for each row so a full matching always exists. Pairs of clusters with no overlap are left unmatched.
+
+    :param contingency_table: 2D numpy array or scipy sparse matrix of non-negative values
+    """
+    if scipy.sparse.issparse(contingency_table):
+        table = scipy.sparse.coo_matrix(contingency_table)
+        num_rows, num_cols = table.shape
+        # Shifting every weight by 1 keeps them non-zero and adds the same constant to any full matching,
+        # so the maximum is unchanged and rows matched to their dummy column are the unmatched ones
+        graph = scipy.sparse.csr_matrix(
+            (
+                np.concatenate([table.data + 1.0, np.ones(num_rows)]),
+                (
+                    np.concatenate([table.row, np.arange(num_rows)]),
+                    np.concatenate([table.col, num_cols + np.arange(num_rows)]),
+                ),
+            ),
+            shape=(num_rows, num_cols + num_rows),
+        )
+        rows, cols = scipy.sparse.csgraph.min_weight_full_bipartite_matching(
+            graph, maximize=True
+        )
+        real = cols < num_cols
+        rows, cols = rows[real], cols[real]
+        values = np.asarray(table.tocsr()[rows, cols]).ravel()
+    else:
+        contingency_table = np.asarray(contingency_table)
+        rows, cols = scipy.optimize.linear_sum_assignment(
+            contingency_table, maximize=True
+        )
+        values = contingency_table[rows, cols]
+    order = np.argsort(-values[values > 0], kind="stable")
+    return rows[values > 0][order], cols[values > 0][order]
+
+
+def get_maximum_matching_pairs(
+    contingency_table,
+    row_mapping,
+    col_mapping,
+    missing_fill_value=-1,
+    matching=GREEDY_MATCHING,
+):
     """Using the Maximum Match Measure procedure (section 4.2
     in https://publikationen.bibliothek.kit.edu/1000011477/812079),
     pair up clusters from different clustering partitions using the contingency table. Returns the optimal tuple of 2 (n,)-shaped numpy array for n pair matches, also two (d, )-shaped for unpaired rows and unpaired columns (no overlap with any cluster in the other clustering)
 
-    :param contingency_table: 2D array storing numeric data
+    :param contingency_table: 2D array or scipy sparse matrix storing numeric data
     :param row_mapping: np array, value at i tells how to name the cluster at row i of contingency table
     :param col_mapping: np array, value at i tells how to name the cluster at col i of contingency table
     :param missing_fill_value: object, what to fill the array with when there is no match (None or -1, usually)
+    :param matching: str, 'greedy' to repeatedly pair the clusters with the largest overlap as in the Maximum Match Measure, or 'hungarian' to find the pairing with the largest total overlap
     """
-    copy_table = np.copy(contingency_table)
-    rows_pairs_list = list()
-    cols_pairs_list = list()
-    while np.max(copy_table) > 0:
-        pair = np.unravel_index(np.argmax(copy_table), copy_table.shape)
-        rows_pairs_list.append(pair[0])
-        cols_pairs_list.append(pair[1])
-        # Don't find this pair again, but don't change the shape of the array
-        copy_table[pair[0]] = -1
-        copy_table[:, pair[1]] = -1
+    if matching == GREEDY_MATCHING:
+        paired_rows, paired_cols = get_greedy_matching(contingency_table)
+    elif matching == HUNGARIAN_MATCHING:
+        paired_rows, paired_cols = get_optimal_matching(contingency_table)
+    else:
+        raise ValueError(f"Matching '{matching}' is not supported")
 
     # Retrieve true cluster ids for unmatched clusters
-    unpaired_rows = set(range(copy_table.shape[0])) - set(rows_pairs_list)
-    if len(unpaired_rows) > 0:
-       unpaired_rows = row_mapping[list(unpaired_rows)]
-    unpaired_cols = set(range(copy_table.shape[1])) - set(cols_pairs_list)
-    if len(unpaired_cols) > 0:
-        unpaired_cols = col_mapping[list(unpaired_cols)]
-
-    rows_pairings = list(row_mapping[rows_pairs_list]) + list(unpaired_rows) + [missing_fill_value] * len(unpaired_cols)
-    cols_pairings = list(col_mapping[cols_pairs_list]) + [missing_fill_value] * len(unpaired_rows) + list(unpaired_cols)
+    num_rows, num_cols = contingency_table.shape
+    unpaired_rows = np.setdiff1d(np.arange(num_rows), paired_rows)
+    unpaired_cols = np.setdiff1d(np.arange(num_cols), paired_cols)
+
+    rows_pairings = (
+        list(row_mapping[paired_rows])
+        + list(row_mapping[unpaired_rows])
+        + [missing_fill_value] * len(unpaired_cols)
+    )
+    cols_pairings = (
+        list(col_mapping[paired_cols])
+        + [missing_fill_value] * len(unpaired_rows)
+        + list(col_mapping[unpaired_cols])
+    )
 
     return rows_pairings, cols_pairings
 
 
+def segment_topics(topics, measure=UMASS):
+    """Returns the (w_prime, w_star) term pairs used to score each topic, following the segmentations from gensim.topic_coherence.
+    u_mass compares each term to every term ranked above it in the topic, NPMI compares all ordered pairs of distinct terms.
+
+    :param topics: list of lists of term ids, each ordered by decreasing probability in the topic
+    :param measure: str, UMASS or NPMI
+    """
+    segmented_topics = []
+    for top_terms in topics:
+        if measure == UMASS:
+            segments = [
+                (w_prime, w_star)
+                for i, w_prime in enumerate(top_terms[1:], start=1)
+                for w_star in top_terms[:i]
+            ]
+        elif measure == NPMI:
+            segments = [
+                (w_prime, w_star)
+                for w_prime, w_star in itertools.permutations(top_terms, 2)
+            ]
+        else:
+            raise ValueError(f"Coherence measure '{measure}' is not supported")
+        segmented_topics.append(segments)
+    return segmented_topics
+
+
+def get_spark_document_cooccurrence_counts(dataframe, vectorized_col, term_pairs):
+    """Counts the number of documents, the number of documents each term appears in and the number of documents each pair of terms appear in together.
+    Only the given term pairs are counted. They are broadcast to the executors and counts are aggregated within partitions before being merged, so only the small count tables are sent back to the driver.
+    Returns (num_docs, {term -> doc count}, {(term_a, term_b) -> doc count}) where term_a < term_b.
+
+    :param dataframe: Spark DataFrame storing vectorized documents
+    :param vectorized_col: str, column storing documents as Spark SparseVectors
+    :param term_pairs: iterable of (int, int), term id pairs to count co-occurrences for
+    """
+    pairs = frozenset((min(p), max(p)) for p in term_pairs)
+    terms = frozenset(itertools.chain.from_iterable(pairs))
+    logger.debug(
+        "Counting document co-occurrences for %s terms and %s term pairs",
+        len(terms),
+        len(pairs),
+    )
+    spark_context = dataframe.rdd.context
+    broadcast_terms = spark_context.broadcast(terms)
+    broadcast_pairs = spark_context.broadcast(pairs)
+
+    def count_partition(rows):
+        keep_terms = broadcast_terms.value
+        keep_pairs = broadcast_pairs.value
+        num_docs = 0
+        term_counts = collections.Counter()
+        pair_counts = collections.Counter()
+        for row in rows:
+            num_docs += 1
+            doc_terms = sorted(int(i) for i in row[0].indices if int(i) in keep_terms)
+            term_counts.update(doc_terms)
+            for pair in itertools.combinations(doc_terms, 2):
+                if pair in keep_pairs:
+                    pair_counts[pair] += 1
+        yield num_docs, term_counts, pair_counts
+
+    def merge_counts(a, b):
+        return a[0] + b[0], a[1] + b[1], a[2] + b[2]
+
+    num_docs, term_counts, pair_counts = (
+        dataframe.select(vectorized_col)
+        .rdd.mapPartitions(count_partition)
+        .fold((0, collections.Counter(), collections.Counter()), merge_counts)
+    )
+    broadcast_terms.unpersist()
+    broadcast_pairs.unpersist()
+    return num_docs, dict(term_counts), dict(pair_counts)
+
+
+def get_topic_coherences(
+    segmented_topics, num_docs, term_counts, pair_counts, measure=UMASS
+):
+    """Returns the coherence of each topic as a list of floats, computed from document co-occurrence counts in the same way as gensim's CoherenceModel.
+
+    :param segmented_topics: list of lists of (w_prime, w_star) pairs, as returned by segment_topics
+    :param num_docs: int, number of documents in the corpus
+    :param term_counts: dict, term id -> number of documents containing the term
+    :param pair_counts: dict, (term_a, term_b) -> number of documents containing both terms, where term_a < term_b
+    :param measure: str, UMASS or NPMI
+    """
+    topic_coherences = []
+    for segments in segmented_topics:
+        segment_scores = []
+        for w_prime, w_star in segments:
+            co_doc_prob = (
+                pair_counts.get((min(w_prime, w_star), max(w_prime, w_star)), 0)
+                / num_docs
+            )
+            w_star_prob = term_counts.get(w_star, 0) / num_docs
+            if measure == UMASS:
+                denominator = w_star_prob
+            else:
+                denominator = w_star_prob * term_counts.get(w_prime, 0) / num_docs
+
+            # Terms that never appear in the corpus get a score of 0, as gensim does for u_mass
+            if denominator == 0:
+                score = 0.0
+            elif measure == UMASS:
+                score = np.log((co_doc_prob + COHERENCE_EPSILON) / denominator)
+            else:
+                score = np.log((co_doc_prob + COHERENCE_EPSILON) / denominator) / -np.log(
+                    co_doc_prob + COHERENCE_EPSILON
+                )
+            segment_scores.append(score)
+        topic_coherences.append(float(np.mean(segment_scores)))
+    return topic_coherences
+
+
+def normalize_rows(vectors):
+    """Returns a copy of the 2D array with each row scaled to unit length. All zero rows are left as zeros.
+
+    :param vectors: array-like with shape (num points, num dimensions)
+    """
+    vectors = np.asarray(vectors)
+    vectors = vectors.astype(np.result_type(vectors.dtype, np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def spherical_kmeans_plusplus(vectors, n_clusters, rng):
+    """Returns n_clusters rows of vectors chosen as initial centers by k-means++ seeding with cosine distance
+
+    :param vectors: numpy array of unit length rows
+    :param n_clusters: int, number of centers to choose
+    :param rng: numpy random Generator
+    """
+    centers = np.empty((n_clusters, vectors.shape[1]), dtype=vectors.dtype)
+    centers[0] = vectors[rng.integers(len(vectors))]
+    closest_distances = np.maximum(1.0 - vectors @ centers[0], 0.0)
+    for i in range(1, n_clusters):
+        total = closest_distances.sum()
+        if total > 0:
+            choice = rng.choice(len(vectors), p=closest_distances / total)
+        else:
+            choice = rng.integers(len(vectors))
+        centers[i] = vectors[choice]
+        closest_distances = np.minimum(
+            closest_distances, np.maximum(1.0 - vectors @ centers[i], 0.0)
+        )
+    return centers
+
+
+def fit_spherical_kmeans(
+    vectors, n_clusters, batch_size, max_iter, init_size, tol, seed
+):
+    """Runs a single spherical mini-batch k-means fit, returning the unit length centers, labels and inertia for all points.
+    Inertia is the sum of cosine distances from each point to its center.
+
+    :param vectors: numpy array of unit length rows
+    :param n_clusters: int, number of clusters
+    :param batch_size: int, number of points in each mini-batch
+    :param max_iter: int, maximum number of mini-batch updates
+    :param init_size: int, number of points sampled for k-means++ seeding
+    :param tol: float, stop early when no center moves by more than this cosine distance in an update
+    :param seed: int, random seed for this fit
+    """
+    rng = np.random.default_rng(seed)
+    num_points = len(vectors)
+    init_sample = rng.choice(num_points, size=min(init_size, num_points), replace=False)
+    centers = spherical_kmeans_plusplus(vectors[init_sample], n_clusters, rng)
+    counts = np.zeros(n_clusters)
+    for _ in range(max_iter):
+        batch = vectors[rng.choice(num_points, size=min(batch_size, num_points), replace=False)]
+        batch_labels = np.argmax(batch @ centers.T, axis=1)
+        batch_counts = np.bincount(batch_labels, minlength=n_clusters)
+        batch_sums = np.zeros_like(centers)
+        np.add.at(batch_sums, batch_labels, batch)
+        updated = batch_counts > 0
+        new_centers = centers.copy()
+        new_centers[updated] = (
+            centers[updated] * counts[updated, None] + batch_sums[updated]
+        )
+        new_centers = normalize_rows(new_centers).astype(centers.dtype)
+        counts += batch_counts
+        max_shift = np.max(1.0 - np.sum(new_centers * centers, axis=1))
+        centers = new_centers
+        if max_shift < tol:
+            break
+
+    similarities = vectors @ centers.T
+    labels = np.argmax(similarities, axis=1)
+    inertia = float(np.sum(1.0 - similarities[np.arange(num_points), labels]))
+    return centers, labels, inertia
+
+
+class SphericalKMeans(BaseEstimator, ClusterMixin):
+    """K-means with cosine similarity, where data points and cluster centers are unit length.
+    Centers are seeded with k-means++ on a sample of points and updated with mini-batches, so each iteration only touches batch_size points.
+    Restarts run in parallel processes and the fit with the lowest inertia is kept.
+    Follows the sklearn estimator interface, so it can be used in ClusteringModel.
+    """
+
+    def __init__(
+        self,
+        n_clusters=250,
+        batch_size=1024,
+        max_iter=100,
+        n_init=4,
+        init_size=None,
+        tol=1e-4,
+        n_jobs=None,
+        random_state=None,
+    ):
+        """
+        :param n_clusters: int, number of clusters
+        :param batch_size: int, number of points in each mini-batch update
+        :param max_iter: int, maximum number of mini-batch updates for each restart
+        :param n_init: int, number of restarts with different seeds
+        :param init_size: int or None, number of points sampled for k-means++ seeding, defaults to the larger of 3 * batch_size and 3 * n_clusters
+        :param tol: float, stop a restart early when no center moves by more than this cosine distance in an update
+        :param n_jobs: int or None, number of processes for running restarts, passed to joblib
+        :param random_state: int or None, seed for reproducible results
+        """
+        self.n_clusters = n_clusters
+        self.batch_size = batch_size
+        self.max_iter = max_iter
+        self.n_init = n_init
+        self.init_size = init_size
+        self.tol = tol
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+
+    def fit(self, X, y=None):
+        """Fits cluster centers to the data, storing cluster_centers_, labels_ and inertia_
+
+        :param X: array-like with shape (num points, num dimensions), rows are normalized to unit length
+        :param y: ignored
+        """
+        vectors = normalize_rows(X)
+        if len(vectors) < self.n_clusters:
+            raise ValueError(
+                f"n_samples={len(vectors)} should be >= n_clusters={self.n_clusters}"
+            )
+        init_size = self.init_size
+        if init_size is None:
+            init_size = max(3 * self.batch_size, 3 * self.n_clusters)
+        seeds = np.random.SeedSequence(self.random_state).generate_state(self.n_init)
+        fits = joblib.Parallel(n_jobs=self.n_jobs)(
+            joblib.delayed(fit_spherical_kmeans)(
+                vectors,
+                self.n_clusters,
+                self.batch_size,
+                self.max_iter,
+                init_size,
+                self.tol,
+                int(seed),
+            )
+            for seed in seeds
+        )
+        self.cluster_centers_, self.labels_, self.inertia_ = min(
+            fits, key=lambda f: f[2]
+        )
+        logger.debug(
+            "Spherical k-means restart inertias: %s, kept %s",
+            [f[2] for f in fits],
+            self.inertia_,
+        )
+        return self
+
+    def predict(self, X):
+        """Returns the closest cluster center by cosine similarity for each row of X
+
+        :param X: array-like with shape (num points, num dimensions)
+        """
+        vectors = normalize_rows(np.asarray(X, dtype=self.cluster_centers_.dtype))
+        return np.argmax(vectors @ self.cluster_centers_.T, axis=1)
+
+
+def get_knn_connectivity(vectors, n_neighbors=30, chunk_size=1024):
+    """Returns a symmetric scipy sparse CSR matrix connecting each data point to its n_neighbors nearest neighbors by cosine similarity.
+    Neighbors are found from blocked dot products, so memory use is bounded by chunk_size * num points rather than num points squared.
+
+    :param vectors: array-like with shape (num points, num dimensions)
+    :param n_neighbors: int, number of neighbors connected to each point, capped at num points - 1
+    :param chunk_size: int, number of rows of the similarity matrix computed at once
+    """
+    normed_vectors = normalize_rows(vectors)
+    num_points = normed_vectors.shape[0]
+    neighbors = NeighborIndex.build(
+        normed_vectors, range(num_points), n_neighbors, chunk_size
+    ).neighbors
+    rows = np.repeat(np.arange(num_points), neighbors.shape[1])
+    graph = scipy.sparse.csr_matrix(
+        (np.ones(rows.shape[0], dtype=np.int8), (rows, neighbors.ravel())),
+        shape=(num_points, num_points),
+    )
+    # Neighbor relations aren't symmetric, keep an edge if either point has the other as a neighbor
+    return graph.maximum(graph.T).tocsr()
+
+
+def cut_merge_tree(children, n_leaves, n_clusters):
+    """Returns cluster labels for the leaves of a merge tree after applying only the first n_leaves - n_clusters merges.
+    Labels are numbered in order of each cluster's first leaf. Runs in time linear in the number of leaves.
+
+    :param children: numpy int array with shape (n_leaves - 1, 2), the children of each merge in the order they were merged, as in sklearn AgglomerativeClustering.children_
+    :param n_leaves: int, number of data points in the tree
+    :param n_clusters: int, number of clusters to cut the tree into
+    """
+    num_merges = n_leaves - n_clusters
+    if n_clusters < 1 or num_merges > len(children):
+        raise ValueError(
+            f"n_clusters={n_clusters} must be between {n_leaves - len(children)} and {n_leaves}"
+        )
+    node_labels = np.full(n_leaves + num_merges, -1, dtype=np.int64)
+    next_label = 0
+    # Merged nodes always have larger ids than their children, so walking merges backwards labels each root before its descendants
+    for i in range(num_merges - 1, -1, -1):
+        node = n_leaves + i
+        if node_labels[node] < 0:
+            node_labels[node] = next_label
+            next_label += 1
+        node_labels[children[i]] = node_labels[node]
+    leaf_labels = node_labels[:n_leaves]
+    unmerged = leaf_labels < 0
+    leaf_labels[unmerged] = np.arange(next_label, next_label + unmerged.sum())
+    _, first_leaf, inverse = np.unique(
+        leaf_labels, return_index=True, return_inverse=True
+    )
+    return np.argsort(np.argsort(first_leaf))[inverse]
+
+
+class KnnAgglomerativeClustering(BaseEstimator, ClusterMixin):
+    """Agglomerative clustering restricted to merges along a sparse k-nearest-neighbor graph of the data.
+    Unlike AgglomerativeClustering without connectivity, this never builds the dense pairwise distance matrix, so memory grows with num points * n_neighbors.
+    The full merge tree is always computed and kept in children_ and distances_, so labels for any number of clusters can be cut from it without refitting.
+    Follows the sklearn estimator interface, so it can be used in ClusteringModel.
+    """
+
+    def __init__(self, n_clusters=250, n_neighbors=30, linkage="average", chunk_size=1024):
+        """
+        :param n_clusters: int, number of clusters for labels_
+        :param n_neighbors: int, number of nearest neighbors each point is connected to in the connectivity graph
+        :param linkage: str, 'average', 'complete', 'single' or 'ward'. Ward linkage uses euclidean distance between unit length vectors, the others use cosine distance
+        :param chunk_size: int, number of rows of the similarity matrix computed at once when building the connectivity graph
+        """
+        self.n_clusters = n_clusters
+        self.n_neighbors = n_neighbors
+        self.linkage = linkage
+        self.chunk_size = chunk_size
+
+    def fit(self, X, y=None):
+        """Builds the connectivity graph and the full merge tree, storing children_, distances_, n_leaves_, n_connected_components_ and labels_
+
+        :param X: array-like with shape (num points, num dimensions), rows are normalized to unit length
+        :param y: ignored
+        """
+        vectors = normalize_rows(X)
+        logger.debug(
+            "Building connectivity graph with %s neighbors for %s points",
+            self.n_neighbors,
+            len(vectors),
+        )
+        connectivity = get_knn_connectivity(vectors, self.n_neighbors, self.chunk_size)
+        model = AgglomerativeClustering(
+            n_clusters=self.n_clusters,
+            affinity="euclidean" if self.linkage == "ward" else "cosine",
+            connectivity=connectivity,
+            compute_full_tree=True,
+            linkage=self.linkage,
+            compute_distances=True,
+        ).fit(vectors)
+        self.children_ = model.children_
+        self.distances_ = model.distances_
+        self.n_leaves_ = model.n_leaves_
+        self.n_connected_components_ = model.n_connected_components_
+        self.labels_ = cut_merge_tree(self.children_, self.n_leaves_, self.n_clusters)
+        return self
+
+
+def fit_consensus_run(vectors, n_clusters, base_model, base_params, seed):
+    """Returns the cluster labels of a single run of the base clusterer as an int32 numpy array
+
+    :param vectors: numpy array with shape (num points, num dimensions)
+    :param n_clusters: int, number of clusters
+    :param base_model: str, 'spherical_kmeans' or 'kmeans'
+    :param base_params: dict, other parameters passed to the base clusterer
+    :param seed: int, random state of this run
+    """
+    if base_model == ClusteringModelFactory.SPHERICAL_KMEANS:
+        params = {"n_init": 1, "n_jobs": 1}
+        params.update(base_params)
+        model = SphericalKMeans(n_clusters=n_clusters, random_state=seed, **params)
+    elif base_model == ClusteringModelFactory.KMEANS:
+        params = {"n_init": 1}
+        params.update(base_params)
+        model = KMeans(n_clusters=n_clusters, random_state=seed, **params)
+    else:
+        raise ValueError(
+            f"Base model '{base_model}' is not supported for consensus clustering"
+        )
+    return model.fit(vectors).labels_.astype(np.int32)
+
+
+def get_coassociation_matrix(run_labels, max_pairs=100, chunk_size=1024):
+    """Returns a symmetric scipy sparse CSR matrix with the fraction of runs in which each pair of data points was clustered together.
+    Each row keeps only its max_pairs most frequently co-clustered points, so memory is bounded by num points * max_pairs regardless of cluster sizes.
+    A point is always co-clustered with itself, so the diagonal is 1.
+
+    :param run_labels: numpy int array with shape (num runs, num points), the labels from each run
+    :param max_pairs: int, number of co-clustered points kept for each point, including itself
+    :param chunk_size: int, number of points whose co-occurrences are counted at once
+    """
+    num_runs, num_points = run_labels.shape
+    # One-hot cluster memberships of all runs side by side, so H @ H.T counts the runs in which two points share a cluster
+    cluster_offsets = np.cumsum([0] + [labels.max() + 1 for labels in run_labels[:-1]])
+    memberships = scipy.sparse.csr_matrix(
+        (
+            np.ones(num_runs * num_points, dtype=np.float32),
+            (
+                np.tile(np.arange(num_points), num_runs),
+                (run_labels + cluster_offsets[:, None]).ravel(),
+            ),
+        ),
+        shape=(num_points, int(cluster_offsets[-1] + run_labels[-1].max() + 1)),
+    )
+    blocks = list()
+    for start in range(0, num_points, chunk_size):
+        block = (memberships[start:start + chunk_size] @ memberships.T).tocoo()
+        # Rank the entries within each row by decreasing count and keep the top max_pairs
+        order = np.lexsort((-block.data, block.row))
+        rows = block.row[order]
+        row_starts = np.searchsorted(rows, np.arange(block.shape[0]))
+        keep = order[np.arange(len(order)) - row_starts[rows] < max_pairs]
+        blocks.append(
+            scipy.sparse.csr_matrix(
+                (
+                    block.data[keep] / num_runs,
+                    (block.row[keep] + start, block.col[keep]),
+                ),
+                shape=(num_points, num_points),
+            )
+        )
+    coassociation = functools.reduce(lambda a, b: a + b, blocks)
+    return coassociation.maximum(coassociation.T).tocsr()
+
+
+def get_cluster_stability(run_labels, labels):
+    """Returns the stability of each data point's cluster assignment, the mean fraction of runs in which the point was clustered together with the other members of its final cluster.
+    Computed exactly from the run labels, so it doesn't depend on how many pairs the co-association matrix keeps. Points alone in their cluster have stability 1.
+
+    :param run_labels: numpy int array with shape (num runs, num points), the labels from each run
+    :param labels: numpy int array, the final cluster of each data point
+    """
+    other_members = np.bincount(labels)[labels] - 1
+    together = np.zeros(len(labels))
+    for run in run_labels:
+        # Count the points sharing each (final cluster, run cluster) combination
+        combinations = labels.astype(np.int64) * (run.max() + 1) + run
+        together += np.bincount(combinations)[combinations] - 1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(
+            other_members > 0, together / (len(run_labels) * other_members), 1.0
+        )
+
+
+class ConsensusClustering(BaseEstimator, ClusterMixin):
+    """Combines many runs of a base clusterer with different seeds into one clustering that depends less on the random seed.
+    Runs are fit in parallel processes and summarized in a sparse co-association matrix, the fraction of runs that put each pair of points in the same cluster.
+    Final clusters are found by spectral clustering with the co-association matrix as the affinity, see Strehl and Ghosh 2002 (https://www.jmlr.org/papers/v3/strehl02a.html) and Fred and Jain 2005 (https://doi.org/10.1109/TPAMI.2005.113).
+    Follows the sklearn estimator interface, so it can be used in ClusteringModel.
+    """
+
+    def __init__(
+        self,
+        n_clusters=250,
+        n_runs=10,
+        base_model="spherical_kmeans",
+        base_params=None,
+        max_pairs=100,
+        chunk_size=1024,
+        n_jobs=None,
+        random_state=None,
+    ):
+        """
+        :param n_clusters: int, number of clusters for each run and for the final clustering
+        :param n_runs: int, number of runs of the base clusterer with different seeds
+        :param base_model: str, 'spherical_kmeans' or 'kmeans', the clusterer used in each run
+        :param base_params: dict or None, other parameters for the base clusterer
+        :param max_pairs: int, number of most frequently co-clustered points kept for each point in the co-association matrix
+        :param chunk_size: int, number of points whose co-occurrences are counted at once
+        :param n_jobs: int or None, number of processes for running the base clusterer, passed to joblib
+        :param random_state: int or None, seed for reproducible results
+        """
+        self.n_clusters = n_clusters
+        self.n_runs = n_runs
+        self.base_model = base_model
+        self.base_params = base_params
+        self.max_pairs = max_pairs
+        self.chunk_size = chunk_size
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+
+    def fit(self, X, y=None):
+        """Fits the base clusterer n_runs times, storing run_labels_, coassociation_, labels_ and stability_
+
+        :param X: array-like with shape (num points, num dimensions)
+        :param y: ignored
+        """
+        seeds = np.random.SeedSequence(self.random_state).generate_state(self.n_runs)
+        base_params = {} if self.base_params is None else self.base_params
+        logger.debug("Fitting %s runs of %s", self.n_runs, self.base_model)
+        self.run_labels_ = np.vstack(
+            joblib.Parallel(n_jobs=self.n_jobs)(
+                joblib.delayed(fit_consensus_run)(
+                    X, self.n_clusters, self.base_model, base_params, int(seed)
+                )
+                for seed in seeds
+            )
+        )
+        self.coassociation_ = get_coassociation_matrix(
+            self.run_labels_, self.max_pairs, self.chunk_size
+        )
+        logger.debug(
+            "Co-association matrix has %s stored pairs", self.coassociation_.nnz
+        )
+        self.labels_ = SpectralClustering(
+            n_clusters=self.n_clusters,
+            affinity="precomputed",
+            assign_labels="discretize",
+            random_state=self.random_state,
+        ).fit_predict(self.coassociation_)
+        self.stability_ = get_cluster_stability(self.run_labels_, self.labels_)
+        return self
+
+
+class ClusterSummaryIndex:
+    """Per cluster summaries of a trained clustering, stored as flat arrays so looking up a cluster or the cluster of a data point takes constant time.
+    Members of all clusters are kept in a single array in compressed sparse row layout: the members of the cluster in row r are members[offsets[r]:offsets[r + 1]], sorted by increasing cosine distance to the cluster centroid.
+    When data point counts are set, count_order holds the same members in the same layout sorted by decreasing count.
+    """
+
+    ARRAYS = [
+        "cluster_ids",
+        "offsets",
+        "members",
+        "distances",
+        "centroids",
+        "cohesion",
+        "labels",
+        "counts",
+        "count_order",
+    ]
+    KEYS_FILE_NAME = "keys.json"
+
+    def __init__(
+        self,
+        keys,
+        cluster_ids,
+        offsets,
+        members,
+        distances,
+        centroids,
+        cohesion,
+        labels,
+        counts=None,
+        count_order=None,
+    ):
+        """
+        :param keys: list of str, name of each data point, in the order of the training data
+        :param cluster_ids: numpy array, sorted cluster labels, one per row of the index
+        :param offsets: numpy int array with shape (num clusters + 1,), where each cluster's members start in members
+        :param members: numpy int array, data point positions grouped by cluster and sorted by distance to the centroid
+        :param distances: numpy array, cosine distance to the centroid of each entry of members
+        :param centroids: numpy array with shape (num clusters, vector size), the mean of each cluster's unit length vectors
+        :param cohesion: numpy array, the mean cosine similarity of each cluster's members to its centroid
+        :param labels: numpy array, the cluster label of each data point
+        :param counts: numpy array or None, a popularity count, e.g. number of comments, for each data point
+        :param count_order: numpy int array or None, data point positions grouped by cluster and sorted by decreasing count
+        """
+        self.keys = list(keys)
+        self.cluster_ids = cluster_ids
+        self.offsets = offsets
+        self.members = members
+        self.distances = distances
+        self.centroids = centroids
+        self.cohesion = cohesion
+        self.labels = labels
+        self.counts = counts
+        self.count_order = count_order
+        self.key_to_index = {k: i for i, k in enumerate(self.keys)}
+        self.cluster_to_row = {c: r for r, c in enumerate(self.cluster_ids.tolist())}
+
+    @property
+    def n_clusters(self):
+        return len(self.cluster_ids)
+
+    @property
+    def sizes(self):
+        return np.diff(self.offsets)
+
+    @property
+    def medoids(self):
+        """Positions of each cluster's medoid. For unit length vectors, the member closest to the mean vector also has the smallest total cosine distance to the other members."""
+        return self.members[self.offsets[:-1]]
+
+    @classmethod
+    def build(cls, vectors, labels, index_to_key, datapoint_counts=None):
+        """Returns a ClusterSummaryIndex for the clustering of the given vectors
+
+        :param vectors: array-like with shape (num points, vector size)
+        :param labels: array-like, cluster label of each data point
+        :param index_to_key: dict, int -> str, name of each data point
+        :param datapoint_counts: dict or pandas Series, optionally maps keys to counts used to order members by popularity
+        """
+        normed_vectors = normalize_rows(vectors)
+        labels = np.asarray(labels)
+        cluster_ids, rows, sizes = np.unique(
+            labels, return_inverse=True, return_counts=True
+        )
+        offsets = np.zeros(len(cluster_ids) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+
+        centroids = np.add.reduceat(
+            normed_vectors[np.argsort(rows, kind="stable")], offsets[:-1], axis=0
+        )
+        centroids /= sizes[:, None]
+
+        similarities = np.einsum(
+            "ij,ij->i", normed_vectors, normalize_rows(centroids)[rows]
+        )
+        members = np.lexsort((-similarities, rows))
+        cohesion = np.bincount(rows, weights=similarities) / sizes
+
+        summary_index = cls(
+            [index_to_key[i] for i in range(len(labels))],
+            cluster_ids,
+            offsets,
+            members,
+            (1.0 - similarities[members]).astype(normed_vectors.dtype),
+            centroids,
+            cohesion,
+            labels,
+        )
+        if datapoint_counts is not None:
+            summary_index.set_counts(datapoint_counts)
+        return summary_index
+
+    def set_counts(self, datapoint_counts):
+        """Stores a popularity count for each data point and orders each cluster's members by decreasing count.
+        Data points without a count are given 0.
+
+        :param datapoint_counts: dict or pandas Series mapping keys to counts
+        """
+        counts = (
+            get_keyed_series(datapoint_counts)
+            .reindex(pd.Index(self.keys), fill_value=0)
+            .to_numpy()
+        )
+        rows = np.searchsorted(self.cluster_ids, self.labels)
+        self.counts = counts
+        self.count_order = np.lexsort((-counts, rows))
+
+    def get_row(self, cluster_id):
+        """Returns the row of the index holding the cluster
+
+        :param cluster_id: a cluster label
+        :raises: KeyError if the cluster doesn't exist
+        """
+        return self.cluster_to_row[cluster_id]
+
+    def get_members(self, cluster_id, top_n=None, by_count=False):
+        """Returns the keys of the cluster's members, closest to the centroid first or most popular first
+
+        :param cluster_id: a cluster label
+        :param top_n: int or None, return only this many members
+        :param by_count: boolean, True to sort by decreasing count rather than distance to the centroid, requires counts to be set
+        """
+        if by_count and self.count_order is None:
+            raise ValueError("Counts must be set to sort members by count")
+        order = self.count_order if by_count else self.members
+        row = self.get_row(cluster_id)
+        start, end = self.offsets[row], self.offsets[row + 1]
+        if top_n is not None:
+            end = min(end, start + top_n)
+        return [self.keys[i] for i in order[start:end]]
+
+    def get_cluster(self, key):
+        """Returns the cluster label of the data point
+
+        :param key: str, name of the data point, e.g. a subreddit
+        :raises: KeyError if the data point isn't in the index
+        """
+        return self.labels[self.key_to_index[key]]
+
+    def get_medoid(self, cluster_id):
+        """Returns the key of the cluster's medoid
+
+        :param cluster_id: a cluster label
+        """
+        return self.keys[self.members[self.offsets[self.get_row(cluster_id)]]]
+
+    def get_centroid(self, cluster_id):
+        """Returns the cluster's centroid vector
+
+        :param cluster_id: a cluster label
+        """
+        return self.centroids[self.get_row(cluster_id)]
+
+    def get_summary_df(self, top_n=5, cluster_col="cluster"):
+        """Returns a pandas DataFrame with one row per cluster giving its size, cohesion, medoid and top members by distance to the centroid and, if counts are set, by count
+
+        :param top_n: int, number of top members to list for each cluster
+        :param cluster_col: str, name of the cluster label column
+        """
+        summary_df = pd.DataFrame(
+            {
+                cluster_col: self.cluster_ids,
+                "size": self.sizes,
+                "cohesion": self.cohesion,
+                "medoid": [self.keys[i] for i in self.medoids],
+                "top_members": [
+                    " ".join(self.get_members(c, top_n)) for c in self.cluster_ids
+                ],
+            }
+        )
+        if self.count_order is not None:
+            summary_df["top_members_by_count"] = [
+                " ".join(self.get_members(c, top_n, by_count=True))
+                for c in self.cluster_ids
+            ]
+        return summary_df
+
+    def save(self, save_dir):
+        """Writes each array to a numpy .npy file and the data point keys to json in save_dir
+
+        :param save_dir: str, directory to write the index to
+        """
+        os.makedirs(save_dir, exist_ok=True)
+        for name in self.ARRAYS:
+            array = getattr(self, name)
+            if array is not None:
+                np.save(os.path.join(save_dir, f"{name}.npy"), array)
+        with open(os.path.join(save_dir, self.KEYS_FILE_NAME), "w") as f:
+            json.dump(self.keys, f)
+
+    @classmethod
+    def load(cls, load_dir, mmap_mode="r"):
+        """Returns the ClusterSummaryIndex saved in load_dir
+
+        :param load_dir: str, directory of the index
+        :param mmap_mode: str or None, passed to numpy.load. The default memory maps the arrays read only, use None to read them into memory
+        """
+        with open(os.path.join(load_dir, cls.KEYS_FILE_NAME)) as f:
+            keys = json.load(f)
+        arrays = {}
+        for name in cls.ARRAYS:
+            array_path = os.path.join(load_dir, f"{name}.npy")
+            if os.path.exists(array_path):
+                arrays[name] = np.load(array_path, mmap_mode=mmap_mode)
+        return cls(keys, **arrays)
+
+
 class ClusteringModelFactory:
     """Return appropriate class given input params"""
 
     AFFINITY_PROP = "affinity"
     AGGLOMERATIVE = "agglomerative"
+    KNN_AGGLOMERATIVE = "knn_agglomerative"
     KMEANS = "kmeans"
+    SPHERICAL_KMEANS = "spherical_kmeans"
+    CONSENSUS = "consensus"
     GENSIM_LDA = "gensimlda"
     SPARK_LDA = "sparklda"
 
@@ -373,7 +1284,24 @@ class ClusteringModelFactory:
             "affinity": "cosine",
             "compute_distances": True,
         },
+        KNN_AGGLOMERATIVE: {
+            "n_clusters": 250,
+            "n_neighbors": 30,
+            "linkage": "average",
+        },
         KMEANS: {"n_clusters": 250, "random_state": 100},
+        SPHERICAL_KMEANS: {
+            "n_clusters": 250,
+            "random_state": 100,
+            "n_init": 4,
+            "n_jobs": -1,
+        },
+        CONSENSUS: {
+            "n_clusters": 250,
+            "n_runs": 10,
+            "random_state": 100,
+            "n_jobs": -1,
+        },
         GENSIM_LDA: {
             "num_topics": 250,
             "alpha": "asymmetric",
@@ -391,13 +1319,20 @@ class ClusteringModelFactory:
 
     @classmethod
     def init_clustering_model(
-        cls, model_choice, data, index, model_name=None, **kwargs
+        cls,
+        model_choice,
+        data,
+        index,
+        model_name=None,
+        dtype=DEFAULT_VECTOR_DTYPE,
+        **kwargs,
     ):
         """Returns a ClusteringModel instance instantiated with the appropriate parameters and ready to train on the given data.
         :param model_choice: str, type of model to instantiate
         :param data: data used to train the model, type is dependent on the model choice. For sklearn models, should be gensim KeyedVectors and for LDA can be SparkCorpusIterator or some other kind of iterable data
         :param index: dict, int -> str, how to name each data point, important for exporting data for users and visualizations
         :param model_name: str, used to identify the model in output and string representation. If left as None, then choice value will be used as model name
+        :param dtype: str or numpy dtype, type of vectors or precomputed distances passed to sklearn models
         :param kwargs: parameters to pass to the sklearn or Gensim model
         """
         if model_name is None:
@@ -421,9 +1356,9 @@ class ClusteringModelFactory:
                 logger.debug(
                     "Determining precomputed distances as vector input to model"
                 )
-                vectors = np.zeros((len(index), len(index)))
+                vectors = np.zeros((len(index), len(index)), dtype=dtype)
                 for i, v in index.items():
-                    vectors[i] = np.array(data.distances(v))
+                    vectors[i] = data.distances(v)
             else:
                 logger.debug("Getting normed vectors as vector input to model")
                 vectors = data.get_normed_vectors()
@@ -434,12 +1369,21 @@ class ClusteringModelFactory:
             return GensimLDAModel(vectors, model_id, index, **parameters)
         elif model_choice == cls.SPARK_LDA:
             return SparkLDAModel(vectors, model_id, index, **parameters)
-        elif model_choice == cls.KMEANS:
+
+        # No copy is made when the vectors already have the requested type
+        vectors = np.asarray(vectors, dtype=dtype)
+        if model_choice == cls.KMEANS:
             model = KMeans(**parameters)
+        elif model_choice == cls.SPHERICAL_KMEANS:
+            model = SphericalKMeans(**parameters)
+        elif model_choice == cls.CONSENSUS:
+            model = ConsensusClustering(**parameters)
         elif model_choice == cls.AFFINITY_PROP:
             model = AffinityPropagation(**parameters)
         elif model_choice == cls.AGGLOMERATIVE:
             model = AgglomerativeClustering(**parameters)
+        elif model_choice == cls.KNN_AGGLOMERATIVE:
+            model = KnnAgglomerativeClustering(**parameters)
         else:
             raise ValueError(f"Model type '{model_choice}' is not supported")
 
@@ -453,6 +1397,8 @@ class ClusteringModel:
     MODEL_NAME_KEY = "model_name"
     PARAMETERS_JSON = "parameters.json"
     MODEL_FILE = "sklearn_cluster_model.joblib"
+    MERGE_TREE_FILE = "merge_tree.npz"
+    SUMMARY_INDEX_DIR = "cluster_summary"
 
     def __init__(self, data, clustering_model, model_name, index_to_key):
         """
@@ -465,18 +1411,49 @@ class ClusteringModel:
         self.index_to_key = index_to_key
         self.clustering_model = clustering_model
         self.model_name = model_name
+        # n_clusters -> labels cut from the merge tree of hierarchical models
+        self.labels_cache = {}
+        self.summary_index = None
 
     @property
     def clusters(self):
         return self.clustering_model.labels_
 
+    @property
+    def is_hierarchical(self):
+        """True if the model has a merge tree that labels_at can cut"""
+        return hasattr(self.clustering_model, "children_")
+
     def train(self):
         """Fits the model to data and predicts the cluster labels for each data point.
         Returns the predicted clusters for each data point in training data
         """
         logger.info("Fitting ClusteringModel")
+        self.labels_cache = {}
         self.clustering_model.fit_predict(self.data)
         logger.info("Finished fitting ClusteringModel")
+        if self.index_to_key is not None and self.has_vector_data:
+            self.build_summary_index()
+
+    @property
+    def has_vector_data(self):
+        """True if the training data are vectors rather than precomputed distances"""
+        params = self.clustering_model.get_params()
+        return isinstance(self.data, np.ndarray) and "precomputed" not in (
+            params.get("affinity"),
+            params.get("metric"),
+        )
+
+    def build_summary_index(self, datapoint_counts=None):
+        """Computes and returns the ClusterSummaryIndex of the trained clusters, which is also stored as the summary_index attribute and saved with the model
+
+        :param datapoint_counts: dict or pandas Series, optionally maps keys to counts, e.g. number of comments in each subreddit, used to order cluster members by popularity
+        """
+        logger.info("Building cluster summary index")
+        self.summary_index = ClusterSummaryIndex.build(
+            self.data, self.clusters, self.index_to_key, datapoint_counts
+        )
+        return self.summary_index
 
     def predict(self, new_data, missing_value_result=None):
         """Returns cluster assignments for the given data as a numpy array.
@@ -484,8 +1461,14 @@ class ClusteringModel:
         :param new_data: numpy array, data to predict clusters for
         :param missing_value_result: obj, what to fill in if this data point cannot be clustered
         """
-        # sklearn.AgglomerativeClustering doesn't have a .predict method
-        if isinstance(self.clustering_model, AgglomerativeClustering):
+        # Keep the training data's type, rather than letting sklearn upcast both to float64
+        if isinstance(self.data, np.ndarray):
+            new_data = np.asarray(new_data, dtype=self.data.dtype)
+        # Agglomerative and consensus models don't have a .predict method
+        if isinstance(
+            self.clustering_model,
+            (AgglomerativeClustering, KnnAgglomerativeClustering, ConsensusClustering),
+        ):
             prediction_results = np.full((len(new_data),), missing_value_result)
             # Find where each datapoint appeared in the original data, then fill it in
             for i, datapoint in enumerate(new_data):
@@ -498,20 +1481,44 @@ class ClusteringModel:
 
         return self.clustering_model.predict(new_data)
 
-    def get_cluster_results_as_df(self, datapoint_col_name="subreddit", join_df=None):
+    def labels_at(self, n_clusters):
+        """Returns cluster labels for each training data point after cutting the merge tree of a hierarchical model into n_clusters clusters, without refitting.
+        Each cut takes time linear in the number of data points and is cached.
+
+        :param n_clusters: int, number of clusters
+        """
+        if not self.is_hierarchical:
+            raise ValueError(
+                f"Model {self.model_name} has no merge tree to cut, only agglomerative models support labels_at"
+            )
+        if n_clusters not in self.labels_cache:
+            self.labels_cache[n_clusters] = cut_merge_tree(
+                self.clustering_model.children_,
+                self.clustering_model.n_leaves_,
+                n_clusters,
+            )
+        return self.labels_cache[n_clusters]
+
+    def get_cluster_results_as_df(
+        self, datapoint_col_name="subreddit", join_df=None, n_clusters=None
+    ):
         """Returns the cluster results as a Pandas DataFrame that can be used to easily display or plot metrics.
+        Results of consensus models also have a 'stability' column, see get_cluster_stability.
 
         :param datapoint_col_name: str, name of column that serves as key for data points
         :param join_df: Pandas DataFrame, optionally inner join this dataframe on the datapoint_col_name in the returned results
+        :param n_clusters: int or None, for hierarchical models, return labels cut from the merge tree at this number of clusters instead of the trained labels
         """
-        datapoints = [
-            (val, self.clustering_model.labels_[idx])
-            for idx, val in self.index_to_key.items()
-        ]
+        labels = self.clusters if n_clusters is None else self.labels_at(n_clusters)
+        datapoints = [(val, labels[idx]) for idx, val in self.index_to_key.items()]
         cluster_df = pd.DataFrame(
             datapoints, columns=[datapoint_col_name, self.model_name]
         )
         cluster_df[self.model_name] = cluster_df[self.model_name].astype("category")
+        if n_clusters is None and hasattr(self.clustering_model, "stability_"):
+            cluster_df[STABILITY_COL] = self.clustering_model.stability_[
+                list(self.index_to_key.keys())
+            ]
         if join_df is not None:
             logger.debug(
                 "Joining cluster results with input dataframe on '%s'",
@@ -539,13 +1546,31 @@ class ClusteringModel:
         """Returns a dictionary mapping datapoint key (e.g. subreddit name) to its cluster assignment under this clustering model"""
         return {k: self.clusters[position] for position, k in self.index_to_key.items()}
 
-    def get_metrics(self):
+    def get_cluster_assignments_as_series(self):
+        """Returns a pandas Series of cluster assignments indexed by datapoint key (e.g. subreddit name), which can be passed to compare_cluterings"""
+        positions = np.fromiter(self.index_to_key.keys(), dtype=np.int64)
+        return pd.Series(
+            np.asarray(self.clusters)[positions], index=list(self.index_to_key.values())
+        )
+
+    def get_metrics(self, silhouette_sample_size=None, random_state=None):
         """Returns Silhouette Coefficient, Caliniski-Harbasz Index and Davis-Bouldin Index for the trained clustering model on the given data as a dictionary.
         Returns an empty dictionary if the model learned only one cluster.
+
+        :param silhouette_sample_size: int or None, compute the Silhouette Coefficient on a random sample of this many data points rather than all pairs of data points
+        :param random_state: int or None, seed for the Silhouette sample
         """
         labels = self.clustering_model.labels_
         if len(set(labels)) > 1:
-            silhouette = metrics.silhouette_score(self.data, labels, metric="cosine")
+            if silhouette_sample_size is not None:
+                silhouette_sample_size = min(silhouette_sample_size, len(labels))
+            silhouette = metrics.silhouette_score(
+                self.data,
+                labels,
+                metric="cosine",
+                sample_size=silhouette_sample_size,
+                random_state=random_state,
+            )
             ch_index = metrics.calinski_harabasz_score(self.data, labels)
             db_index = metrics.davies_bouldin_score(self.data, labels)
             return {
@@ -583,6 +1608,11 @@ class ClusteringModel:
         os.makedirs(output_dir, exist_ok=True)
         self.save_model(os.path.join(output_dir, self.MODEL_FILE))
         self.save_parameters(os.path.join(output_dir, self.PARAMETERS_JSON))
+        if hasattr(self.clustering_model, "children_"):
+            self.save_merge_tree(os.path.join(output_dir, self.MERGE_TREE_FILE))
+        # LDA models don't call this constructor and have no summary index
+        if getattr(self, "summary_index", None) is not None:
+            self.summary_index.save(os.path.join(output_dir, self.SUMMARY_INDEX_DIR))
         logger.debug("All ClusterModel components saved")
 
     def save_model(self, model_path):
@@ -591,6 +1621,18 @@ class ClusteringModel:
         """
         joblib.dump(self.clustering_model, model_path)
 
+    def save_merge_tree(self, merge_tree_path):
+        """Writes the children, merge distances and number of leaves of a hierarchical model to a numpy .npz file, so clusterings with any number of clusters can be cut from the tree without loading the model
+        :param merge_tree_path: str, file type, path to write the merge tree to
+        """
+        merge_tree = {
+            "children": self.clustering_model.children_,
+            "n_leaves": self.clustering_model.n_leaves_,
+        }
+        if hasattr(self.clustering_model, "distances_"):
+            merge_tree["distances"] = self.clustering_model.distances_
+        np.savez(merge_tree_path, **merge_tree)
+
     def save_parameters(self, parameters_path):
         """Saves the parameters of this model as json
         :param parameters_path: str, file type, path to write json to
@@ -604,6 +1646,7 @@ class ClusteringModel:
         :param model_path: str or path, joblib file
         """
         self.clustering_model = joblib.load(model_path)
+        self.labels_cache = {}
 
     @classmethod
     def load_model_name(cls, param_json_path):
@@ -649,6 +1692,9 @@ class ClusteringModel:
         clustermodel.model_name = cls.load_model_name(
             cls.get_param_json_path(directory)
         )
+        summary_index_dir = os.path.join(directory, cls.SUMMARY_INDEX_DIR)
+        if os.path.exists(summary_index_dir):
+            clustermodel.summary_index = ClusterSummaryIndex.load(summary_index_dir)
         return clustermodel
 
 
@@ -1032,6 +2078,41 @@ class SparkLDAModel(DocumentClusteringModel):
             topics=topics, corpus=bow_corpus, dictionary=gensim_dict, coherence="u_mass"
         )
 
+    def get_coherence(self, topn=20, measure=UMASS):
+        """Returns the model's coherence on the training corpus, computed in Spark.
+        Document co-occurrences are only counted for pairs of top terms within each topic, so the corpus is never collected to the driver.
+        The u_mass result matches get_coherence_model().get_coherence(). NPMI uses document co-occurrence, rather than the sliding windows used by gensim's 'c_npmi'.
+
+        :param topn: int, defaults to 20, how many top terms for a topic to use when computing coherence
+        :param measure: str, UMASS or NPMI
+        """
+        logger.debug("Computing %s coherence in Spark with %s topic terms", measure, topn)
+        topics_df = self.clustering_model.describeTopics(maxTermsPerTopic=topn)
+        topics = [
+            [int(i) for i in r["termIndices"]]
+            for r in topics_df.orderBy("topic").select("termIndices").collect()
+        ]
+        segmented_topics = segment_topics(topics, measure)
+        num_docs, term_counts, pair_counts = get_spark_document_cooccurrence_counts(
+            self.corpus.document_dataframe,
+            self.corpus.vectorized_col,
+            itertools.chain.from_iterable(segmented_topics),
+        )
+        topic_coherences = get_topic_coherences(
+            segmented_topics, num_docs, term_counts, pair_counts, measure
+        )
+        return float(np.mean(topic_coherences))
+
+    def get_metrics(self, topn=20):
+        """Returns LDA coherence in dictionary, computed in Spark
+
+        :param topn: int, number of top words to be extracted for each topic
+        """
+        logger.info("Starting computing LDA metrics")
+        metrics = {"Coherence": self.get_coherence(topn)}
+        logger.info("Finished computing LDA metrics: %s", metrics)
+        return metrics
+
     # TODO  - not sure how to implement this for online LDA optimizer
     def get_term_topics(self, word):
         pass
@@ -1156,6 +2237,9 @@ def main(
     metrics_json="metrics.json",
     model_name=None,
     is_quiet=False,
+    cut_n_clusters=None,
+    dtype=DEFAULT_VECTOR_DTYPE,
+    datapoint_counts=None,
 ):
     """Main method to train a clustering model, then save model and cluster outputs. Returns the trained model.
 
@@ -1169,13 +2253,22 @@ def main(
     :param metrics_json: str, if specified, save model metrics to this file as a json
     :param model_name: str or None, if not None, overrides the default model name
     :param is_quiet: boolean, set to true to silence print statements for metrics
+    :param cut_n_clusters: list of int or None, for agglomerative models, also save clusters cut from the single trained merge tree at each of these numbers of clusters. Each is written to a CSV named like clusters_csv_filename with the number of clusters as a suffix, e.g. 'clusters_100.csv'
+    :param dtype: str or numpy dtype, type of vectors used for training and metrics of sklearn models
+    :param datapoint_counts: dict or pandas Series or None, maps keys to counts, e.g. number of comments in each subreddit, used to order members of each cluster by popularity in the saved cluster summary index
     """
+    if cut_n_clusters and clusters_csv_filename is None:
+        raise ValueError(
+            "clusters_csv_filename is required to save clusters for cut_n_clusters"
+        )
     model = ClusteringModelFactory.init_clustering_model(
-        model_choice, data, index, model_name, **cluster_params
+        model_choice, data, index, model_name, dtype, **cluster_params
     )
     logger.info("Training model %s", model.model_name)
     model.train()
     logger.info("Finished training model %s", model.model_name)
+    if datapoint_counts is not None and getattr(model, "summary_index", None):
+        model.summary_index.set_counts(datapoint_counts)
     logger.info("Saving model %s to %s", model.model_name, experiment_dir)
     model.save(experiment_dir)
 
@@ -1192,6 +2285,17 @@ def main(
         logger.info("Saving clusters to CSV %s", cluster_csv)
         model.get_cluster_results_as_df().to_csv(cluster_csv, index=False)
 
+    if cut_n_clusters:
+        csv_stem, csv_ext = os.path.splitext(clusters_csv_filename)
+        for n_clusters in cut_n_clusters:
+            cut_csv = os.path.join(experiment_dir, f"{csv_stem}_{n_clusters}{csv_ext}")
+            logger.info(
+                "Saving clusters cut at %s clusters to CSV %s", n_clusters, cut_csv
+            )
+            model.get_cluster_results_as_df(n_clusters=n_clusters).to_csv(
+                cut_csv, index=False
+            )
+
     if (
         model_choice
         in [ClusteringModelFactory.GENSIM_LDA, ClusteringModelFactory.SPARK_LDA]
@@ -1204,6 +2308,187 @@ def main(
     return model
 
 
+def get_sweep_metrics(
+    vectors,
+    model_choice,
+    n_clusters,
+    cluster_params,
+    silhouette_sample_size=10000,
+    random_state=None,
+    dtype=DEFAULT_VECTOR_DTYPE,
+):
+    """Trains one clustering model with n_clusters clusters and returns its metrics as a list of (n_clusters, metric name, value) tuples.
+    Metrics are those from ClusteringModel.get_metrics with a sampled Silhouette Coefficient, the model's inertia when it has one and the training time in seconds.
+
+    :param vectors: numpy array with shape (num points, num dimensions)
+    :param model_choice: str, type of model to instantiate, see ClusteringModelFactory
+    :param n_clusters: int, number of clusters
+    :param cluster_params: dict, other keyword arguments for the model
+    :param silhouette_sample_size: int or None, number of points sampled for the Silhouette Coefficient, None uses all points
+    :param random_state: int or None, seed for the Silhouette sample
+    :param dtype: str or numpy dtype, type of vectors used for training and metrics
+    """
+    model = ClusteringModelFactory.init_clustering_model(
+        model_choice,
+        vectors,
+        None,
+        dtype=dtype,
+        n_clusters=n_clusters,
+        **cluster_params,
+    )
+    start = time.perf_counter()
+    model.train()
+    seconds = time.perf_counter() - start
+    model_metrics = model.get_metrics(silhouette_sample_size, random_state)
+    if hasattr(model.clustering_model, "inertia_"):
+        model_metrics[INERTIA] = model.clustering_model.inertia_
+    model_metrics[TRAINING_SECONDS] = seconds
+    return [(n_clusters, name, float(value)) for name, value in model_metrics.items()]
+
+
+def is_plateau(metric_values, tolerance, patience):
+    """Returns True if each of the last patience changes between consecutive values is smaller than tolerance relative to the earlier value
+
+    :param metric_values: list of floats, a metric for increasing numbers of clusters
+    :param tolerance: float, relative change below which the metric is considered flat
+    :param patience: int, number of consecutive flat changes needed
+    """
+    if len(metric_values) <= patience:
+        return False
+    recent = np.array(metric_values[-(patience + 1) :])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        relative_changes = np.abs(np.diff(recent)) / np.abs(recent[:-1])
+    return bool(np.all(relative_changes < tolerance))
+
+
+def sweep_n_clusters(
+    vectors,
+    n_clusters_options,
+    model_choice=ClusteringModelFactory.KMEANS,
+    cluster_params=None,
+    workers=1,
+    silhouette_sample_size=10000,
+    random_state=100,
+    plateau_metric=INERTIA,
+    plateau_tolerance=None,
+    plateau_patience=2,
+    dtype=DEFAULT_VECTOR_DTYPE,
+):
+    """Trains a clustering model for each number of clusters and returns their metrics as a tidy pandas DataFrame with columns 'n_clusters', 'metric' and 'value'.
+    Models are trained in a pool of worker processes, which joblib gives a single shared memory-mapped copy of the vectors.
+    Numbers of clusters are trained in increasing order in batches of one per worker. When plateau_tolerance is given, the sweep stops after the batch where plateau_metric stops changing.
+
+    :param vectors: numpy array with shape (num points, num dimensions), e.g. normed community2vec vectors
+    :param n_clusters_options: list of int, numbers of clusters to try
+    :param model_choice: str, type of model to instantiate, see ClusteringModelFactory
+    :param cluster_params: dict or None, other keyword arguments for the model
+    :param workers: int, number of models trained in parallel
+    :param silhouette_sample_size: int or None, number of points sampled for the Silhouette Coefficient, None uses all points
+    :param random_state: int or None, seed for the Silhouette sample
+    :param plateau_metric: str, name of the metric checked for a plateau
+    :param plateau_tolerance: float or None, stop once plateau_metric changes by less than this fraction between consecutive numbers of clusters plateau_patience times in a row. None never stops early
+    :param plateau_patience: int, number of consecutive small changes that count as a plateau
+    :param dtype: str or numpy dtype, type of vectors used for training and metrics
+    """
+    cluster_params = {} if cluster_params is None else cluster_params
+    # Convert once here, so workers share a single array of the right type
+    vectors = np.asarray(vectors, dtype=dtype)
+    n_clusters_options = sorted(n_clusters_options)
+    batch_size = joblib.effective_n_jobs(workers)
+    rows = list()
+    with joblib.Parallel(n_jobs=workers) as parallel:
+        for start in range(0, len(n_clusters_options), batch_size):
+            batch = n_clusters_options[start : start + batch_size]
+            logger.info("Training models with n_clusters %s", batch)
+            for batch_rows in parallel(
+                joblib.delayed(get_sweep_metrics)(
+                    vectors,
+                    model_choice,
+                    k,
+                    cluster_params,
+                    silhouette_sample_size,
+                    random_state,
+                    dtype,
+                )
+                for k in batch
+            ):
+                rows.extend(batch_rows)
+            if plateau_tolerance is not None:
+                metric_values = [r[2] for r in rows if r[1] == plateau_metric]
+                if is_plateau(metric_values, plateau_tolerance, plateau_patience):
+                    logger.info(
+                        "%s plateaued at n_clusters %s, stopping sweep",
+                        plateau_metric,
+                        batch[-1],
+                    )
+                    break
+    return pd.DataFrame(rows, columns=[N_CLUSTERS_COL, METRIC_COL, VALUE_COL])
+
+
+def benchmark_vector_dtypes(
+    vectors,
+    model_choice=ClusteringModelFactory.SPHERICAL_KMEANS,
+    n_clusters=250,
+    dtypes=(DEFAULT_VECTOR_DTYPE, "float64"),
+    silhouette_sample_size=10000,
+    random_state=100,
+    **cluster_params,
+):
+    """Trains, evaluates and predicts with the same clustering model on vectors of each type, returning a list of dictionaries with the size of the vectors, peak memory allocated in MB and the time in seconds for each step.
+    Also reports the adjusted Rand index between the clusters from each type and the first type.
+
+    :param vectors: numpy array with shape (num points, num dimensions)
+    :param model_choice: str, type of model to instantiate, see ClusteringModelFactory
+    :param n_clusters: int, number of clusters
+    :param dtypes: list of str or numpy dtypes to compare
+    :param silhouette_sample_size: int or None, number of points sampled for the Silhouette Coefficient
+    :param random_state: int or None, seed for the model and the Silhouette sample
+    :param cluster_params: other keyword arguments for the model
+    """
+    results = list()
+    reference_labels = None
+    for dtype in dtypes:
+        tracemalloc.start()
+        model = ClusteringModelFactory.init_clustering_model(
+            model_choice,
+            vectors,
+            None,
+            dtype=dtype,
+            n_clusters=n_clusters,
+            random_state=random_state,
+            **cluster_params,
+        )
+        start = time.perf_counter()
+        model.train()
+        fit_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        model.get_metrics(silhouette_sample_size, random_state)
+        metrics_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        model.predict(vectors)
+        predict_seconds = time.perf_counter() - start
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        if reference_labels is None:
+            reference_labels = model.clusters
+        results.append(
+            {
+                "dtype": str(np.dtype(dtype)),
+                "vectors_mb": model.data.nbytes / 1e6,
+                "peak_mb": peak_bytes / 1e6,
+                "fit_seconds": fit_seconds,
+                "metrics_seconds": metrics_seconds,
+                "predict_seconds": predict_seconds,
+                "adjusted_rand_index": metrics.adjusted_rand_score(
+                    reference_labels, model.clusters
+                ),
+            }
+        )
+        logger.info("Vector type benchmark: %s", results[-1])
+    return results
+
+
 parser = argparse.ArgumentParser(description="Produce clusterings of the input data")
 parser.add_argument(
     "-q",
@@ -1280,6 +2565,54 @@ parser.add_argument(
     default="3s",
 )
 
+parser.add_argument(
+    "--cut_n_clusters",
+    nargs="+",
+    type=int,
+    help="For agglomerative models only, also write cluster CSVs for each of these numbers of clusters, cut from the single trained merge tree without refitting. Files are named like 'clusters_100.csv'. Use with 'compute_full_tree': true in --cluster_params for sklearn agglomerative models, the knn_agglomerative model always builds the full tree.",
+)
+
+parser.add_argument(
+    "--counts_csv",
+    type=pathlib.Path,
+    help="CSV where the first column is the subreddit and the second is the number of comments in that subreddit. When given, members of each cluster are also ordered by number of comments in the saved cluster summary index. Only used with KeyedVectors data.",
+)
+
+parser.add_argument(
+    "--float64",
+    action="store_true",
+    help="Use this flag to train and evaluate sklearn models on float64 vectors rather than float32, for example to check the reproducibility of results.",
+)
+parser.add_argument(
+    "--sweep_n_clusters",
+    nargs="+",
+    type=int,
+    help="Instead of training one model, train a model for each of these numbers of clusters and write a tidy table of their metrics to 'sweep_metrics.csv' in the output directory. Only used with KeyedVectors data.",
+)
+parser.add_argument(
+    "--sweep_workers",
+    type=int,
+    default=1,
+    help="Number of models trained in parallel processes when using --sweep_n_clusters. Defaults to 1.",
+)
+parser.add_argument(
+    "--silhouette_sample_size",
+    type=int,
+    default=10000,
+    help="Number of data points sampled to compute the Silhouette Coefficient when using --sweep_n_clusters. Defaults to 10000.",
+)
+parser.add_argument(
+    "--plateau_tolerance",
+    type=float,
+    help="Stop a --sweep_n_clusters sweep early once the relative change in inertia between consecutive numbers of clusters is below this value --plateau_patience times in a row.",
+)
+parser.add_argument(
+    "--plateau_patience",
+    type=int,
+    default=2,
+    help="Number of consecutive small changes in inertia that stop a sweep when --plateau_tolerance is given. Defaults to 2.",
+)
+
 parser.add_argument(
     "--model-name",
     type=str,
@@ -1304,6 +2637,8 @@ if __name__ == "__main__":
             logger.debug("Loading KeyedVectors")
             data = gm.KeyedVectors.load(args.input[0])
             index = dict(enumerate(data.index_to_key))
+        elif args.sweep_n_clusters:
+            raise ValueError("--sweep_n_clusters only supports KeyedVectors data")
         else:
             spark = ihop.utils.get_spark_session("IHOP LDA Clustering", config[0])
 
@@ -1341,14 +2676,41 @@ if __name__ == "__main__":
 
             index = pipeline.get_id_to_word()
 
-        main(
-            args.cluster_type,
-            data,
-            index,
-            args.output_dir,
-            args.cluster_params,
-            is_quiet=args.quiet,
-            model_name=args.model_name,
-        )
+        dtype = "float64" if args.float64 else DEFAULT_VECTOR_DTYPE
+        if args.sweep_n_clusters:
+            sweep_metrics = sweep_n_clusters(
+                data.get_normed_vectors(),
+                args.sweep_n_clusters,
+                args.cluster_type,
+                args.cluster_params,
+                args.sweep_workers,
+                args.silhouette_sample_size,
+                plateau_tolerance=args.plateau_tolerance,
+                plateau_patience=args.plateau_patience,
+                dtype=dtype,
+            )
+            os.makedirs(args.output_dir, exist_ok=True)
+            sweep_csv = os.path.join(args.output_dir, SWEEP_METRICS_CSV)
+            logger.info("Saving sweep metrics to CSV %s", sweep_csv)
+            sweep_metrics.to_csv(sweep_csv, index=False)
+        else:
+            datapoint_counts = None
+            if args.counts_csv is not None:
+                counts_df = pd.read_csv(args.counts_csv, header=0)
+                datapoint_counts = counts_df.set_index(counts_df.columns[0])[
+                    counts_df.columns[1]
+                ]
+            main(
+                args.cluster_type,
+                data,
+                index,
+                args.output_dir,
+                args.cluster_params,
+                is_quiet=args.quiet,
+                model_name=args.model_name,
+                cut_n_clusters=args.cut_n_clusters,
+                dtype=dtype,
+                datapoint_counts=datapoint_counts,
+            )
     except Exception:
         logger.error("Fatal error during cluster training", exc_info=True)
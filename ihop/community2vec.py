@@ -4,26 +4,34 @@ Inputs:
 1) CSV of subreddits (other columns optional) to use as vocabulary
 
 2) Multiple CSVs with user,words used as document contexts
-
-.. TODO Code cleanup: introduce an additional class/mixin for embedding operations post-training that don't need to be tied to Gensim and training (e.g. tsne, distance operations, etc...)
 """
 import argparse
+import collections
 import csv
 import functools
 import importlib.resources
 import itertools
 import json
 import logging
+import multiprocessing
 import operator
 import os
 import pathlib
+import queue
+import resource
 import shutil
+import sys
+import tempfile
+import time
+import warnings
 
 import gensim
+import numpy as np
 import pandas as pd
 import pyspark.sql.functions as fn
 from pyspark.sql.types import StringType, StructField, StructType
 
+from ihop.import_data import SUBREDDIT_COUNT_SEPARATOR
 import ihop.utils
 
 logger = logging.getLogger(__name__)
@@ -33,6 +41,8 @@ INPUT_CSV_SCHEMA = StructType([StructField("subreddit_list", StringType(), False
 
 # The filename for gensim vectors stored for community2vec models
 VECTORS_FILE_NAME = "keyedVectors"
+# Unit length vectors are stored as a .npy file next to the gensim vectors with this suffix
+NORMED_VECTORS_SUFFIX = "_normed.npy"
 
 # Metrics json output keys
 # These are the only ones that need to be used outside this class for displaying
@@ -43,6 +53,43 @@ ANALOGY_ACC_KEY = "analogy_accuracy"
 DETAILED_ANALOGY_KEY = "detailed_analogy_results"
 NUM_USERS_KEY = "num_users"
 MAX_COMMENTS_KEY = "max_comments"
+WARM_START_KEY = "warm_start_model"
+TRAINING_SECONDS_KEY = "training_seconds"
+COLD_START_ANALOGY_ACC_KEY = "cold_start_analogy_accuracy"
+COLD_START_TRAINING_SECONDS_KEY = "cold_start_training_seconds"
+# Summaries of per epoch training telemetry added to grid search results
+MEAN_EPOCH_SECONDS_KEY = "mean_epoch_seconds"
+MEAN_WORDS_PER_SECOND_KEY = "mean_words_per_second"
+MEAN_PAIRS_PER_SECOND_KEY = "mean_pairs_per_second"
+MAX_RSS_MB_KEY = "max_rss_mb"
+EPOCH_ANALOGY_ACC_KEY = "epoch_analogy_accuracies"
+TELEMETRY_SUMMARY_KEYS = [
+    MEAN_EPOCH_SECONDS_KEY,
+    MEAN_WORDS_PER_SECOND_KEY,
+    MEAN_PAIRS_PER_SECOND_KEY,
+    MAX_RSS_MB_KEY,
+    EPOCH_ANALOGY_ACC_KEY,
+]
+
+# Per epoch training telemetry is written next to each saved model as json lines
+TELEMETRY_FILE_NAME = "epoch_telemetry.jsonl"
+
+# Calibration of workers and batch_words is stored in the output directory with this name
+CALIBRATION_JSON_NAME = "training_calibration.json"
+# How many users are sampled for calibration runs by default
+DEFAULT_CALIBRATION_USERS = 10000
+
+# How many neighbors are precomputed for each subreddit by default
+DEFAULT_NEIGHBOR_INDEX_K = 100
+
+# How subreddit counts from compressed user contexts are turned into repetitions for Gensim training
+# 'linear' repeats a subreddit once per comment, 'log' repeats it 1 + floor(log2(count)) times
+LINEAR_WEIGHTING = "linear"
+LOG_WEIGHTING = "log"
+COUNT_WEIGHTINGS = [LINEAR_WEIGHTING, LOG_WEIGHTING]
+
+# Scores are clipped to this range before the sigmoid in pair sampling training, as in word2vec
+MAX_EXP = 6.0
 
 
 def get_vocabulary(vocabulary_csv, has_header=True, token_index=0, count_index=1):
@@ -61,20 +108,34 @@ def get_vocabulary(vocabulary_csv, has_header=True, token_index=0, count_index=1
     return vocab
 
 
-def get_w2v_params_from_spark_df(spark, contexts_path):
+def get_w2v_params_from_spark_df(
+    spark, contexts_path, max_repeats=None, count_weighting=LINEAR_WEIGHTING
+):
     """Returns number of contexts and longest context size from a spark dataframe.
-    In the community2vec setting this corresponds to the number of users and largest number of comments for a single user
+    In the community2vec setting this corresponds to the number of users and largest number of comments for a single user.
+    Contexts written as subreddit counts are measured by the length of the sentences that SubredditCountSentences will produce.
 
     :param spark: Spark context
     :param contexts_path: str, path to a csv dataframe matching the input schema
+    :param max_repeats: int or None, the maximum number of times a subreddit is repeated in a context during training
+    :param count_weighting: str, 'linear' or 'log', how subreddit counts are turned into repetitions during training
     """
     context_df = spark.read.csv(contexts_path, header=False, schema=INPUT_CSV_SCHEMA)
 
     num_users = context_df.count()
 
+    count_expr = f"coalesce(cast(element_at(split(t, '{SUBREDDIT_COUNT_SEPARATOR}'), 2) as int), 1)"
+    if count_weighting == LOG_WEIGHTING:
+        count_expr = f"1 + cast(floor(log2({count_expr})) as int)"
+    if max_repeats:
+        count_expr = f"least({count_expr}, {int(max_repeats)})"
     max_comments = (
         context_df.select(fn.split("subreddit_list", " ").alias("subreddit_list"))
-        .select(fn.size("subreddit_list").alias("num_comments"))
+        .select(
+            fn.expr(
+                f"aggregate(transform(subreddit_list, t -> {count_expr}), 0, (acc, x) -> acc + x)"
+            ).alias("num_comments")
+        )
         .agg(fn.max("num_comments"))
         .head()[0]
     )
@@ -82,6 +143,334 @@ def get_w2v_params_from_spark_df(spark, contexts_path):
     return num_users, max_comments
 
 
+def parse_subreddit_count(token):
+    """Returns a (subreddit, count) tuple for a token from a user context.
+    Tokens written as counts look like 'nba:12', any other token has a count of 1.
+
+    :param token: str, a single whitespace delimited token from a user context
+    """
+    subreddit, separator, count = token.rpartition(SUBREDDIT_COUNT_SEPARATOR)
+    if separator and count.isdigit():
+        return subreddit, int(count)
+    return token, 1
+
+
+def expand_subreddit_counts(sentence, max_repeats=None, count_weighting=LINEAR_WEIGHTING):
+    """Returns a user context as a list of subreddits where each subreddit is repeated according to its count, see get_num_repeats
+
+    :param sentence: list of str, tokens from a user context, either plain subreddits or 'subreddit:count'
+    :param max_repeats: int or None, the maximum number of repetitions of a subreddit
+    :param count_weighting: str, 'linear' or 'log', how counts are turned into repetitions
+    """
+    user_counts = collections.Counter()
+    for token in sentence:
+        subreddit, count = parse_subreddit_count(token)
+        user_counts[subreddit] += count
+    expanded = []
+    for subreddit, count in user_counts.items():
+        expanded.extend(
+            [subreddit] * get_num_repeats(count, max_repeats, count_weighting)
+        )
+    return expanded
+
+
+def get_num_repeats(count, max_repeats=None, count_weighting=LINEAR_WEIGHTING):
+    """Returns how many times a subreddit with the given comment count is repeated in a training sentence.
+
+    :param count: int, number of comments by the user in the subreddit
+    :param max_repeats: int or None, the maximum number of repetitions
+    :param count_weighting: str, 'linear' to repeat once per comment, 'log' for 1 + floor(log2(count)) repetitions
+    """
+    if count_weighting == LOG_WEIGHTING:
+        count = 1 + int(np.log2(count))
+    elif count_weighting != LINEAR_WEIGHTING:
+        raise ValueError(
+            f"Count weighting {count_weighting} is not one of {COUNT_WEIGHTINGS}"
+        )
+    if max_repeats:
+        return min(count, max_repeats)
+    return count
+
+
+def needs_count_expansion(contexts_path, max_repeats=None, count_weighting=LINEAR_WEIGHTING):
+    """Returns True if user contexts have to be rewritten with expand_subreddit_counts before training, False if Gensim can train on them as they are.
+    That's the case when repeats are capped or log weighted, or when contexts are written with subreddit counts. Contexts are written either all with counts or all without (see ihop.import_data), so only the first user context is checked.
+
+    :param contexts_path: Path to a text file or directory storing the subreddits a user commented on, one user per line
+    :param max_repeats: int or None, the maximum number of times a subreddit is repeated in a sentence
+    :param count_weighting: str, 'linear' or 'log', how counts are turned into repetitions
+    """
+    if max_repeats or count_weighting != LINEAR_WEIGHTING:
+        return True
+    for sentence in gensim.models.word2vec.PathLineSentences(contexts_path):
+        if sentence:
+            return any(parse_subreddit_count(token)[0] != token for token in sentence)
+    return False
+
+
+class SubredditCountSentences:
+    """Iterates over user contexts as lists of subreddits for Gensim, expanding tokens written as subreddit counts (see ihop.import_data.SUBREDDIT_COUNT_SEPARATOR) into repeated subreddits.
+    Plain contexts with one token per comment are compressed the same way when max_repeats or log weighting is used. Otherwise they are passed to Gensim unchanged, see needs_count_expansion.
+    """
+
+    def __init__(
+        self, contexts_path, max_repeats=None, count_weighting=LINEAR_WEIGHTING
+    ):
+        """
+        :param contexts_path: Path to a text file or directory storing the subreddits a user commented on, one user per line. Can be compressed as a bzip2 or gzip.
+        :param max_repeats: int or None, the maximum number of times a subreddit is repeated in a sentence
+        :param count_weighting: str, 'linear' or 'log', how counts are turned into repetitions
+        """
+        self.contexts_path = contexts_path
+        self.max_repeats = max_repeats
+        self.count_weighting = count_weighting
+        # Total number of words yielded over all passes, used for measuring throughput
+        self.words_read = 0
+
+    def __iter__(self):
+        sentences = gensim.models.word2vec.PathLineSentences(self.contexts_path)
+        if not needs_count_expansion(
+            self.contexts_path, self.max_repeats, self.count_weighting
+        ):
+            for sentence in sentences:
+                self.words_read += len(sentence)
+                yield sentence
+            return
+
+        for sentence in sentences:
+            expanded = expand_subreddit_counts(
+                sentence, self.max_repeats, self.count_weighting
+            )
+            self.words_read += len(expanded)
+            yield expanded
+
+
+def get_context_shards(contexts_path):
+    """Returns the sorted list of part files for user contexts.
+    Hidden files and files starting with '_', like Spark's _SUCCESS marker, are skipped.
+
+    :param contexts_path: Path to a text file or directory of text files storing the subreddits a user commented on, one user per line
+    """
+    if os.path.isfile(contexts_path):
+        return [str(contexts_path)]
+    return [
+        os.path.join(contexts_path, f)
+        for f in sorted(os.listdir(contexts_path))
+        if not f.startswith((".", "_"))
+        and os.path.isfile(os.path.join(contexts_path, f))
+    ]
+
+
+def decode_context_shards(
+    shard_paths, output_queue, batch_size, max_repeats, count_weighting, expand_counts=True
+):
+    """Reads and decompresses the given user context files in order, putting lists of sentences on the queue.
+    Runs in a decoder process for ShardedContextSentences. None is put on the queue after each file. If reading fails, the error message is put on the queue as a string and the process stops.
+
+    :param shard_paths: list of str, user context files to read
+    :param output_queue: multiprocessing Queue, bounded so decoders don't run too far ahead of training
+    :param batch_size: int, number of sentences in each list put on the queue
+    :param max_repeats: int or None, the maximum number of times a subreddit is repeated in a sentence
+    :param count_weighting: str, 'linear' or 'log', how counts are turned into repetitions
+    :param expand_counts: boolean, False to pass sentences on unchanged, see needs_count_expansion
+    """
+    try:
+        for shard_path in shard_paths:
+            batch = []
+            for sentence in gensim.models.word2vec.LineSentence(shard_path):
+                if expand_counts:
+                    sentence = expand_subreddit_counts(
+                        sentence, max_repeats, count_weighting
+                    )
+                batch.append(sentence)
+                if len(batch) >= batch_size:
+                    output_queue.put(batch)
+                    batch = []
+            if batch:
+                output_queue.put(batch)
+            output_queue.put(None)
+    except Exception as e:
+        output_queue.put(f"Failed to read {shard_path}: {e!r}")
+
+
+class ShardedContextSentences:
+    """Drop-in replacement for SubredditCountSentences that decompresses user context part files in parallel decoder processes.
+    Each decoder reads every n-th shard and hands batches of sentences over its own bounded queue. Shards are consumed in a fixed order, so sentence order only depends on the seed, not on decoder timing.
+    Shard order can be shuffled each epoch with a fixed seed.
+    """
+
+    # How long to wait for a batch before checking that its decoder process is still running
+    DECODER_POLL_SECONDS = 1.0
+
+    def __init__(
+        self,
+        contexts_path,
+        decoders=2,
+        queue_size=64,
+        batch_size=1000,
+        shuffle_seed=None,
+        max_repeats=None,
+        count_weighting=LINEAR_WEIGHTING,
+    ):
+        """
+        :param contexts_path: Path to a text file or directory storing the subreddits a user commented on, one user per line. Can be compressed as a bzip2 or gzip.
+        :param decoders: int, number of decoder processes
+        :param queue_size: int, the maximum number of sentence batches waiting across all decoder queues
+        :param batch_size: int, number of sentences in each batch passed from a decoder
+        :param shuffle_seed: int or None, set to shuffle the order of shards every epoch, with the epoch number added to the seed. None reads shards in sorted order
+        :param max_repeats: int or None, the maximum number of times a subreddit is repeated in a sentence
+        :param count_weighting: str, 'linear' or 'log', how counts are turned into repetitions
+        """
+        self.contexts_path = contexts_path
+        self.shards = get_context_shards(contexts_path)
+        self.decoders = max(1, min(decoders, len(self.shards)))
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.shuffle_seed = shuffle_seed
+        self.max_repeats = max_repeats
+        self.count_weighting = count_weighting
+        self.epoch = 0
+        # Total number of words yielded over all passes, used for measuring throughput
+        self.words_read = 0
+        self.epoch_stats = []
+
+    def get_shard_order(self, epoch):
+        """Returns the list of shards in the order they're read in the given epoch
+
+        :param epoch: int, the 0-indexed pass over the corpus
+        """
+        if self.shuffle_seed is None:
+            return list(self.shards)
+        rng = np.random.default_rng(self.shuffle_seed + epoch)
+        return [self.shards[i] for i in rng.permutation(len(self.shards))]
+
+    def get_batch(self, shard_queue, process):
+        """Returns the next item a decoder put on its queue.
+
+        :param shard_queue: multiprocessing Queue the decoder writes to
+        :param process: multiprocessing Process running the decoder
+        :raises: RuntimeError if the decoder exited, e.g. it was killed for running out of memory, without finishing its shards
+        """
+        while True:
+            try:
+                return shard_queue.get(timeout=self.DECODER_POLL_SECONDS)
+            except queue.Empty:
+                if not process.is_alive():
+                    break
+        # Items put just before the decoder exited may still be in transit
+        try:
+            return shard_queue.get(timeout=self.DECODER_POLL_SECONDS)
+        except queue.Empty:
+            raise RuntimeError(
+                f"Corpus decoder process exited with code {process.exitcode} before finishing its shards"
+            )
+
+    def __iter__(self):
+        shard_order = self.get_shard_order(self.epoch)
+        try:
+            expand_counts = needs_count_expansion(
+                self.contexts_path, self.max_repeats, self.count_weighting
+            )
+        except Exception as e:
+            raise RuntimeError(f"Failed to read {self.contexts_path}: {e!r}") from e
+        queues = [
+            multiprocessing.Queue(max(1, self.queue_size // self.decoders))
+            for _ in range(self.decoders)
+        ]
+        processes = [
+            multiprocessing.Process(
+                target=decode_context_shards,
+                args=(
+                    shard_order[d :: self.decoders],
+                    queues[d],
+                    self.batch_size,
+                    self.max_repeats,
+                    self.count_weighting,
+                    expand_counts,
+                ),
+                daemon=True,
+            )
+            for d in range(self.decoders)
+        ]
+        for process in processes:
+            process.start()
+
+        start_time = time.perf_counter()
+        start_words = self.words_read
+        num_sentences = 0
+        try:
+            for i in range(len(shard_order)):
+                shard_queue = queues[i % self.decoders]
+                while True:
+                    batch = self.get_batch(shard_queue, processes[i % self.decoders])
+                    if batch is None:
+                        break
+                    if isinstance(batch, str):
+                        raise RuntimeError(batch)
+                    for sentence in batch:
+                        self.words_read += len(sentence)
+                        yield sentence
+                    num_sentences += len(batch)
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+                process.join()
+
+        seconds = time.perf_counter() - start_time
+        words = self.words_read - start_words
+        stats = {
+            "epoch": self.epoch + 1,
+            "sentences": num_sentences,
+            "words": words,
+            "seconds": seconds,
+            "words_per_second": words / seconds if seconds > 0 else 0.0,
+        }
+        logger.info("Corpus reader throughput: %s", stats)
+        self.epoch_stats.append(stats)
+        self.epoch += 1
+
+
+def get_process_rss_mb():
+    """Returns the resident set size of the current process in megabytes.
+    Reads /proc on Linux and falls back to the peak resident set size elsewhere.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError):
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS, kilobytes on Linux and other platforms
+        if sys.platform == "darwin":
+            return max_rss / 2**20
+        return max_rss / 2**10
+
+
+def summarize_training_stats(training_stats):
+    """Returns a dictionary summarizing per epoch training telemetry for grid search results: mean epoch time, mean throughput, peak RSS and the analogy accuracy after each epoch as a comma separated string
+
+    :param training_stats: list of dict, the per epoch records from a model's training_stats
+    """
+    if len(training_stats) == 0:
+        return {}
+    summary = {
+        MEAN_EPOCH_SECONDS_KEY: np.mean([r["seconds"] for r in training_stats]),
+        MAX_RSS_MB_KEY: max(r["rss_mb"] for r in training_stats),
+        EPOCH_ANALOGY_ACC_KEY: ",".join(
+            str(r["analogy_accuracy"]) for r in training_stats
+        ),
+    }
+    for rate_key, summary_key in [
+        ("words_per_second", MEAN_WORDS_PER_SECOND_KEY),
+        ("pairs_per_second", MEAN_PAIRS_PER_SECOND_KEY),
+    ]:
+        rates = [r[rate_key] for r in training_stats if r.get(rate_key) is not None]
+        if rates:
+            summary[summary_key] = np.mean(rates)
+    return summary
+
+
 def analogy_sections_to_str(detailed_accs):
     """Parses the sectional analogy results from Gensim to a string for logging, displays, etc...
     :param detailed_accs: list of dict with 'correct', 'incorrect' and 'section' keys
@@ -97,23 +486,6 @@ def analogy_sections_to_str(detailed_accs):
     return ",".join(section_strings)
 
 
-class EpochLossCallback(gensim.models.callbacks.CallbackAny2Vec):
-    """Callback to print loss after each epoch.
-    See https://stackoverflow.com/questions/54888490/gensim-word2vec-print-log-loss
-    """
-
-    def __init__(self):
-        self.epoch = 1
-        self.loss_to_be_subed = 0
-
-    def on_epoch_end(self, model):
-        loss = model.get_latest_training_loss()
-        loss_now = loss - self.loss_to_be_subed
-        self.loss_to_be_subed = loss
-        logger.info(f"Loss after epoch {self.epoch}: {loss_now}")
-        self.epoch += 1
-
-
 class SaveVectorsCallback(gensim.models.callbacks.CallbackAny2Vec):
     """Callback to save embeddings for a model after each epoch"""
 
@@ -131,30 +503,389 @@ class SaveVectorsCallback(gensim.models.callbacks.CallbackAny2Vec):
         self.epoch += 1
 
 
-class AnalogyAccuracyCallback(gensim.models.callbacks.CallbackAny2Vec):
-    """Callback for reporting analogy accuracy after each epoch"""
+class TrainingTelemetryCallback(gensim.models.callbacks.CallbackAny2Vec):
+    """Callback that records structured telemetry after each epoch: wall time, words per second, the learning rate reached, cumulative loss and loss for the epoch, analogy accuracy and process RSS.
+    Loss is only tracked by Gensim when training with compute_loss=True, otherwise both losses are recorded as None.
+    """
 
-    def __init__(self, analogies_path, case_insensitive=False):
+    def __init__(self, sentences=None, analogies_path=None, case_insensitive=False):
         """
-        :param analogies_path: str, path to the analogies file for Gensim's KeyedVectors
+        :param sentences: SubredditCountSentences or None, the training corpus, used to count words read in each epoch
+        :param analogies_path: str or None, path to the analogies file for Gensim's KeyedVectors. Analogy accuracy isn't recorded if None
         :param case_insensitive: boolean, set to True to deal with case mismatch in analogy pairs. For Reddit, this should typically be False.
         """
+        self.sentences = sentences
         self.analogies_path = analogies_path
-        self.epoch = 1
         self.case_insensitive = case_insensitive
+        self.epoch = 1
+        self.records = []
+        self.epoch_start = None
+        self.previous_loss = 0.0
+        self.previous_words = 0
+
+    def on_epoch_begin(self, w2v_model):
+        self.epoch_start = time.perf_counter()
+        if self.sentences is not None:
+            self.previous_words = self.sentences.words_read
 
     def on_epoch_end(self, w2v_model):
-        max_vocab = len(w2v_model.wv.index_to_key) + 1
-        score, _ = w2v_model.wv.evaluate_word_analogies(
-            self.analogies_path,
-            restrict_vocab=max_vocab,
-            case_insensitive=self.case_insensitive,
-        )
-        logger.info(f"Analogy score after epoch {self.epoch}: {score}")
+        seconds = time.perf_counter() - self.epoch_start
+        loss = None
+        epoch_loss = None
+        if w2v_model.compute_loss:
+            loss = w2v_model.get_latest_training_loss()
+            epoch_loss = loss - self.previous_loss
+            self.previous_loss = loss
+        record = {
+            "epoch": self.epoch,
+            "seconds": seconds,
+            "words": None,
+            "words_per_second": None,
+            "alpha": w2v_model.min_alpha_yet_reached,
+            "loss": loss,
+            "epoch_loss": epoch_loss,
+            "analogy_accuracy": None,
+            "rss_mb": get_process_rss_mb(),
+        }
+        if self.sentences is not None:
+            record["words"] = self.sentences.words_read - self.previous_words
+            record["words_per_second"] = record["words"] / seconds
+        if self.analogies_path:
+            record["analogy_accuracy"], _ = w2v_model.wv.evaluate_word_analogies(
+                self.analogies_path,
+                restrict_vocab=len(w2v_model.wv.index_to_key) + 1,
+                case_insensitive=self.case_insensitive,
+            )
+        logger.info("Telemetry for epoch %s: %s", self.epoch, record)
+        self.records.append(record)
         self.epoch += 1
 
 
-class GensimCommunity2Vec:
+class EpochLossCallback(TrainingTelemetryCallback):
+    """Deprecated, use TrainingTelemetryCallback, which logs and records the loss of each epoch with the rest of the telemetry. This will be removed in the next release."""
+
+    def __init__(self):
+        warnings.warn(
+            "EpochLossCallback is deprecated, use TrainingTelemetryCallback",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        super().__init__()
+
+
+class AnalogyAccuracyCallback(TrainingTelemetryCallback):
+    """Deprecated, use TrainingTelemetryCallback with an analogies_path, which logs and records analogy accuracy after each epoch with the rest of the telemetry. This will be removed in the next release."""
+
+    def __init__(self, analogies_path, case_insensitive=False):
+        """
+        :param analogies_path: str, path to the analogies file for Gensim's KeyedVectors
+        :param case_insensitive: boolean, set to True to deal with case mismatch in analogy pairs. For Reddit, this should typically be False.
+        """
+        warnings.warn(
+            "AnalogyAccuracyCallback is deprecated, use TrainingTelemetryCallback",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        super().__init__(analogies_path=analogies_path, case_insensitive=case_insensitive)
+
+
+class NeighborIndex:
+    """Exact top-K nearest neighbor table for embeddings, precomputed so that similarity queries are lookups rather than a dot product against every vector.
+    Neighbor ids are stored as int32 and cosine similarities as float16 numpy arrays, which can be memory mapped when loading.
+    """
+
+    NEIGHBORS_FILE_NAME = "neighbor_ids.npy"
+    SCORES_FILE_NAME = "neighbor_scores.npy"
+    KEYS_FILE_NAME = "keys.json"
+
+    def __init__(self, index_to_key, neighbors, scores):
+        """
+        :param index_to_key: list of str, the vocabulary, in the same order as the rows of neighbors
+        :param neighbors: numpy array of ints with shape (vocab size, k), the indices of each term's neighbors ordered by decreasing similarity
+        :param scores: numpy array of floats with shape (vocab size, k), cosine similarity of each neighbor
+        """
+        self.index_to_key = list(index_to_key)
+        self.key_to_index = {k: i for i, k in enumerate(self.index_to_key)}
+        self.neighbors = neighbors
+        self.scores = scores
+
+    @property
+    def k(self):
+        """The number of neighbors stored for each term"""
+        return self.neighbors.shape[1]
+
+    @classmethod
+    def build(cls, normed_vectors, index_to_key, k=DEFAULT_NEIGHBOR_INDEX_K, chunk_size=1024):
+        """Computes the exact top k neighbors of every vector by cosine similarity.
+        Similarities are computed for chunk_size rows at a time to bound memory use.
+
+        :param normed_vectors: numpy array with shape (vocab size, vector size), unit length embeddings
+        :param index_to_key: list of str, the vocabulary in the same order as normed_vectors
+        :param k: int, number of neighbors to keep for each term, capped at vocab size - 1
+        :param chunk_size: int, number of rows of the similarity matrix computed at once
+        """
+        num_vectors = normed_vectors.shape[0]
+        k = min(k, num_vectors - 1)
+        logger.info("Building neighbor index with k=%s for %s vectors", k, num_vectors)
+        neighbors = np.empty((num_vectors, k), dtype=np.int32)
+        scores = np.empty((num_vectors, k), dtype=np.float16)
+        for start in range(0, num_vectors, chunk_size):
+            end = min(start + chunk_size, num_vectors)
+            similarities = normed_vectors[start:end] @ normed_vectors.T
+            # A term isn't its own neighbor
+            similarities[np.arange(end - start), np.arange(start, end)] = -np.inf
+            top_k = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+            top_k_sims = np.take_along_axis(similarities, top_k, axis=1)
+            order = np.argsort(-top_k_sims, axis=1, kind="stable")
+            neighbors[start:end] = np.take_along_axis(top_k, order, axis=1)
+            scores[start:end] = np.take_along_axis(top_k_sims, order, axis=1)
+        return cls(index_to_key, neighbors, scores)
+
+    def get_nearest_neighbors(self, term, topn):
+        """Returns the list of topn nearest neighbors to the given term. If the term isn't in the index, an empty list is returned.
+
+        :param term: str, the subreddit term you'd like to get neighbors for
+        :param topn: int, the number of top nearest neighbors to return, at most k
+        """
+        return self.get_batch_nearest_neighbors([term], topn)[0]
+
+    def get_batch_nearest_neighbors(self, terms, topn, return_scores=False):
+        """Returns a list with the topn nearest neighbors of each term. Terms that aren't in the index get an empty list.
+
+        :param terms: list of str, the subreddits you'd like to get neighbors for
+        :param topn: int, the number of top nearest neighbors to return, at most k
+        :param return_scores: boolean, set to True to get (neighbor, cosine similarity) tuples rather than only neighbors
+        """
+        if topn > self.k:
+            raise ValueError(f"topn={topn} is more than the {self.k} neighbors indexed")
+        term_ids = [self.key_to_index.get(t, -1) for t in terms]
+        found_ids = np.array([i for i in term_ids if i >= 0], dtype=np.int64)
+        found_neighbors = np.asarray(self.neighbors[found_ids, :topn])
+        found_scores = np.asarray(self.scores[found_ids, :topn], dtype=np.float32)
+        results = []
+        row = 0
+        for i in term_ids:
+            if i < 0:
+                results.append([])
+                continue
+            neighbor_keys = [self.index_to_key[n] for n in found_neighbors[row]]
+            if return_scores:
+                results.append(list(zip(neighbor_keys, found_scores[row].tolist())))
+            else:
+                results.append(neighbor_keys)
+            row += 1
+        return results
+
+    def save(self, save_dir):
+        """Saves the neighbor and score arrays as .npy files with the vocabulary in json
+
+        :param save_dir: str, path of directory to save the index
+        """
+        os.makedirs(save_dir, exist_ok=True)
+        np.save(os.path.join(save_dir, self.NEIGHBORS_FILE_NAME), self.neighbors)
+        np.save(os.path.join(save_dir, self.SCORES_FILE_NAME), self.scores)
+        with open(os.path.join(save_dir, self.KEYS_FILE_NAME), "w") as f:
+            json.dump(self.index_to_key, f)
+
+    @classmethod
+    def load(cls, load_dir, mmap_mode="r"):
+        """Returns a NeighborIndex saved in load_dir
+
+        :param load_dir: str, directory the index was saved in
+        :param mmap_mode: str or None, passed to numpy.load. The default memory maps the arrays read only, use None to read them into memory
+        """
+        with open(os.path.join(load_dir, cls.KEYS_FILE_NAME)) as f:
+            index_to_key = json.load(f)
+        neighbors = np.load(
+            os.path.join(load_dir, cls.NEIGHBORS_FILE_NAME), mmap_mode=mmap_mode
+        )
+        scores = np.load(os.path.join(load_dir, cls.SCORES_FILE_NAME), mmap_mode=mmap_mode)
+        return cls(index_to_key, neighbors, scores)
+
+
+def benchmark_neighbor_index(c2v_model, neighbor_index, topn=10, terms=None):
+    """Compares neighbor index queries to exact Gensim most_similar queries, returning a dictionary with recall@topn and the total query time in seconds for each method
+
+    :param c2v_model: GensimCommunity2Vec or other object with EmbeddingQueriesMixin
+    :param neighbor_index: NeighborIndex for the model's embeddings
+    :param topn: int, number of neighbors to compare
+    :param terms: list of str, terms to query, defaults to the whole vocabulary
+    """
+    terms = c2v_model.get_index_to_key() if terms is None else terms
+
+    start = time.perf_counter()
+    exact_neighbors = [
+        [p[0] for p in c2v_model.wv.most_similar(t, topn=topn)]
+        for t in terms
+    ]
+    exact_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index_neighbors = neighbor_index.get_batch_nearest_neighbors(terms, topn)
+    index_seconds = time.perf_counter() - start
+
+    num_found = sum(
+        len(set(exact) & set(indexed))
+        for exact, indexed in zip(exact_neighbors, index_neighbors)
+    )
+    recall = num_found / sum(len(exact) for exact in exact_neighbors)
+    results = {
+        "recall": recall,
+        "exact_seconds": exact_seconds,
+        "index_seconds": index_seconds,
+        "num_queries": len(terms),
+    }
+    logger.info("Neighbor index benchmark: %s", results)
+    return results
+
+
+class EmbeddingQueriesMixin:
+    """Queries on trained subreddit embeddings that don't depend on how they were trained.
+    Classes using this must have a 'wv' attribute or property with the embeddings as Gensim KeyedVectors and a 'neighbor_index' attribute, which is None or a NeighborIndex.
+    """
+
+    def save_training_stats(self, save_dir):
+        """Writes the per epoch training telemetry in training_stats as json lines to the model directory, if the model has been trained
+
+        :param save_dir: str, path of the model directory
+        """
+        training_stats = getattr(self, "training_stats", [])
+        if len(training_stats) == 0:
+            return
+        telemetry_path = os.path.join(save_dir, TELEMETRY_FILE_NAME)
+        logger.debug("Writing training telemetry to %s", telemetry_path)
+        with open(telemetry_path, "w") as telemetry_file:
+            for record in training_stats:
+                telemetry_file.write(json.dumps(record) + "\n")
+
+    def save_vectors(self, save_path):
+        """Save only the embeddings from this model as gensim KeyedVectors. These can't be used for further training of the Community2Vec model, but have smaller RAM footprint and are more efficient.
+        The vectors array is stored in a separate .npy file so it can be memory mapped, and unit length vectors are stored alongside for load_vectors.
+        """
+        self.wv.save(str(save_path), separately=["vectors"])
+        np.save(f"{save_path}{NORMED_VECTORS_SUFFIX}", self.get_normed_vectors())
+
+    def get_normed_vectors(self):
+        """Returns the normed embedding weights for the Gensim Keyed Vectors"""
+        return self.wv.get_normed_vectors()
+
+    def get_index_to_key(self):
+        """Returns the vocab of the Word2Vec embeddings as an indexed list of strings."""
+        return self.wv.index_to_key
+
+    def get_index_as_dict(self):
+        """Returns the index of the Word2Vec embeddings as a dictionary mapping int -> string"""
+        return dict(enumerate(self.wv.index_to_key))
+
+    def score_analogies(self, analogies_path=None, case_insensitive=False):
+        """ "Returns the trained embedding's accuracy for solving subreddit algebra analogies and detailed section results. If not file path is specified, return results on the default sports and university-city analogies from ihop.resources.analogies.
+
+        :param analogies_path: str, optional. Define to use a particular analogies file where lines are whitespace separated 4-tuples and split into sections by ': SECTION NAME' lines
+        :param case_insensitive: boolean, set to True to deal with case mismatch in analogy pairs. For Reddit, this should typically be False.
+        """
+        max_vocab = len(self.get_index_to_key()) + 1
+        if analogies_path:
+            return self.wv.evaluate_word_analogies(
+                analogies_path,
+                restrict_vocab=max_vocab,
+                case_insensitive=case_insensitive,
+            )
+        else:
+            with importlib.resources.path(
+                "ihop.resources.analogies", "subreddit_analogies.txt"
+            ) as default_analogies:
+                return self.wv.evaluate_word_analogies(
+                    default_analogies,
+                    restrict_vocab=max_vocab,
+                    case_insensitive=case_insensitive,
+                )
+
+    def get_nearest_neighbors(self, term, topn):
+        """Returns the list of topn nearest neighbors to the given term in the community2vec model. If the term isn't in the model's vocab, an empty list is returned.
+
+        :param term: str, the subreddit term you'd like to get neighbors for
+        :param topn: int, the number of top nearest neighbors to return
+        """
+        return self.get_batch_nearest_neighbors([term], topn)[0]
+
+    def get_batch_nearest_neighbors(self, terms, topn):
+        """Returns a list with the topn nearest neighbors of each term. Terms that aren't in the model's vocab get an empty list.
+        The neighbor index is used if one was built with at least topn neighbors, otherwise neighbors are computed with Gensim.
+
+        :param terms: list of str, the subreddits you'd like to get neighbors for
+        :param topn: int, the number of top nearest neighbors to return
+        """
+        if self.neighbor_index is not None and topn <= self.neighbor_index.k:
+            return self.neighbor_index.get_batch_nearest_neighbors(terms, topn)
+
+        results = []
+        for term in terms:
+            if term in self.wv:
+                term_score_tuples = self.wv.most_similar(term, topn=topn)
+                results.append([p[0] for p in term_score_tuples])
+            else:
+                results.append([])
+        return results
+
+    def build_neighbor_index(self, k=DEFAULT_NEIGHBOR_INDEX_K):
+        """Precomputes the top k neighbors of every subreddit for fast similarity queries. The index is saved with the model.
+
+        :param k: int, the number of neighbors to store for each subreddit
+        """
+        self.neighbor_index = NeighborIndex.build(
+            self.get_normed_vectors(), self.get_index_to_key(), k
+        )
+        return self.neighbor_index
+
+
+class Community2VecVectors(EmbeddingQueriesMixin):
+    """Read-only trained community2vec embeddings without any training state, for querying neighbors and analogies or clustering.
+    Use load_vectors to create one from a saved model directory.
+    """
+
+    def __init__(self, wv, normed_vectors=None, neighbor_index=None):
+        """
+        :param wv: Gensim KeyedVectors with the embeddings
+        :param normed_vectors: numpy array or None, precomputed unit length vectors in the same order as wv. Computed from wv when needed if None
+        :param neighbor_index: NeighborIndex or None
+        """
+        self.wv = wv
+        self.normed_vectors = normed_vectors
+        self.neighbor_index = neighbor_index
+
+    def get_normed_vectors(self):
+        """Returns the precomputed unit length embeddings if available, otherwise the normed embedding weights from the Gensim Keyed Vectors"""
+        if self.normed_vectors is None:
+            self.normed_vectors = self.wv.get_normed_vectors()
+        return self.normed_vectors
+
+
+def load_vectors(model_dir, mmap="r"):
+    """Returns Community2VecVectors from the vectors saved in a community2vec model directory, along with the neighbor index if there is one.
+    This doesn't read the full training model, so it is much faster and uses less memory than GensimCommunity2Vec.load when only the embeddings are needed.
+
+    :param model_dir: str, directory of a saved community2vec model, such as the 'best_model' directory from grid search
+    :param mmap: str or None, memory map mode for the vector arrays. The default maps them read only, use None to read them into memory
+    """
+    vectors_path = os.path.join(model_dir, VECTORS_FILE_NAME)
+    logger.debug("Loading vectors from %s", vectors_path)
+    wv = gensim.models.KeyedVectors.load(vectors_path, mmap=mmap)
+    normed_vectors = None
+    normed_vectors_path = f"{vectors_path}{NORMED_VECTORS_SUFFIX}"
+    if os.path.exists(normed_vectors_path):
+        normed_vectors = np.load(normed_vectors_path, mmap_mode=mmap)
+    else:
+        logger.debug("No normed vectors found at %s", normed_vectors_path)
+    neighbor_index = None
+    neighbor_index_dir = os.path.join(
+        model_dir, GensimCommunity2Vec.NEIGHBOR_INDEX_DIR_NAME
+    )
+    if os.path.exists(neighbor_index_dir):
+        neighbor_index = NeighborIndex.load(neighbor_index_dir, mmap_mode=mmap)
+    return Community2VecVectors(wv, normed_vectors, neighbor_index)
+
+
+class GensimCommunity2Vec(EmbeddingQueriesMixin):
     """Implements Community2Vec Skip-gram with negative sampling (SGNS) using the gensim Word2Vec model.
     Determines the appropriate window-size and sets vocabulary according to the
     filtered subreddits.
@@ -163,6 +894,7 @@ class GensimCommunity2Vec:
     # When models are saved, what are the files named
     MODEL_SAVE_NAME = "word2vec.pickle"
     PARAM_SAVE_NAME = "parameters.json"
+    NEIGHBOR_INDEX_DIR_NAME = "neighbor_index"
 
     def __init__(
         self,
@@ -179,6 +911,8 @@ class GensimCommunity2Vec:
         epochs=5,
         batch_words=10000,
         workers=3,
+        max_repeats=None,
+        count_weighting=LINEAR_WEIGHTING,
     ):
         """
         Instantiates a gensim Word2Vec model for Community2Vec
@@ -195,11 +929,19 @@ class GensimCommunity2Vec:
         :param epochs: int, Number of iterations over the corpus, passed to gensim Word2Vec
         :param batch_words: int, Target size (in words) for batches of examples passed to worker threads
         :param workers: int, number of worker threads for training
+        :param max_repeats: int or None, the maximum number of times a subreddit is repeated for a user during training, None to repeat it once per comment
+        :param count_weighting: str, 'linear' to repeat a subreddit once per comment or 'log' to repeat it 1 + floor(log2(count)) times, see get_num_repeats
         """
+        if count_weighting not in COUNT_WEIGHTINGS:
+            raise ValueError(
+                f"Count weighting {count_weighting} is not one of {COUNT_WEIGHTINGS}"
+            )
         self.contexts_path = contexts_path
         self.max_comments = max_comments
         self.num_users = num_users
         self.epochs = epochs
+        self.max_repeats = max_repeats
+        self.count_weighting = count_weighting
         self.w2v_model = gensim.models.word2vec.Word2Vec(
             vector_size=vector_size,
             min_count=0,
@@ -216,6 +958,14 @@ class GensimCommunity2Vec:
             workers=workers,
         )
         self.w2v_model.build_vocab_from_freq(vocab_dict)
+        self.neighbor_index = None
+        self.warm_start_model = None
+        self.training_stats = []
+
+    @property
+    def wv(self):
+        """The Gensim KeyedVectors storing the trained embeddings"""
+        return self.w2v_model.wv
 
     def get_params_as_dict(self):
         """Returns dictionary of parameters for tracking experiments."""
@@ -234,6 +984,9 @@ class GensimCommunity2Vec:
             "seed": self.w2v_model.seed,
             "batch_words": self.w2v_model.batch_words,
             "sample": self.w2v_model.sample,
+            "max_repeats": self.max_repeats,
+            "count_weighting": self.count_weighting,
+            WARM_START_KEY: self.warm_start_model,
         }
 
     def train(
@@ -242,102 +995,169 @@ class GensimCommunity2Vec:
         analogies_path=None,
         epoch_analogies=True,
         case_insensitive=False,
+        corpus_decoders=0,
+        shuffle_seed=None,
         **kwargs,
     ):
         """Trains the word2vec model. Returns the result from gensim.
+        Per epoch telemetry is stored in training_stats and written next to the model when it is saved.
         :param save_vectors_prefix: str or None, use set this to save vectors after each epoch. The epoch will be appended to the filename.
         :param analogies_path: str, optional. If specified use this file to report analogy performance after each epoch
         :param epoch_analogies: boolean, True if you want report performance on the default subreddit analogies after each epoch
         :param case_insensitive: boolean, set to True to deal with case mismatch in analogy pairs. For Reddit, this should typically be False.
-        :param **kwargs: passed to gensim Word2Vec.train()
+        :param corpus_decoders: int, set to use ShardedContextSentences with this many processes decompressing user context files in parallel. 0 reads them one after another in the training process
+        :param shuffle_seed: int or None, with corpus_decoders, shuffle the order of user context files each epoch using this seed
+        :param **kwargs: passed to gensim Word2Vec.train(). Pass compute_loss=True to record loss in the telemetry, which slows down training
         """
-        callbacks = [EpochLossCallback()]
+        if corpus_decoders > 0:
+            sentences = ShardedContextSentences(
+                self.contexts_path,
+                decoders=corpus_decoders,
+                shuffle_seed=shuffle_seed,
+                max_repeats=self.max_repeats,
+                count_weighting=self.count_weighting,
+            )
+        else:
+            sentences = SubredditCountSentences(
+                self.contexts_path, self.max_repeats, self.count_weighting
+            )
+        callbacks = []
         if save_vectors_prefix:
             callbacks.append(SaveVectorsCallback(save_vectors_prefix))
 
         # Solve given analogies after each epoch or use default
         if analogies_path:
-            callbacks.append(AnalogyAccuracyCallback(analogies_path, case_insensitive))
+            telemetry = TrainingTelemetryCallback(
+                sentences, analogies_path, case_insensitive
+            )
         elif epoch_analogies:
             with importlib.resources.path(
                 "ihop.resources.analogies", "subreddit_analogies.txt"
             ) as default_analogies:
-                callbacks.append(
-                    AnalogyAccuracyCallback(str(default_analogies), case_insensitive)
+                telemetry = TrainingTelemetryCallback(
+                    sentences, str(default_analogies), case_insensitive
                 )
+        else:
+            telemetry = TrainingTelemetryCallback(sentences)
+        callbacks.append(telemetry)
 
         train_result = self.w2v_model.train(
-            gensim.models.word2vec.PathLineSentences(self.contexts_path),
+            sentences,
             total_examples=self.num_users,
             epochs=self.epochs,
             callbacks=callbacks,
             **kwargs,
         )
+        self.training_stats.extend(telemetry.records)
         return train_result
 
     def save(self, save_dir):
-        """Save the current model object with parameters in json and the word2vec model saved using the gensim save() method
+        """Save the current model object with parameters in json and the word2vec model saved using the gensim save() method.
+        The embeddings are also saved on their own, so they can be read with load_vectors.
 
         :param save_dir: str, path of directory to save model and parameters
         """
         os.makedirs(save_dir, exist_ok=True)
         w2v_path = os.path.join(save_dir, self.MODEL_SAVE_NAME)
         self.w2v_model.save(w2v_path)
+        self.save_vectors(os.path.join(save_dir, VECTORS_FILE_NAME))
+        self.save_training_stats(save_dir)
         parameters_path = os.path.join(save_dir, self.PARAM_SAVE_NAME)
 
         with open(parameters_path, "w") as f:
             json.dump(self.get_params_as_dict(), f)
 
-    def save_vectors(self, save_path):
-        """Save only the embeddings from this model as gensim KeyedVectors. These can't be used for further training of the Community2Vec model, but have smaller RAM footprint and are more efficient"""
-        self.w2v_model.wv.save(save_path)
-
-    def get_normed_vectors(self):
-        """Returns the normed embedding weights for the Gensim Keyed Vectors"""
-        return self.w2v_model.wv.get_normed_vectors()
-
-    def get_index_to_key(self):
-        """Returns the vocab of the Word2Vec embeddings as an indexed list of strings."""
-        return self.w2v_model.wv.index_to_key
-
-    def get_index_as_dict(self):
-        """Returns the index of the Word2Vec embeddings as a dictionary mapping int -> string"""
-        return dict(enumerate(self.w2v_model.wv.index_to_key))
-
-    def score_analogies(self, analogies_path=None, case_insensitive=False):
-        """ "Returns the trained embedding's accuracy for solving subreddit algebra analogies and detailed section results. If not file path is specified, return results on the default sports and university-city analogies from ihop.resources.analogies.
-
-        :param analogies_path: str, optional. Define to use a particular analogies file where lines are whitespace separated 4-tuples and split into sections by ': SECTION NAME' lines
-        :param case_insensitive: boolean, set to True to deal with case mismatch in analogy pairs. For Reddit, this should typically be False.
-        """
-        max_vocab = len(self.get_index_to_key()) + 1
-        if analogies_path:
-            return self.w2v_model.wv.evaluate_word_analogies(
-                analogies_path,
-                restrict_vocab=max_vocab,
-                case_insensitive=case_insensitive,
+        if self.neighbor_index is not None:
+            self.neighbor_index.save(
+                os.path.join(save_dir, self.NEIGHBOR_INDEX_DIR_NAME)
             )
-        else:
-            with importlib.resources.path(
-                "ihop.resources.analogies", "subreddit_analogies.txt"
-            ) as default_analogies:
-                return self.w2v_model.wv.evaluate_word_analogies(
-                    default_analogies,
-                    restrict_vocab=max_vocab,
-                    case_insensitive=case_insensitive,
-                )
 
-    def get_nearest_neighbors(self, term, topn):
-        """Returns the list of topn nearest neighbors to the given term in the community2vec model. If the term isn't in the model's vocab, an empty list is returned.
+    @classmethod
+    def init_from_previous_model(
+        cls,
+        previous_model_dir,
+        vocab_dict,
+        contexts_path,
+        max_comments=0,
+        num_users=0,
+        vector_size=None,
+        negative=20,
+        sample=0,
+        alpha=0.025,
+        min_alpha=0.0001,
+        seed=1,
+        epochs=5,
+        batch_words=10000,
+        workers=3,
+        max_repeats=None,
+        count_weighting=LINEAR_WEIGHTING,
+    ):
+        """Instantiates a community2vec model warm started from a previously trained model, typically the best model from the previous month.
+        The vocabulary and counts come only from vocab_dict. Subreddits shared with the previous model keep their trained input and output vectors, new subreddits get random vectors and subreddits that no longer appear are dropped.
+        Fewer epochs are typically needed than training from scratch and the embeddings stay roughly aligned with the previous model.
 
-        :param term: str, the subreddit term you'd like to get neighbors for
-        :param topn: int, the number of top nearest neighbors to return
+        :param previous_model_dir: str, directory of a GensimCommunity2Vec model saved with save()
+        :param vocab_dict: dict, str->int storing frequency counts of the vocab elements.
+        :param contexts_path: Path to a text file storing the subreddits a user commented on, one user per line. Can be compressed as a bzip2 or gzip.
+        :param max_comments: int, maximum window for skip grams (for c2v this should be 'infinity' or the largest number of comments for a single user in the data)
+        :param num_users: int, number of contexts/users
+        :param vector_size: int or None, embedding size, which must match the previous model if given
+        :param negative: int, how many 'noise words' should be drawn, passed to gensim Word2Vec
+        :param sample: float, the threshold for configuring which higher-frequency words are randomly downsampled, passed to gensim Word2Vec
+        :param alpha: float, initial learning rate, passed to gensim Word2Vec
+        :param min_alpha: float, minimum for learning rate decay
+        :param seed: int, randomSeed for initializing vectors of new subreddits, passed to gensim Word2Vec
+        :param epochs: int, Number of iterations over the corpus, passed to gensim Word2Vec
+        :param batch_words: int, Target size (in words) for batches of examples passed to worker threads
+        :param workers: int, number of worker threads for training
+        :param max_repeats: int or None, the maximum number of times a subreddit is repeated for a user during training
+        :param count_weighting: str, 'linear' or 'log', how a user's subreddit counts are turned into repetitions
         """
-        if term in self.w2v_model.wv:
-            term_score_tuples = self.w2v_model.wv.most_similar(term, topn=topn)
-            return [p[0] for p in term_score_tuples]
-
-        return []
+        previous_w2v_model = cls.load(previous_model_dir).w2v_model
+        if vector_size is not None and vector_size != previous_w2v_model.vector_size:
+            raise ValueError(
+                f"vector_size {vector_size} doesn't match the previous model's vector size {previous_w2v_model.vector_size}"
+            )
+        model = cls(
+            vocab_dict,
+            contexts_path,
+            max_comments,
+            num_users,
+            vector_size=previous_w2v_model.vector_size,
+            negative=negative,
+            sample=sample,
+            alpha=alpha,
+            min_alpha=min_alpha,
+            seed=seed,
+            epochs=epochs,
+            batch_words=batch_words,
+            workers=workers,
+            max_repeats=max_repeats,
+            count_weighting=count_weighting,
+        )
+        previous_wv = previous_w2v_model.wv
+        shared = [
+            (i, previous_wv.key_to_index[k])
+            for i, k in enumerate(model.wv.index_to_key)
+            if k in previous_wv.key_to_index
+        ]
+        logger.info(
+            "Warm starting from %s with %s shared, %s new and %s dropped subreddits",
+            previous_model_dir,
+            len(shared),
+            len(vocab_dict) - len(shared),
+            len(previous_wv) - len(shared),
+        )
+        if shared:
+            new_ids, previous_ids = map(list, zip(*shared))
+            model.wv.vectors[new_ids] = previous_wv.vectors[previous_ids]
+            if hasattr(previous_w2v_model, "syn1neg") and model.w2v_model.negative:
+                model.w2v_model.syn1neg[new_ids] = previous_w2v_model.syn1neg[
+                    previous_ids
+                ]
+            model.wv.norms = None
+        model.warm_start_model = str(previous_model_dir)
+        return model
 
     @classmethod
     def init_with_spark(
@@ -354,6 +1174,8 @@ class GensimCommunity2Vec:
         epochs=5,
         batch_words=10000,
         workers=3,
+        max_repeats=None,
+        count_weighting=LINEAR_WEIGHTING,
     ):
         """Instantiates a community2vec model using max_comments and num_users determined the contexts_path file using Spark.
         :param spark: Spark context
@@ -368,8 +1190,12 @@ class GensimCommunity2Vec:
         :param epochs: int, Number of iterations over the corpus, passed to gensim Word2Vec
         :param batch_words: int, Target size (in words) for batches of examples passed to worker threads
         :param workers: int, number of worker threads for training
+        :param max_repeats: int or None, the maximum number of times a subreddit is repeated for a user during training
+        :param count_weighting: str, 'linear' or 'log', how a user's subreddit counts are turned into repetitions
         """
-        num_users, max_comments = get_w2v_params_from_spark_df(spark, contexts_path)
+        num_users, max_comments = get_w2v_params_from_spark_df(
+            spark, contexts_path, max_repeats, count_weighting
+        )
 
         return cls(
             vocab_dict,
@@ -385,6 +1211,8 @@ class GensimCommunity2Vec:
             epochs,
             batch_words,
             workers,
+            max_repeats,
+            count_weighting,
         )
 
     @classmethod
@@ -402,8 +1230,468 @@ class GensimCommunity2Vec:
             json_params[MAX_COMMENTS_KEY],
             json_params[NUM_USERS_KEY],
             epochs=json_params["epochs"],
+            max_repeats=json_params.get("max_repeats"),
+            count_weighting=json_params.get("count_weighting", LINEAR_WEIGHTING),
         )
         model.w2v_model = gensim.models.Word2Vec.load(w2v_file)
+        model.warm_start_model = json_params.get(WARM_START_KEY)
+        neighbor_index_dir = os.path.join(
+            load_dir, GensimCommunity2Vec.NEIGHBOR_INDEX_DIR_NAME
+        )
+        if os.path.exists(neighbor_index_dir):
+            logger.debug("Loading neighbor index from %s", neighbor_index_dir)
+            model.neighbor_index = NeighborIndex.load(neighbor_index_dir)
+        return model
+
+
+def read_user_subreddit_counts(contexts_path, key_to_index):
+    """Reads user contexts and deduplicates each user's subreddits to a multiset. Contexts written as subreddit counts are read with their exact counts.
+    Returns CSR-style numpy arrays (user_offsets, subreddit_ids, subreddit_counts), where the subreddits of user i are subreddit_ids[user_offsets[i]:user_offsets[i+1]].
+    Users with fewer than two distinct subreddits are dropped, since they give no pairs.
+
+    :param contexts_path: Path to a text file or directory storing the subreddits a user commented on, one user per line. Can be compressed as a bzip2 or gzip.
+    :param key_to_index: dict, subreddit -> index in the vocabulary. Subreddits not in the vocabulary are skipped
+    """
+    user_offsets = [0]
+    subreddit_ids = []
+    subreddit_counts = []
+    for sentence in gensim.models.word2vec.PathLineSentences(contexts_path):
+        user_counts = collections.Counter()
+        for token in sentence:
+            subreddit, count = parse_subreddit_count(token)
+            if subreddit in key_to_index:
+                user_counts[key_to_index[subreddit]] += count
+        if len(user_counts) < 2:
+            continue
+        subreddit_ids.extend(user_counts.keys())
+        subreddit_counts.extend(user_counts.values())
+        user_offsets.append(len(subreddit_ids))
+    return (
+        np.array(user_offsets, dtype=np.int64),
+        np.array(subreddit_ids, dtype=np.int32),
+        np.array(subreddit_counts, dtype=np.int64),
+    )
+
+
+def sample_user_pairs(
+    user_offsets, subreddit_ids, subreddit_counts, users, pairs_per_comment, rng
+):
+    """Samples (context, target) subreddit pairs for the given users.
+    Each user gets max(1, round(pairs_per_comment * number of comments)) pairs, with both subreddits drawn in proportion to the user's comment counts. Pairs of a subreddit with itself are dropped.
+    Returns two numpy arrays of subreddit ids.
+
+    :param user_offsets: numpy array, CSR offsets from read_user_subreddit_counts
+    :param subreddit_ids: numpy array, CSR subreddit ids from read_user_subreddit_counts
+    :param subreddit_counts: numpy array, CSR subreddit counts from read_user_subreddit_counts
+    :param users: numpy array of user indices to sample pairs for
+    :param pairs_per_comment: float, how many pairs to sample per comment by the user
+    :param rng: numpy random Generator
+    """
+    cumulative_counts = np.cumsum(subreddit_counts)
+    count_before_user = np.concatenate(([0], cumulative_counts))[user_offsets[users]]
+    user_comments = (
+        np.concatenate(([0], cumulative_counts))[user_offsets[users + 1]]
+        - count_before_user
+    )
+    pairs_per_user = np.maximum(
+        1, np.rint(pairs_per_comment * user_comments).astype(np.int64)
+    )
+    pair_users = np.repeat(np.arange(len(users)), pairs_per_user)
+    # Draw a comment uniformly from each user's comments, then find the subreddit it belongs to
+    positions = []
+    for _ in range(2):
+        drawn = count_before_user[pair_users] + np.floor(
+            rng.random(len(pair_users)) * user_comments[pair_users]
+        )
+        positions.append(np.searchsorted(cumulative_counts, drawn, side="right"))
+    distinct = positions[0] != positions[1]
+    return subreddit_ids[positions[0][distinct]], subreddit_ids[positions[1][distinct]]
+
+
+def sgns_batch_update(input_vectors, output_vectors, contexts, samples, alpha):
+    """Applies one skip-gram negative sampling SGD step for a batch of pairs in place. Returns the batch's summed loss.
+
+    :param input_vectors: numpy array, the context embeddings being trained
+    :param output_vectors: numpy array, the output layer weights
+    :param contexts: numpy int array with shape (batch size,), context subreddit ids
+    :param samples: numpy int array with shape (batch size, negative + 1), the target subreddit id in the first column followed by negative samples
+    :param alpha: float, learning rate
+    """
+    context_vectors = input_vectors[contexts]
+    sample_vectors = output_vectors[samples]
+    scores = np.clip(
+        np.einsum("bd,bkd->bk", context_vectors, sample_vectors), -MAX_EXP, MAX_EXP
+    )
+    sigmoids = 1.0 / (1.0 + np.exp(-scores))
+    labels = np.zeros_like(sigmoids)
+    labels[:, 0] = 1.0
+    gradients = (labels - sigmoids) * alpha
+    loss = -np.log(sigmoids[:, 0]).sum() - np.log(1.0 - sigmoids[:, 1:]).sum()
+
+    input_update = np.einsum("bk,bkd->bd", gradients, sample_vectors)
+    np.add.at(
+        output_vectors,
+        samples.ravel(),
+        (gradients[:, :, None] * context_vectors[:, None, :]).reshape(
+            -1, context_vectors.shape[1]
+        ),
+    )
+    np.add.at(input_vectors, contexts, input_update)
+    return float(loss)
+
+
+# Arrays shared with pair sampling worker processes, set by init_pair_sampling_worker
+PAIR_SAMPLING_WORKER_STATE = {}
+
+
+def init_pair_sampling_worker(
+    input_buffer,
+    output_buffer,
+    shape,
+    user_offsets,
+    subreddit_ids,
+    subreddit_counts,
+    cum_table,
+    keep_probs,
+):
+    """Sets up the shared embedding matrices and training data in a worker process.
+    The embedding matrices are views of shared memory, so all workers update the same weights without locking (Hogwild style).
+
+    :param input_buffer: multiprocessing RawArray, shared memory for the input embeddings
+    :param output_buffer: multiprocessing RawArray, shared memory for the output layer weights
+    :param shape: tuple, (vocab size, vector size)
+    :param user_offsets: numpy array, CSR offsets from read_user_subreddit_counts
+    :param subreddit_ids: numpy array, CSR subreddit ids from read_user_subreddit_counts
+    :param subreddit_counts: numpy array, CSR subreddit counts from read_user_subreddit_counts
+    :param cum_table: numpy array, cumulative unigram distribution for drawing negative samples
+    :param keep_probs: numpy array, the probability of keeping each subreddit when downsampling frequent subreddits
+    """
+    PAIR_SAMPLING_WORKER_STATE.update(
+        input_vectors=np.frombuffer(input_buffer, dtype=np.float32).reshape(shape),
+        output_vectors=np.frombuffer(output_buffer, dtype=np.float32).reshape(shape),
+        user_offsets=user_offsets,
+        subreddit_ids=subreddit_ids,
+        subreddit_counts=subreddit_counts,
+        cum_table=cum_table,
+        keep_probs=keep_probs,
+    )
+
+
+def train_pair_sampling_shard(
+    users, start_alpha, end_alpha, pairs_per_comment, negative, batch_pairs, seed
+):
+    """Trains on sampled pairs from a shard of users in a worker process set up by init_pair_sampling_worker.
+    The learning rate decays linearly from start_alpha to end_alpha over the shard. Returns (number of pairs trained, summed loss).
+
+    :param users: numpy array of user indices in this shard
+    :param start_alpha: float, learning rate at the start of the shard
+    :param end_alpha: float, learning rate at the end of the shard
+    :param pairs_per_comment: float, how many pairs to sample per comment by each user
+    :param negative: int, number of negative samples for each pair
+    :param batch_pairs: int, number of pairs in each SGD batch
+    :param seed: int, random seed for this shard
+    """
+    state = PAIR_SAMPLING_WORKER_STATE
+    rng = np.random.default_rng(seed)
+    contexts, targets = sample_user_pairs(
+        state["user_offsets"],
+        state["subreddit_ids"],
+        state["subreddit_counts"],
+        users,
+        pairs_per_comment,
+        rng,
+    )
+    keep = rng.random(len(contexts)) < (
+        state["keep_probs"][contexts] * state["keep_probs"][targets]
+    )
+    contexts = contexts[keep]
+    targets = targets[keep]
+    order = rng.permutation(len(contexts))
+    contexts = contexts[order]
+    targets = targets[order]
+
+    num_pairs = len(contexts)
+    total_loss = 0.0
+    cum_table = state["cum_table"]
+    for start in range(0, num_pairs, batch_pairs):
+        end = min(start + batch_pairs, num_pairs)
+        alpha = start_alpha + (end_alpha - start_alpha) * start / max(num_pairs, 1)
+        negatives = np.searchsorted(
+            cum_table, rng.random((end - start, negative)) * cum_table[-1], side="right"
+        )
+        samples = np.concatenate([targets[start:end, None], negatives], axis=1)
+        total_loss += sgns_batch_update(
+            state["input_vectors"],
+            state["output_vectors"],
+            contexts[start:end],
+            samples,
+            alpha,
+        )
+    return num_pairs, total_loss
+
+
+class PairSamplingCommunity2Vec(EmbeddingQueriesMixin):
+    """Trains community2vec with a set-based objective, where each user is a multiset of subreddits and every pair of subreddits in the multiset is a positive example.
+    Rather than enumerating all O(L^2) skip-gram pairs for a user with L comments, a number of (context, target) pairs proportional to L is sampled each epoch.
+    Training is batched skip-gram with negative sampling in NumPy. Worker processes update embedding matrices in shared memory without locks.
+    Contexts written as subreddit counts are weighted by their exact counts.
+    """
+
+    PARAM_SAVE_NAME = "parameters.json"
+    VOCAB_SAVE_NAME = "vocabulary.json"
+    INPUT_VECTORS_SAVE_NAME = "input_vectors.npy"
+    OUTPUT_VECTORS_SAVE_NAME = "output_vectors.npy"
+    NEIGHBOR_INDEX_DIR_NAME = GensimCommunity2Vec.NEIGHBOR_INDEX_DIR_NAME
+
+    def __init__(
+        self,
+        vocab_dict,
+        contexts_path,
+        num_users=0,
+        vector_size=150,
+        negative=20,
+        sample=0,
+        alpha=0.025,
+        min_alpha=0.0001,
+        seed=1,
+        epochs=5,
+        pairs_per_comment=1.0,
+        batch_pairs=1024,
+        workers=3,
+        ns_exponent=0.75,
+    ):
+        """
+        :param vocab_dict: dict, str->int storing frequency counts of the vocab elements.
+        :param contexts_path: Path to a text file storing the subreddits a user commented on, one user per line. Can be compressed as a bzip2 or gzip.
+        :param num_users: int, number of contexts/users, only used for tracking parameters
+        :param vector_size: int, embedding size
+        :param negative: int, how many 'noise words' should be drawn for each pair
+        :param sample: float, the threshold for randomly downsampling higher-frequency subreddits, the same as in gensim Word2Vec. 0 turns off downsampling
+        :param alpha: float, initial learning rate
+        :param min_alpha: float, minimum for learning rate decay
+        :param seed: int, random seed for initializing embeddings and sampling
+        :param epochs: int, number of passes over the users, with new pairs sampled in each epoch
+        :param pairs_per_comment: float, how many pairs to sample per comment by a user in each epoch
+        :param batch_pairs: int, number of pairs in each SGD batch
+        :param workers: int, number of worker processes for training
+        :param ns_exponent: float, exponent of the unigram distribution that negative samples are drawn from
+        """
+        self.contexts_path = contexts_path
+        self.num_users = num_users
+        self.vector_size = vector_size
+        self.negative = negative
+        self.sample = sample
+        self.alpha = alpha
+        self.min_alpha = min_alpha
+        self.seed = seed
+        self.epochs = epochs
+        self.pairs_per_comment = pairs_per_comment
+        self.batch_pairs = batch_pairs
+        self.workers = workers
+        self.ns_exponent = ns_exponent
+        self.training_stats = []
+        self.neighbor_index = None
+
+        self.vocab_counts = dict(
+            sorted(vocab_dict.items(), key=lambda kv: (-kv[1], kv[0]))
+        )
+        self.wv = gensim.models.KeyedVectors(vector_size)
+        self.wv.index_to_key = list(self.vocab_counts.keys())
+        self.wv.key_to_index = {k: i for i, k in enumerate(self.wv.index_to_key)}
+        rng = np.random.default_rng(seed)
+        self.wv.vectors = (
+            (rng.random((len(self.vocab_counts), vector_size)) - 0.5) / vector_size
+        ).astype(np.float32)
+        self.output_vectors = np.zeros_like(self.wv.vectors)
+
+    def get_params_as_dict(self):
+        """Returns dictionary of parameters for tracking experiments."""
+        return {
+            NUM_USERS_KEY: self.num_users,
+            CONTEXTS_PATH_KEY: self.contexts_path,
+            "epochs": self.epochs,
+            "vector_size": self.vector_size,
+            "negative": self.negative,
+            "ns_exponent": self.ns_exponent,
+            "alpha": self.alpha,
+            "min_alpha": self.min_alpha,
+            "seed": self.seed,
+            "sample": self.sample,
+            "pairs_per_comment": self.pairs_per_comment,
+            "batch_pairs": self.batch_pairs,
+        }
+
+    def get_cum_table(self):
+        """Returns the cumulative unigram distribution raised to ns_exponent, for drawing negative samples"""
+        counts = np.array(list(self.vocab_counts.values()), dtype=np.float64)
+        return np.cumsum(counts**self.ns_exponent)
+
+    def get_keep_probs(self):
+        """Returns the probability of keeping each subreddit when downsampling frequent subreddits, the same formula as gensim Word2Vec"""
+        counts = np.array(list(self.vocab_counts.values()), dtype=np.float64)
+        if not self.sample:
+            return np.ones_like(counts)
+        threshold = self.sample * counts.sum() if self.sample < 1.0 else self.sample
+        return np.minimum(
+            1.0, (np.sqrt(counts / threshold) + 1) * threshold / np.maximum(counts, 1)
+        )
+
+    def train(
+        self,
+        save_vectors_prefix=None,
+        analogies_path=None,
+        epoch_analogies=True,
+        case_insensitive=False,
+    ):
+        """Trains the embeddings. Returns (number of pairs trained, pairs per second).
+
+        :param save_vectors_prefix: str or None, use set this to save vectors after each epoch. The epoch will be appended to the filename.
+        :param analogies_path: str, optional. If specified use this file to report analogy performance after each epoch
+        :param epoch_analogies: boolean, True if you want report performance on the default subreddit analogies after each epoch
+        :param case_insensitive: boolean, set to True to deal with case mismatch in analogy pairs. For Reddit, this should typically be False.
+        """
+        user_offsets, subreddit_ids, subreddit_counts = read_user_subreddit_counts(
+            self.contexts_path, self.wv.key_to_index
+        )
+        num_users = len(user_offsets) - 1
+        logger.info(
+            "Training pair sampling community2vec on %s users with at least two subreddits",
+            num_users,
+        )
+
+        shape = self.wv.vectors.shape
+        input_buffer = multiprocessing.RawArray("f", shape[0] * shape[1])
+        output_buffer = multiprocessing.RawArray("f", shape[0] * shape[1])
+        init_args = (
+            input_buffer,
+            output_buffer,
+            shape,
+            user_offsets,
+            subreddit_ids,
+            subreddit_counts,
+            self.get_cum_table(),
+            self.get_keep_probs(),
+        )
+        init_pair_sampling_worker(*init_args)
+        input_vectors = PAIR_SAMPLING_WORKER_STATE["input_vectors"]
+        output_vectors = PAIR_SAMPLING_WORKER_STATE["output_vectors"]
+        input_vectors[:] = self.wv.vectors
+        output_vectors[:] = self.output_vectors
+
+        pool = None
+        if self.workers > 1:
+            pool = multiprocessing.Pool(
+                self.workers, initializer=init_pair_sampling_worker, initargs=init_args
+            )
+        rng = np.random.default_rng(self.seed)
+        alphas = np.linspace(self.alpha, self.min_alpha, self.epochs + 1)
+        total_pairs = 0
+        total_seconds = 0.0
+        total_loss = 0.0
+        try:
+            for epoch in range(self.epochs):
+                start_time = time.perf_counter()
+                shards = np.array_split(rng.permutation(num_users), self.workers)
+                shard_args = [
+                    (
+                        shard,
+                        alphas[epoch],
+                        alphas[epoch + 1],
+                        self.pairs_per_comment,
+                        self.negative,
+                        self.batch_pairs,
+                        int(rng.integers(2**31)),
+                    )
+                    for shard in shards
+                ]
+                if pool is None:
+                    shard_results = [train_pair_sampling_shard(*a) for a in shard_args]
+                else:
+                    shard_results = pool.starmap(train_pair_sampling_shard, shard_args)
+                epoch_seconds = time.perf_counter() - start_time
+                epoch_pairs = sum(r[0] for r in shard_results)
+                epoch_loss = sum(r[1] for r in shard_results)
+                total_pairs += epoch_pairs
+                total_seconds += epoch_seconds
+                total_loss += epoch_loss
+                self.wv.vectors = np.array(input_vectors)
+                self.wv.norms = None
+                epoch_stats = {
+                    "epoch": epoch + 1,
+                    "seconds": epoch_seconds,
+                    "pairs": epoch_pairs,
+                    "pairs_per_second": epoch_pairs / epoch_seconds,
+                    "alpha": alphas[epoch + 1],
+                    "loss": total_loss,
+                    "epoch_loss": epoch_loss,
+                    "analogy_accuracy": None,
+                    "rss_mb": get_process_rss_mb(),
+                }
+                if analogies_path or epoch_analogies:
+                    epoch_stats["analogy_accuracy"] = self.score_analogies(
+                        analogies_path, case_insensitive
+                    )[0]
+                logger.info("Telemetry for epoch %s: %s", epoch + 1, epoch_stats)
+                if save_vectors_prefix:
+                    self.save_vectors(save_vectors_prefix + f"_epoch_{epoch + 1}")
+                self.training_stats.append(epoch_stats)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        self.output_vectors = np.array(output_vectors)
+        pairs_per_second = total_pairs / total_seconds if total_seconds > 0 else 0.0
+        logger.info(
+            "Trained on %s pairs at %s pairs per second", total_pairs, pairs_per_second
+        )
+        return total_pairs, pairs_per_second
+
+    def save(self, save_dir):
+        """Saves parameters and vocabulary counts in json and the embedding matrices as .npy files.
+        The embeddings are also saved as Gensim KeyedVectors, so they can be read with load_vectors.
+
+        :param save_dir: str, path of directory to save model and parameters
+        """
+        os.makedirs(save_dir, exist_ok=True)
+        with open(os.path.join(save_dir, self.PARAM_SAVE_NAME), "w") as f:
+            json.dump(self.get_params_as_dict(), f)
+        with open(os.path.join(save_dir, self.VOCAB_SAVE_NAME), "w") as f:
+            json.dump(self.vocab_counts, f)
+        np.save(os.path.join(save_dir, self.INPUT_VECTORS_SAVE_NAME), self.wv.vectors)
+        np.save(
+            os.path.join(save_dir, self.OUTPUT_VECTORS_SAVE_NAME), self.output_vectors
+        )
+        self.save_vectors(os.path.join(save_dir, VECTORS_FILE_NAME))
+        self.save_training_stats(save_dir)
+        if self.neighbor_index is not None:
+            self.neighbor_index.save(
+                os.path.join(save_dir, self.NEIGHBOR_INDEX_DIR_NAME)
+            )
+
+    @classmethod
+    def load(cls, load_dir):
+        """Returns a PairSamplingCommunity2Vec saved with save()
+
+        :param load_dir: str, directory to load the model from
+        """
+        with open(os.path.join(load_dir, cls.PARAM_SAVE_NAME)) as f:
+            params = json.load(f)
+        with open(os.path.join(load_dir, cls.VOCAB_SAVE_NAME)) as f:
+            vocab_counts = json.load(f)
+        model = cls(
+            vocab_counts,
+            params.pop(CONTEXTS_PATH_KEY),
+            params.pop(NUM_USERS_KEY),
+            **params,
+        )
+        model.wv.vectors = np.load(os.path.join(load_dir, cls.INPUT_VECTORS_SAVE_NAME))
+        model.output_vectors = np.load(
+            os.path.join(load_dir, cls.OUTPUT_VECTORS_SAVE_NAME)
+        )
+        neighbor_index_dir = os.path.join(load_dir, cls.NEIGHBOR_INDEX_DIR_NAME)
+        if os.path.exists(neighbor_index_dir):
+            model.neighbor_index = NeighborIndex.load(neighbor_index_dir)
         return model
 
 
@@ -436,6 +1724,12 @@ class GridSearchTrainer:
         analogies_path=None,
         case_insensitive=False,
         keep_all=False,
+        neighbor_index_k=DEFAULT_NEIGHBOR_INDEX_K,
+        previous_model_dir=None,
+        compare_cold_start=False,
+        pair_sampling=False,
+        max_repeats=None,
+        count_weighting=LINEAR_WEIGHTING,
     ):
         """
         :param vocab_csv: Path to csv storing vocab with counts in the corpus
@@ -447,7 +1741,15 @@ class GridSearchTrainer:
         :param analogies_path: str, optional. Define to use a particular analogies file where lines are whitespace separated 4-tuples and split into sections by ': SECTION NAME' lines
         :param case_insensitive: boolean, set to True to deal with case mismatch in analogy pairs. For Reddit c2v, this should typically be False.
         :param keep_all: boolean, set to True to write every trained model to disk, rather than keeping the best model. If this flag is true, then a directory will be created in model_output_dir for each model in the grid search, rather than just the best one
+        :param neighbor_index_k: int or None, number of neighbors to precompute for each subreddit in the best model's neighbor index. Set to None to skip building the index
+        :param previous_model_dir: str or None, directory of a trained model, such as the previous month's best model, to warm start every model in the grid from. None to train from random initialization
+        :param compare_cold_start: boolean, when warm starting, set to True to also train each model from random initialization and report its analogy accuracy and training time
+        :param pair_sampling: boolean, set to True to train PairSamplingCommunity2Vec models instead of GensimCommunity2Vec. Can't be combined with warm starting
+        :param max_repeats: int or None, the maximum number of times a subreddit is repeated for a user when training Gensim models, unless set in the param grid
+        :param count_weighting: str, 'linear' or 'log', how a user's subreddit counts are turned into repetitions when training Gensim models, unless set in the param grid
         """
+        if pair_sampling and previous_model_dir is not None:
+            raise ValueError("Warm starting isn't supported for pair sampling models")
         self.vocab_csv = vocab_csv
         self.vocab_dict = get_vocabulary(vocab_csv)
         self.contexts_path = contexts_path
@@ -468,6 +1770,10 @@ class GridSearchTrainer:
             self.num_models = 0
         else:
             self.param_grid = param_grid
+        if previous_model_dir is not None:
+            self.param_grid = self.get_warm_start_param_grid(
+                self.param_grid, previous_model_dir
+            )
 
         self.num_models = functools.reduce(
             operator.mul, [len(x) for x in self.param_grid.values()]
@@ -476,6 +1782,12 @@ class GridSearchTrainer:
         self.analogy_results = list()
         self.analogies_path = analogies_path
         self.case_insensitive = case_insensitive
+        self.neighbor_index_k = neighbor_index_k
+        self.previous_model_dir = previous_model_dir
+        self.compare_cold_start = compare_cold_start
+        self.pair_sampling = pair_sampling
+        self.max_repeats = max_repeats
+        self.count_weighting = count_weighting
 
     def train(self, epochs=5, workers=3, **kwargs):
         """Train models according to the param grid defined for this object. Saves each model and analogy results after training, updating the best analogy accuracy and best model parameters
@@ -488,6 +1800,10 @@ class GridSearchTrainer:
         :param **kwargs: any additional parameters that need to be passed to GensimCommunity2Vec that aren't defined in the param grid
 
         """
+        if self.pair_sampling and kwargs:
+            raise ValueError(
+                f"Training options {sorted(kwargs)} are only supported for Gensim models, not pair sampling"
+            )
         if os.path.exists(self.model_output_dir):
             logger.warning(
                 "Specified model directory %s already exists", self.model_output_dir
@@ -502,26 +1818,21 @@ class GridSearchTrainer:
                 )
                 logger.info("Training model %s of %s: %s", i, self.num_models, model_id)
 
-            c2v_model = GensimCommunity2Vec(
-                self.vocab_dict,
-                self.contexts_path,
-                self.max_context_window,
-                self.num_contexts,
-                epochs=epochs,
-                workers=workers,
-                **param_dict,
+            c2v_model = self.init_model(
+                self.previous_model_dir, epochs, workers, param_dict
             )
+            start_time = time.perf_counter()
             c2v_model.train(
                 analogies_path=self.analogies_path,
                 case_insensitive=self.case_insensitive,
                 save_vectors_prefix=save_vectors_prefix,
                 **kwargs,
             )
+            training_seconds = time.perf_counter() - start_time
 
             if self.keep_all:
                 logger.debug("Saving trained model to: %s", curr_model_path)
                 c2v_model.save(curr_model_path)
-                c2v_model.save_vectors(save_vectors_prefix)
 
             acc, detailed_accs = c2v_model.score_analogies(
                 self.analogies_path,
@@ -532,6 +1843,12 @@ class GridSearchTrainer:
             results_dict = self.get_single_model_full_results(
                 model_id, c2v_model, acc, detailed_accs
             )
+            results_dict[TRAINING_SECONDS_KEY] = training_seconds
+            results_dict.update(summarize_training_stats(c2v_model.training_stats))
+            if self.previous_model_dir is not None and self.compare_cold_start:
+                results_dict.update(
+                    self.train_cold_start(epochs, workers, param_dict, **kwargs)
+                )
             self.analogy_results.append(results_dict)
 
             if self.keep_all:
@@ -547,13 +1864,134 @@ class GridSearchTrainer:
                 self.best_acc = acc
                 self.best_model_id = model_id
                 logger.info("Saving new best model to %s", self.best_model_path)
-                os.mkdir(self.best_model_path)
+                os.makedirs(self.best_model_path)
                 c2v_model.save(self.best_model_path)
-                c2v_model.save_vectors(self.best_vectors_path)
                 self.write_single_model_metrics_json(self.best_model_path, results_dict)
 
+        if self.neighbor_index_k and self.best_model_id is not None:
+            self.save_best_model_neighbor_index()
+
         return self.best_acc, self.best_model_id
 
+    def save_best_model_neighbor_index(self):
+        """Builds the neighbor index for the final best model from its saved vectors and writes it to the best model directory.
+        This runs once after the grid search, rather than each time a new best model is found.
+        """
+        logger.info(
+            "Building neighbor index with %s neighbors for best model %s",
+            self.neighbor_index_k,
+            self.best_model_id,
+        )
+        best_vectors = load_vectors(self.best_model_path)
+        best_vectors.build_neighbor_index(self.neighbor_index_k).save(
+            os.path.join(
+                self.best_model_path, GensimCommunity2Vec.NEIGHBOR_INDEX_DIR_NAME
+            )
+        )
+
+    def init_model(self, previous_model_dir, epochs, workers, param_dict):
+        """Returns a GensimCommunity2Vec model for the grid parameters, warm started from previous_model_dir if it isn't None.
+        Returns a PairSamplingCommunity2Vec model instead when the trainer uses pair sampling.
+
+        :param previous_model_dir: str or None, directory of a trained model to warm start from
+        :param epochs: int, number of epochs to train the model
+        :param workers: int, number of threads used for training
+        :param param_dict: dict, parameters for this model from the param grid
+        """
+        if self.pair_sampling:
+            return PairSamplingCommunity2Vec(
+                self.vocab_dict,
+                self.contexts_path,
+                self.num_contexts,
+                epochs=epochs,
+                workers=workers,
+                **param_dict,
+            )
+        param_dict = {
+            "max_repeats": self.max_repeats,
+            "count_weighting": self.count_weighting,
+            **param_dict,
+        }
+        if previous_model_dir is None:
+            return GensimCommunity2Vec(
+                self.vocab_dict,
+                self.contexts_path,
+                self.max_context_window,
+                self.num_contexts,
+                epochs=epochs,
+                workers=workers,
+                **param_dict,
+            )
+        return GensimCommunity2Vec.init_from_previous_model(
+            previous_model_dir,
+            self.vocab_dict,
+            self.contexts_path,
+            self.max_context_window,
+            self.num_contexts,
+            epochs=epochs,
+            workers=workers,
+            **param_dict,
+        )
+
+    def train_cold_start(self, epochs, workers, param_dict, **kwargs):
+        """Trains a model from random initialization for comparison with warm starting. Returns a dictionary with its analogy accuracy and training time.
+
+        :param epochs: int, number of epochs to train the model
+        :param workers: int, number of threads used for training
+        :param param_dict: dict, parameters for this model from the param grid
+        :param **kwargs: passed to GensimCommunity2Vec.train
+        """
+        cold_model = self.init_model(None, epochs, workers, param_dict)
+        start_time = time.perf_counter()
+        cold_model.train(
+            analogies_path=self.analogies_path,
+            case_insensitive=self.case_insensitive,
+            **kwargs,
+        )
+        cold_seconds = time.perf_counter() - start_time
+        cold_acc, _ = cold_model.score_analogies(self.analogies_path)
+        logger.info(
+            "Cold start model achieved %s accuracy on analogy task in %s seconds",
+            cold_acc,
+            cold_seconds,
+        )
+        return {
+            COLD_START_ANALOGY_ACC_KEY: cold_acc,
+            COLD_START_TRAINING_SECONDS_KEY: cold_seconds,
+        }
+
+    @classmethod
+    def get_warm_start_param_grid(cls, param_grid, previous_model_dir):
+        """Returns a copy of the param grid keeping only the vector sizes that match the previous model, since warm started models can't change the embedding size.
+        The default grid uses the previous model's vector size.
+
+        :param param_grid: dict, keys match parameters to GensimCommunity2Vec models, values are lists of values to try
+        :param previous_model_dir: str, directory of the trained model to warm start from
+        :raises: ValueError if no vector size in the grid matches the previous model
+        """
+        with open(
+            os.path.join(previous_model_dir, GensimCommunity2Vec.PARAM_SAVE_NAME)
+        ) as j:
+            previous_vector_size = json.load(j)["vector_size"]
+        is_default_grid = param_grid is cls.DEFAULT_PARAM_GRID
+        param_grid = dict(param_grid)
+        if is_default_grid or "vector_size" not in param_grid:
+            param_grid["vector_size"] = [previous_vector_size]
+            return param_grid
+        vector_sizes = [v for v in param_grid["vector_size"] if v == previous_vector_size]
+        if len(vector_sizes) == 0:
+            raise ValueError(
+                f"No vector_size in the param grid {param_grid['vector_size']} matches the previous model's vector size {previous_vector_size}"
+            )
+        if len(vector_sizes) < len(param_grid["vector_size"]):
+            logger.warning(
+                "Skipping grid points with vector_size other than %s, the vector size of previous model %s",
+                previous_vector_size,
+                previous_model_dir,
+            )
+        param_grid["vector_size"] = vector_sizes
+        return param_grid
+
     def get_model_id(self, grid_param_dict):
         """Returns a string that uniquely names the model within this
         grid search setting.
@@ -590,7 +2028,7 @@ class GridSearchTrainer:
         """Returns all the paramenters and metrics for experimental results tracking for a single model in a dictionary.
 
         :param model_id: str, unique identifier for this model
-        :param c2v_model: GensimCommunity2Vec object
+        :param c2v_model: GensimCommunity2Vec or PairSamplingCommunity2Vec object
         :param acc: float, accuracy on the analogy task
         :param detailed_accs: str, the detailed accuracy results broken down by category as returned by Gensim
         """
@@ -626,6 +2064,133 @@ class GridSearchTrainer:
         return model_path, vectors_path
 
 
+def write_context_sample(
+    contexts_path,
+    sample_path,
+    num_users=DEFAULT_CALIBRATION_USERS,
+    max_repeats=None,
+    count_weighting=LINEAR_WEIGHTING,
+):
+    """Writes the first num_users user contexts to a plain text file for calibration runs.
+    Returns the number of users written and the longest context after expanding subreddit counts, which are the num_users and max_comments for training on the sample.
+
+    :param contexts_path: Path to a text file or directory storing the subreddits a user commented on, one user per line. Can be compressed as a bzip2 or gzip.
+    :param sample_path: str, path of the text file to write
+    :param num_users: int, the maximum number of users in the sample
+    :param max_repeats: int or None, the maximum number of times a subreddit is repeated for a user, as in training
+    :param count_weighting: str, 'linear' or 'log', how subreddit counts are turned into repetitions, as in training
+    """
+    sentences = SubredditCountSentences(contexts_path, max_repeats, count_weighting)
+    num_written = 0
+    max_comments = 0
+    with open(sample_path, "w") as sample_file:
+        for sentence in itertools.islice(sentences, num_users):
+            sample_file.write(" ".join(sentence) + "\n")
+            num_written += 1
+            max_comments = max(max_comments, len(sentence))
+    return num_written, max_comments
+
+
+def calibrate_training_settings(
+    vocab_dict,
+    contexts_path,
+    workers_options,
+    batch_words_options,
+    num_users=DEFAULT_CALIBRATION_USERS,
+    epochs=1,
+    max_repeats=None,
+    count_weighting=LINEAR_WEIGHTING,
+    **model_params,
+):
+    """Trains GensimCommunity2Vec on a sample of user contexts with each combination of workers and batch_words, measuring throughput in words per second.
+    Returns a dictionary with the fastest 'workers' and 'batch_words', its 'words_per_second' and the measurements for every combination under 'results'.
+
+    :param vocab_dict: dict, str->int storing frequency counts of the vocab elements
+    :param contexts_path: Path to a text file or directory storing the subreddits a user commented on, one user per line. Can be compressed as a bzip2 or gzip.
+    :param workers_options: list of int, numbers of worker threads to try
+    :param batch_words_options: list of int, batch sizes in words to try
+    :param num_users: int, the number of users in the calibration sample
+    :param epochs: int, number of epochs to train with each setting
+    :param max_repeats: int or None, the maximum number of times a subreddit is repeated for a user, as in training
+    :param count_weighting: str, 'linear' or 'log', how subreddit counts are turned into repetitions, as in training
+    :param **model_params: other GensimCommunity2Vec parameters, such as vector_size and negative, used for every calibration model
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as sample_dir:
+        sample_path = os.path.join(sample_dir, "calibration_contexts.txt")
+        sample_users, max_comments = write_context_sample(
+            contexts_path, sample_path, num_users, max_repeats, count_weighting
+        )
+        logger.info(
+            "Calibrating training settings on %s users with max context length %s",
+            sample_users,
+            max_comments,
+        )
+        for workers, batch_words in itertools.product(
+            workers_options, batch_words_options
+        ):
+            c2v_model = GensimCommunity2Vec(
+                vocab_dict,
+                sample_path,
+                max_comments,
+                sample_users,
+                epochs=epochs,
+                batch_words=batch_words,
+                workers=workers,
+                **model_params,
+            )
+            c2v_model.train(epoch_analogies=False, compute_loss=False)
+            words_per_second = summarize_training_stats(c2v_model.training_stats)[
+                MEAN_WORDS_PER_SECOND_KEY
+            ]
+            logger.info(
+                "Calibration with %s workers and batch_words %s: %s words per second",
+                workers,
+                batch_words,
+                words_per_second,
+            )
+            results.append(
+                {
+                    "workers": workers,
+                    "batch_words": batch_words,
+                    "words_per_second": words_per_second,
+                }
+            )
+
+    best = max(results, key=lambda r: r["words_per_second"])
+    logger.info("Best calibrated training settings: %s", best)
+    return {**best, "num_users": sample_users, "results": results}
+
+
+def load_or_calibrate_training_settings(
+    output_dir, vocab_dict, contexts_path, workers_options, batch_words_options, **kwargs
+):
+    """Returns calibrated training settings persisted in output_dir, running calibrate_training_settings and saving its result first if there aren't any yet.
+    Delete the calibration json to calibrate again, for example after moving to different hardware.
+
+    :param output_dir: str, directory where the calibration json is stored, typically the grid search output directory
+    :param vocab_dict: dict, str->int storing frequency counts of the vocab elements
+    :param contexts_path: Path to a text file or directory storing the subreddits a user commented on, one user per line
+    :param workers_options: list of int, numbers of worker threads to try
+    :param batch_words_options: list of int, batch sizes in words to try
+    :param **kwargs: passed to calibrate_training_settings
+    """
+    calibration_path = os.path.join(output_dir, CALIBRATION_JSON_NAME)
+    if os.path.exists(calibration_path):
+        logger.info("Using calibrated training settings from %s", calibration_path)
+        with open(calibration_path) as calibration_file:
+            return json.load(calibration_file)
+
+    calibration = calibrate_training_settings(
+        vocab_dict, contexts_path, workers_options, batch_words_options, **kwargs
+    )
+    os.makedirs(output_dir, exist_ok=True)
+    logger.info("Saving calibrated training settings to %s", calibration_path)
+    with open(calibration_path, "w") as calibration_file:
+        json.dump(calibration, calibration_file)
+    return calibration
+
+
 def train_with_hyperparam_tuning(
     vocab_csv,
     contexts,
@@ -638,6 +2203,12 @@ def train_with_hyperparam_tuning(
     analogies,
     case_insensitive=False,
     keep_all=False,
+    neighbor_index_k=DEFAULT_NEIGHBOR_INDEX_K,
+    previous_model_dir=None,
+    compare_cold_start=False,
+    pair_sampling=False,
+    max_repeats=None,
+    count_weighting=LINEAR_WEIGHTING,
     **kwargs,
 ):
     """
@@ -652,6 +2223,12 @@ def train_with_hyperparam_tuning(
     :param analogies: str, optional. Define to use a particular analogies file where lines are whitespace separated 4-tuples and split into sections by ': SECTION NAME' lines
     :param case_insensitive: boolean, whether analogies should be done case insensitive or not, for Reddit typically False.
     :param keep_all: boolean, set to True to write every trained model to disk, rather than keeping the best model. If this flag is true, then a directory will be created in model_output_dir for each model in the grid search, rather than just the best one
+    :param neighbor_index_k: int or None, number of neighbors to precompute for each subreddit in the best model's neighbor index, None to skip building the index
+    :param previous_model_dir: str or None, directory of a trained model, such as the previous month's best model, to warm start every model from
+    :param compare_cold_start: boolean, when warm starting, set to True to also train each model from random initialization for comparison
+    :param pair_sampling: boolean, set to True to train PairSamplingCommunity2Vec models instead of Gensim models
+    :param max_repeats: int or None, the maximum number of times a subreddit is repeated for a user when training Gensim models
+    :param count_weighting: str, 'linear' or 'log', how a user's subreddit counts are turned into repetitions when training Gensim models
     :param kwargs: Passed to the Gensim Model at training time
     """
     logger.info("Param grid: %s", param_grid)
@@ -665,6 +2242,12 @@ def train_with_hyperparam_tuning(
         analogies_path=analogies,
         case_insensitive=case_insensitive,
         keep_all=keep_all,
+        neighbor_index_k=neighbor_index_k,
+        previous_model_dir=previous_model_dir,
+        compare_cold_start=compare_cold_start,
+        pair_sampling=pair_sampling,
+        max_repeats=max_repeats,
+        count_weighting=count_weighting,
     )
     grid_trainer.train(epochs, workers, **kwargs)
     grid_trainer.write_performance_results()
@@ -731,18 +2314,118 @@ parser.add_argument(
     action="store_true",
     help="Use this flag to keep all models trained during hyperparameter tuning with the vectors after each epoch. Otherwise only the best model will be kept. Note that using this will create LOTS of model folders and vector files.",
 )
+parser.add_argument(
+    "--neighbor_index_k",
+    type=int,
+    default=DEFAULT_NEIGHBOR_INDEX_K,
+    help=f"Number of nearest neighbors precomputed for each subreddit in the best model's neighbor index. Use 0 to skip building the index. Defaults to {DEFAULT_NEIGHBOR_INDEX_K}.",
+)
+parser.add_argument(
+    "--previous_model",
+    help="Directory of a trained community2vec model, typically the previous month's best_model, to warm start training from. New subreddits are added to its vocabulary and shared subreddits keep their vectors, so fewer epochs are usually needed.",
+)
+parser.add_argument(
+    "--compare_cold_start",
+    action="store_true",
+    help="With --previous_model, also train each model from random initialization and report its analogy accuracy and training time in the results CSV.",
+)
+parser.add_argument(
+    "--pair_sampling",
+    action="store_true",
+    help="Use this flag to train with sampled subreddit pairs for each user instead of Gensim skip-gram over the whole user context, which avoids the quadratic cost of users with many comments. The param grid can include 'pairs_per_comment' and 'batch_pairs'.",
+)
+parser.add_argument(
+    "--corpus_decoders",
+    type=int,
+    default=0,
+    help="Number of processes decompressing user context files in parallel while training Gensim models. Can't be used with --pair_sampling. Defaults to 0, reading files one after another in the training process.",
+)
+parser.add_argument(
+    "--shuffle_seed",
+    type=int,
+    help="With --corpus_decoders, shuffle the order of user context files each epoch using this seed.",
+)
+parser.add_argument(
+    "--compute_loss",
+    action="store_true",
+    help="Use this flag to record training loss in the per epoch telemetry of Gensim models. This slows down training. Pair sampling models always record loss.",
+)
+parser.add_argument(
+    "--calibrate",
+    action="store_true",
+    help=f"Use this flag to pick workers and batch_words by training Gensim models on a sample of user contexts with each combination of --calibration_workers and --calibration_batch_words and keeping the highest words per second. The choice is saved to {CALIBRATION_JSON_NAME} in the output directory and reused on later runs. Overrides --workers, and batch_words unless it's in the param grid. Can't be used with --pair_sampling, since it measures Gensim throughput.",
+)
+parser.add_argument(
+    "--calibration_workers",
+    type=int,
+    nargs="+",
+    default=[4, 8, 12],
+    help="Numbers of workers to try with --calibrate. Defaults to 4 8 12.",
+)
+parser.add_argument(
+    "--calibration_batch_words",
+    type=int,
+    nargs="+",
+    default=[1000, 10000, 100000],
+    help="Values of batch_words to try with --calibrate. Defaults to 1000 10000 100000.",
+)
+parser.add_argument(
+    "--calibration_users",
+    type=int,
+    default=DEFAULT_CALIBRATION_USERS,
+    help=f"Number of users in the calibration sample. Defaults to {DEFAULT_CALIBRATION_USERS}.",
+)
+parser.add_argument(
+    "--max_repeats",
+    type=int,
+    help="The maximum number of times a subreddit is repeated for a user when training Gensim models. Works with plain user contexts or those written with subreddit counts. Defaults to no limit.",
+)
+parser.add_argument(
+    "--count_weighting",
+    choices=COUNT_WEIGHTINGS,
+    default=LINEAR_WEIGHTING,
+    help=f"How a user's comment count in a subreddit becomes repetitions when training Gensim models. '{LINEAR_WEIGHTING}' repeats the subreddit once per comment, '{LOG_WEIGHTING}' repeats it 1 + floor(log2(count)) times. Defaults to '{LINEAR_WEIGHTING}'.",
+)
 
 
 if __name__ == "__main__":
     try:
         args = parser.parse_args()
+        if args.pair_sampling and args.corpus_decoders > 0:
+            parser.error("--corpus_decoders can't be used with --pair_sampling")
+        if args.pair_sampling and args.calibrate:
+            parser.error("--calibrate can't be used with --pair_sampling")
         config = ihop.utils.parse_config_file(args.config)
         ihop.utils.configure_logging(config[1])
         logger.debug("Script arguments: %s", args)
         spark = ihop.utils.get_spark_session("IHOP Community2Vec", config[0])
 
-        num_users, max_comments = get_w2v_params_from_spark_df(spark, args.contexts)
+        num_users, max_comments = get_w2v_params_from_spark_df(
+            spark, args.contexts, args.max_repeats, args.count_weighting
+        )
         spark.stop()
+        train_kwargs = {}
+        if args.corpus_decoders > 0:
+            train_kwargs = {
+                "corpus_decoders": args.corpus_decoders,
+                "shuffle_seed": args.shuffle_seed,
+            }
+        if args.compute_loss and not args.pair_sampling:
+            train_kwargs["compute_loss"] = True
+        workers = args.workers
+        if args.calibrate:
+            calibration = load_or_calibrate_training_settings(
+                args.output_dir,
+                get_vocabulary(args.vocab_csv),
+                args.contexts,
+                args.calibration_workers,
+                args.calibration_batch_words,
+                num_users=args.calibration_users,
+                max_repeats=args.max_repeats,
+                count_weighting=args.count_weighting,
+            )
+            workers = calibration["workers"]
+            args.param_grid.setdefault("batch_words", [calibration["batch_words"]])
         train_with_hyperparam_tuning(
             args.vocab_csv,
             args.contexts,
@@ -750,10 +2433,17 @@ if __name__ == "__main__":
             num_users,
             max_comments,
             args.output_dir,
-            args.workers,
+            workers,
             args.epochs,
             args.analogies,
-            args.keep_all,
+            keep_all=args.keep_all,
+            neighbor_index_k=args.neighbor_index_k,
+            previous_model_dir=args.previous_model,
+            compare_cold_start=args.compare_cold_start,
+            pair_sampling=args.pair_sampling,
+            max_repeats=args.max_repeats,
+            count_weighting=args.count_weighting,
+            **train_kwargs,
         )
     except Exception:
         logger.error("Fatal error while training community2vec", exc_info=True)
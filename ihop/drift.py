@@ -0,0 +1,251 @@
+"""Measures how subreddits move between monthly community2vec models.
+For each pair of consecutive months this computes:
+1) Cosine drift, the cosine distance between a subreddit's vector in the two months after aligning the earlier month to the later one with orthogonal Procrustes
+2) Neighbor churn, the Jaccard distance between a subreddit's top-K nearest neighbors in the two months
+
+Results are written as parquet tables ranking subreddits by how much they moved.
+"""
+import argparse
+import logging
+import os
+import pathlib
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from ihop.community2vec import NeighborIndex, load_vectors
+from ihop.embedding_store import get_procrustes_rotation
+import ihop.utils
+
+logger = logging.getLogger(__name__)
+
+MONTH_PAIR_DRIFT_FILE_NAME = "month_pair_drift.parquet"
+DRIFT_SUMMARY_FILE_NAME = "subreddit_drift_summary.parquet"
+
+SUBREDDIT_COL = "subreddit"
+START_MONTH_COL = "start_month"
+END_MONTH_COL = "end_month"
+DRIFT_COL = "cosine_drift"
+CHURN_COL = "neighbor_churn"
+
+
+def get_month_neighbors(model_path, k=10, chunk_size=1024):
+    """Loads community2vec vectors and returns its vocabulary, normed vectors and top k neighbor indices as (list of str, numpy array, numpy array)
+
+    :param model_path: str, directory of a community2vec model
+    :param k: int, number of nearest neighbors to find for each subreddit
+    :param chunk_size: int, number of rows of the similarity matrix computed at once
+    """
+    logger.info("Computing top %s neighbors for model %s", k, model_path)
+    c2v_model = load_vectors(model_path)
+    index_to_key = list(c2v_model.get_index_to_key())
+    normed_vectors = np.asarray(c2v_model.get_normed_vectors())
+    neighbor_index = NeighborIndex.build(normed_vectors, index_to_key, k, chunk_size)
+    return index_to_key, normed_vectors, neighbor_index.neighbors
+
+
+def get_cosine_drift(start_vectors, end_vectors):
+    """Returns the cosine distance between corresponding rows of the two arrays of unit length vectors after rotating start_vectors onto end_vectors
+
+    :param start_vectors: numpy array with shape (num subreddits, vector size)
+    :param end_vectors: numpy array with shape (num subreddits, vector size)
+    """
+    rotation = get_procrustes_rotation(start_vectors, end_vectors)
+    aligned = start_vectors @ rotation
+    aligned /= np.linalg.norm(aligned, axis=1, keepdims=True)
+    return 1.0 - np.sum(aligned * end_vectors, axis=1)
+
+
+def get_neighbor_churn(start_neighbors, end_neighbors, chunk_size=1024):
+    """Returns the Jaccard distance between corresponding rows of two arrays of neighbor ids.
+    Both arrays must use the same ids for the same subreddits and have no repeated ids within a row.
+
+    :param start_neighbors: numpy int array with shape (num subreddits, k)
+    :param end_neighbors: numpy int array with shape (num subreddits, k)
+    :param chunk_size: int, number of rows compared at once, bounding memory to chunk_size * k * k booleans
+    """
+    num_rows = start_neighbors.shape[0]
+    intersection = np.empty(num_rows, dtype=np.int64)
+    for start in range(0, num_rows, chunk_size):
+        end = min(start + chunk_size, num_rows)
+        matches = (
+            start_neighbors[start:end, :, None] == end_neighbors[start:end, None, :]
+        )
+        intersection[start:end] = matches.any(axis=2).sum(axis=1)
+    union = start_neighbors.shape[1] + end_neighbors.shape[1] - intersection
+    return 1.0 - intersection / union
+
+
+def compare_months(start_month, end_month, start_data, end_data, chunk_size=1024):
+    """Returns a pandas DataFrame with the cosine drift and neighbor churn of every subreddit present in both months
+
+    :param start_month: str, name of the earlier month
+    :param end_month: str, name of the later month
+    :param start_data: tuple of vocabulary, normed vectors and neighbor ids for the earlier month, as returned by get_month_neighbors
+    :param end_data: tuple of vocabulary, normed vectors and neighbor ids for the later month, as returned by get_month_neighbors
+    :param chunk_size: int, number of rows compared at once when computing neighbor churn
+    """
+    start_keys, start_vectors, start_neighbors = start_data
+    end_keys, end_vectors, end_neighbors = end_data
+    end_key_to_index = {k: i for i, k in enumerate(end_keys)}
+    shared = [
+        (i, end_key_to_index[k])
+        for i, k in enumerate(start_keys)
+        if k in end_key_to_index
+    ]
+    logger.info(
+        "Comparing %s and %s on %s shared subreddits", start_month, end_month, len(shared)
+    )
+    start_ids = np.array([s[0] for s in shared], dtype=np.int64)
+    end_ids = np.array([s[1] for s in shared], dtype=np.int64)
+
+    # Map the earlier month's neighbor ids into the later month's vocabulary, neighbors missing from the later month get unique negative ids so they never match
+    start_to_end = np.array(
+        [end_key_to_index.get(k, -1 - i) for i, k in enumerate(start_keys)],
+        dtype=np.int64,
+    )
+    churn = get_neighbor_churn(
+        start_to_end[start_neighbors[start_ids]],
+        np.asarray(end_neighbors[end_ids], dtype=np.int64),
+        chunk_size,
+    )
+    drift = get_cosine_drift(start_vectors[start_ids], end_vectors[end_ids])
+
+    result = pd.DataFrame(
+        {
+            SUBREDDIT_COL: [start_keys[i] for i in start_ids],
+            START_MONTH_COL: start_month,
+            END_MONTH_COL: end_month,
+            DRIFT_COL: drift,
+            CHURN_COL: churn,
+        }
+    )
+    result["drift_rank"] = (
+        result[DRIFT_COL].rank(ascending=False, method="min").astype(int)
+    )
+    result["churn_rank"] = (
+        result[CHURN_COL].rank(ascending=False, method="min").astype(int)
+    )
+    return result.sort_values("drift_rank", kind="stable").reset_index(drop=True)
+
+
+def summarize_drift(month_pair_drift):
+    """Returns a pandas DataFrame with each subreddit's mean and max drift and churn over all month pairs, ranked by mean cosine drift
+
+    :param month_pair_drift: pandas DataFrame, concatenated output of compare_months
+    """
+    summary = (
+        month_pair_drift.groupby(SUBREDDIT_COL)
+        .agg(
+            num_month_pairs=(DRIFT_COL, "size"),
+            mean_cosine_drift=(DRIFT_COL, "mean"),
+            max_cosine_drift=(DRIFT_COL, "max"),
+            mean_neighbor_churn=(CHURN_COL, "mean"),
+            max_neighbor_churn=(CHURN_COL, "max"),
+        )
+        .reset_index()
+    )
+    summary["drift_rank"] = (
+        summary["mean_cosine_drift"].rank(ascending=False, method="min").astype(int)
+    )
+    summary["churn_rank"] = (
+        summary["mean_neighbor_churn"].rank(ascending=False, method="min").astype(int)
+    )
+    return summary.sort_values("drift_rank", kind="stable").reset_index(drop=True)
+
+
+def compute_drift(model_paths, k=10, workers=1, chunk_size=1024):
+    """Returns the drift and churn for each pair of consecutive months and the summary over all months as two pandas DataFrames.
+    Neighbors for each month are computed in parallel processes.
+
+    :param model_paths: dict, month name -> community2vec model directory, in chronological order. This matches 'model_paths' in the app's config
+    :param k: int, number of nearest neighbors compared for neighbor churn
+    :param workers: int, number of months processed in parallel
+    :param chunk_size: int, number of rows of similarity or neighbor matrices computed at once, which bounds memory use
+    """
+    months = list(model_paths.keys())
+    if len(months) < 2:
+        raise ValueError("At least two months are needed to compute drift")
+    month_data = joblib.Parallel(n_jobs=workers)(
+        joblib.delayed(get_month_neighbors)(model_paths[m], k, chunk_size)
+        for m in months
+    )
+    month_pair_drift = pd.concat(
+        [
+            compare_months(
+                months[i], months[i + 1], month_data[i], month_data[i + 1], chunk_size
+            )
+            for i in range(len(months) - 1)
+        ],
+        ignore_index=True,
+    )
+    return month_pair_drift, summarize_drift(month_pair_drift)
+
+
+def main(model_paths, output_dir, k=10, workers=1, chunk_size=1024):
+    """Computes drift and churn, then writes the month pair and summary tables to parquet in output_dir
+
+    :param model_paths: dict, month name -> community2vec model directory, in chronological order
+    :param output_dir: str, directory to write parquet tables to
+    :param k: int, number of nearest neighbors compared for neighbor churn
+    :param workers: int, number of months processed in parallel
+    :param chunk_size: int, number of rows of similarity or neighbor matrices computed at once
+    """
+    month_pair_drift, summary = compute_drift(model_paths, k, workers, chunk_size)
+    os.makedirs(output_dir, exist_ok=True)
+    month_pair_path = os.path.join(output_dir, MONTH_PAIR_DRIFT_FILE_NAME)
+    logger.info("Writing month pair drift to %s", month_pair_path)
+    month_pair_drift.to_parquet(month_pair_path, index=False)
+    summary_path = os.path.join(output_dir, DRIFT_SUMMARY_FILE_NAME)
+    logger.info("Writing drift summary to %s", summary_path)
+    summary.to_parquet(summary_path, index=False)
+
+
+parser = argparse.ArgumentParser(
+    description="Rank subreddits by cosine drift and nearest neighbor churn between consecutive monthly community2vec models."
+)
+parser.add_argument(
+    "--config",
+    type=pathlib.Path,
+    required=True,
+    help="JSON file with 'model_paths' mapping month names to community2vec model directories in chronological order, the same format used by the app. Can also override default logging configurations.",
+)
+parser.add_argument("output_dir", help="Directory to write the parquet tables to")
+parser.add_argument(
+    "-k",
+    "--top_k",
+    type=int,
+    default=10,
+    help="Number of nearest neighbors compared for neighbor churn. Defaults to 10.",
+)
+parser.add_argument(
+    "-w",
+    "--workers",
+    type=int,
+    default=1,
+    help="Number of months processed in parallel. Defaults to 1.",
+)
+parser.add_argument(
+    "--chunk_size",
+    type=int,
+    default=1024,
+    help="Number of subreddits processed at once when computing similarities, lower this to reduce memory use. Defaults to 1024.",
+)
+
+
+if __name__ == "__main__":
+    try:
+        args = parser.parse_args()
+        config = ihop.utils.parse_config_file(args.config)
+        ihop.utils.configure_logging(config[1])
+        logger.debug("Script arguments: %s", args)
+        main(
+            config[2]["model_paths"],
+            args.output_dir,
+            args.top_k,
+            args.workers,
+            args.chunk_size,
+        )
+    except Exception:
+        logger.error("Fatal error while computing subreddit drift", exc_info=True)
@@ -0,0 +1,259 @@
+"""Consolidates community2vec models from many months into a single store of aligned embeddings.
+All months share one global subreddit vocabulary and vectors are kept in a memory-mapped numpy array, so loading a month or a subreddit's trajectory across months is a slice rather than deserializing Gensim models.
+
+Each month's unit length vectors are rotated onto a reference month using orthogonal Procrustes alignment over the subreddits the two months share, see Hamilton et al. 2016 (https://aclanthology.org/P16-1141/).
+"""
+import argparse
+import json
+import logging
+import os
+import pathlib
+
+import gensim
+import numpy as np
+import scipy.linalg
+
+from ihop.community2vec import VECTORS_FILE_NAME
+import ihop.utils
+
+logger = logging.getLogger(__name__)
+
+
+def load_keyed_vectors(model_path):
+    """Returns the Gensim KeyedVectors saved by community2vec training in the model directory, memory mapped read only
+
+    :param model_path: str, directory of a single community2vec model, such as the 'best_model' directory
+    """
+    return gensim.models.KeyedVectors.load(
+        os.path.join(model_path, VECTORS_FILE_NAME), mmap="r"
+    )
+
+
+def get_procrustes_rotation(source_vectors, target_vectors):
+    """Returns the orthogonal matrix R minimizing ||source_vectors @ R - target_vectors||.
+    Rows of the two arrays must correspond to the same terms.
+
+    :param source_vectors: numpy array with shape (num terms, vector size)
+    :param target_vectors: numpy array with shape (num terms, vector size)
+    """
+    rotation, _ = scipy.linalg.orthogonal_procrustes(source_vectors, target_vectors)
+    return rotation
+
+
+class AlignedEmbeddingStore:
+    """Embeddings for many months over a global vocabulary, stored as an array with shape (months, vocab size, vector size) and a boolean presence mask with shape (months, vocab size).
+    Vectors are unit length and rotated into the space of the reference month. Subreddits missing from a month have zero vectors and False presence.
+    """
+
+    VECTORS_FILE_NAME = "aligned_vectors.npy"
+    PRESENCE_FILE_NAME = "presence.npy"
+    METADATA_FILE_NAME = "store.json"
+
+    def __init__(self, months, vocabulary, vectors, presence, reference_month):
+        """
+        :param months: list of str, month names in the order of the first axis of vectors
+        :param vocabulary: list of str, the global vocabulary in the order of the second axis of vectors
+        :param vectors: numpy array with shape (months, vocab size, vector size)
+        :param presence: boolean numpy array with shape (months, vocab size)
+        :param reference_month: str, the month all others are aligned to
+        """
+        self.months = list(months)
+        self.vocabulary = list(vocabulary)
+        self.vectors = vectors
+        self.presence = presence
+        self.reference_month = reference_month
+        self.month_to_index = {m: i for i, m in enumerate(self.months)}
+        self.key_to_index = {k: i for i, k in enumerate(self.vocabulary)}
+
+    @property
+    def vector_size(self):
+        return self.vectors.shape[2]
+
+    def get_month_vectors(self, month):
+        """Returns the aligned vectors for the month with shape (vocab size, vector size) and its presence mask
+
+        :param month: str, name of the month
+        """
+        i = self.month_to_index[month]
+        return self.vectors[i], self.presence[i]
+
+    def get_month_index_to_key(self, month):
+        """Returns the list of subreddits present in the month, in global vocabulary order
+
+        :param month: str, name of the month
+        """
+        present = np.flatnonzero(self.presence[self.month_to_index[month]])
+        return [self.vocabulary[i] for i in present]
+
+    def get_trajectory(self, subreddit):
+        """Returns a subreddit's aligned vectors for every month with shape (months, vector size) and the presence of the subreddit in each month
+
+        :param subreddit: str, the subreddit to look up
+        """
+        i = self.key_to_index[subreddit]
+        return self.vectors[:, i], self.presence[:, i]
+
+    def save_metadata(self, save_dir):
+        """Writes the months, vocabulary and reference month to json
+
+        :param save_dir: str, directory of the store
+        """
+        with open(os.path.join(save_dir, self.METADATA_FILE_NAME), "w") as f:
+            json.dump(
+                {
+                    "months": self.months,
+                    "vocabulary": self.vocabulary,
+                    "reference_month": self.reference_month,
+                },
+                f,
+            )
+
+    @classmethod
+    def build(cls, model_paths, output_dir, reference_month=None, dtype="float32"):
+        """Builds the store from community2vec models, writing arrays directly to memory-mapped files in output_dir.
+        Models are read one at a time, so only a single month's vectors are held in memory.
+
+        :param model_paths: dict, month name -> community2vec model directory, in chronological order. This matches 'model_paths' in the app's config
+        :param output_dir: str, directory to write the store to
+        :param reference_month: str or None, month that others are aligned to, defaults to the last month
+        :param dtype: str, 'float32' or 'float16', type used to store vectors
+        """
+        months = list(model_paths.keys())
+        if len(months) == 0:
+            raise ValueError("At least one model is needed to build an embedding store")
+        reference_month = months[-1] if reference_month is None else reference_month
+        if reference_month not in model_paths:
+            raise ValueError(f"Reference month {reference_month} is not in model_paths")
+
+        logger.info("Collecting global vocabulary from %s months", len(months))
+        vocabulary = set()
+        for month in months:
+            vocabulary.update(load_keyed_vectors(model_paths[month]).index_to_key)
+        vocabulary = sorted(vocabulary)
+        key_to_index = {k: i for i, k in enumerate(vocabulary)}
+
+        reference_kv = load_keyed_vectors(model_paths[reference_month])
+        reference_vectors = reference_kv.get_normed_vectors()
+        vector_size = reference_kv.vector_size
+        logger.info(
+            "Building aligned embedding store with %s months, %s subreddits and vector size %s",
+            len(months),
+            len(vocabulary),
+            vector_size,
+        )
+
+        os.makedirs(output_dir, exist_ok=True)
+        vectors = np.lib.format.open_memmap(
+            os.path.join(output_dir, cls.VECTORS_FILE_NAME),
+            mode="w+",
+            dtype=dtype,
+            shape=(len(months), len(vocabulary), vector_size),
+        )
+        presence = np.lib.format.open_memmap(
+            os.path.join(output_dir, cls.PRESENCE_FILE_NAME),
+            mode="w+",
+            dtype=bool,
+            shape=(len(months), len(vocabulary)),
+        )
+
+        for i, month in enumerate(months):
+            keyed_vectors = load_keyed_vectors(model_paths[month])
+            if keyed_vectors.vector_size != vector_size:
+                raise ValueError(
+                    f"Vector size {keyed_vectors.vector_size} for {month} doesn't match reference vector size {vector_size}"
+                )
+            month_vectors = keyed_vectors.get_normed_vectors()
+            if month != reference_month:
+                shared = [
+                    (j, reference_kv.key_to_index[k])
+                    for j, k in enumerate(keyed_vectors.index_to_key)
+                    if k in reference_kv.key_to_index
+                ]
+                logger.debug(
+                    "Aligning %s to %s using %s shared subreddits",
+                    month,
+                    reference_month,
+                    len(shared),
+                )
+                if len(shared) == 0:
+                    raise ValueError(
+                        f"No subreddits are shared between {month} and {reference_month}"
+                    )
+                month_ids, reference_ids = map(list, zip(*shared))
+                rotation = get_procrustes_rotation(
+                    month_vectors[month_ids], reference_vectors[reference_ids]
+                )
+                month_vectors = month_vectors @ rotation
+
+            global_ids = [key_to_index[k] for k in keyed_vectors.index_to_key]
+            vectors[i, global_ids] = month_vectors
+            presence[i, global_ids] = True
+
+        vectors.flush()
+        presence.flush()
+        store = cls(months, vocabulary, vectors, presence, reference_month)
+        store.save_metadata(output_dir)
+        logger.info("Aligned embedding store written to %s", output_dir)
+        return store
+
+    @classmethod
+    def load(cls, load_dir, mmap_mode="r"):
+        """Returns the AlignedEmbeddingStore saved in load_dir
+
+        :param load_dir: str, directory of the store
+        :param mmap_mode: str or None, passed to numpy.load. The default memory maps the arrays read only, use None to read them into memory
+        """
+        with open(os.path.join(load_dir, cls.METADATA_FILE_NAME)) as f:
+            metadata = json.load(f)
+        vectors = np.load(
+            os.path.join(load_dir, cls.VECTORS_FILE_NAME), mmap_mode=mmap_mode
+        )
+        presence = np.load(
+            os.path.join(load_dir, cls.PRESENCE_FILE_NAME), mmap_mode=mmap_mode
+        )
+        return cls(
+            metadata["months"],
+            metadata["vocabulary"],
+            vectors,
+            presence,
+            metadata["reference_month"],
+        )
+
+
+parser = argparse.ArgumentParser(
+    description="Build a store of community2vec embeddings from many months aligned to a reference month over a shared subreddit vocabulary."
+)
+parser.add_argument(
+    "--config",
+    type=pathlib.Path,
+    required=True,
+    help="JSON file with 'model_paths' mapping month names to community2vec model directories in chronological order, the same format used by the app. Can also override default logging configurations.",
+)
+parser.add_argument(
+    "output_dir", help="Directory to write the aligned embedding store to"
+)
+parser.add_argument(
+    "--reference_month",
+    help="Month from 'model_paths' that all other months are aligned to. Defaults to the last month.",
+)
+parser.add_argument(
+    "--float16",
+    action="store_true",
+    help="Use this flag to store vectors as float16 rather than float32, halving the size of the store.",
+)
+
+
+if __name__ == "__main__":
+    try:
+        args = parser.parse_args()
+        config = ihop.utils.parse_config_file(args.config)
+        ihop.utils.configure_logging(config[1])
+        logger.debug("Script arguments: %s", args)
+        AlignedEmbeddingStore.build(
+            config[2]["model_paths"],
+            args.output_dir,
+            args.reference_month,
+            "float16" if args.float16 else "float32",
+        )
+    except Exception:
+        logger.error("Fatal error while building aligned embedding store", exc_info=True)
@@ -18,6 +18,12 @@ COMMENTS = "comments"
 SUBMISSIONS = "submissions"
 DEFAULT_TOP_N = 10000
 DEFAULT_USER_EXCLUDE = 0.05
+# Submissions with more comments than this are salted to spread them over partitions when joining
+DEFAULT_SKEW_THRESHOLD = 10000
+DEFAULT_NUM_SALTS = 32
+SALT_COL = "join_salt"
+# Separates a subreddit from the number of times a user commented in it when user contexts are written as counts, e.g. 'nba:12'
+SUBREDDIT_COUNT_SEPARATOR = ":"
 
 # How deleted authors or posts are indicated in json (user removed)
 DELETED = "[deleted]"
@@ -233,15 +239,21 @@ def aggregate_for_vectorization(
     context_len_col="context_length",
     min_sentence_length=2,
     exclude_top_perc=DEFAULT_USER_EXCLUDE,
+    subreddit_counts=False,
+    max_repeats=None,
 ):
     """Returns a dataframe where each row represents a context with two columns:
     - word_out_col: stores words for each context as white-space delmited string
-    - context_len_col: the number of words in each context
+    - context_len_col: the number of words in each context before any compression
 
     Aggregates data on the context col, using whitespace concatenation
     to combine the values in the word column, dropping rows that
     have contexts smaller than min_sentence_length.
 
+    Contexts can be compressed so that heavy users of a single subreddit don't become long sentences of the same word.
+    With subreddit_counts, each distinct word appears once as 'word:count', see SUBREDDIT_COUNT_SEPARATOR.
+    With max_repeats, each distinct word is repeated at most max_repeats times.
+
     :param dataframe: Spark dataframe
     :param context_col: str, column to group by
     :param word_col: str, column to concatenate together
@@ -249,16 +261,48 @@ def aggregate_for_vectorization(
     :param context_len_col: str, name of column that stores the number of words concatenated for each context
     :param min_sentence_length: int, the minimum number (inclusive) of comments allowed for a user to be included in the dataset
     :param exclude_top_perc: float, the percentage of top commenting users to exclude
+    :param subreddit_counts: boolean, set to True to output each distinct word once with its count
+    :param max_repeats: int or None, the maximum number of times a word is repeated in a context. Ignored when subreddit_counts is True
     """
     logger.debug(
         "Aggregating dataframe by %s to collect text in %s column",
         context_col,
         word_col,
     )
-    agg_df = dataframe.groupBy(context_col).agg(
-        fn.concat_ws(" ", fn.collect_list(dataframe[word_col])).alias(word_out_col),
-        fn.count(context_col).alias(context_len_col),
-    )
+    if subreddit_counts or max_repeats:
+        word_count_col = "word_count"
+        word_count_df = dataframe.groupBy(context_col, word_col).agg(
+            fn.count("*").alias(word_count_col)
+        )
+        if subreddit_counts:
+            logger.debug("Writing contexts as word counts")
+            token = fn.concat_ws(
+                SUBREDDIT_COUNT_SEPARATOR,
+                word_count_df[word_col],
+                word_count_df[word_count_col].cast("string"),
+            )
+        else:
+            logger.debug("Repeating words at most %s times in contexts", max_repeats)
+            token = fn.array_join(
+                fn.array_repeat(
+                    word_count_df[word_col],
+                    fn.least(
+                        word_count_df[word_count_col], fn.lit(max_repeats)
+                    ).cast("int"),
+                ),
+                " ",
+            )
+        agg_df = word_count_df.groupBy(context_col).agg(
+            fn.concat_ws(" ", fn.collect_list(token)).alias(word_out_col),
+            fn.sum(word_count_col).alias(context_len_col),
+        )
+    else:
+        agg_df = dataframe.groupBy(context_col).agg(
+            fn.concat_ws(" ", fn.collect_list(dataframe[word_col])).alias(
+                word_out_col
+            ),
+            fn.count(context_col).alias(context_len_col),
+        )
 
     agg_df = exclude_top_percentage_of_users(
         agg_df, count_col=context_len_col, exclude_top_perc=exclude_top_perc
@@ -272,6 +316,25 @@ def aggregate_for_vectorization(
     return agg_df.drop(context_col)
 
 
+def get_corpus_size(
+    aggregated_df, word_out_col="subreddit_concat", context_len_col="context_length"
+):
+    """Returns the number of comments and the number of tokens written to the corpus for contexts from aggregate_for_vectorization as a tuple of ints.
+    The two are equal unless contexts were compressed.
+
+    :param aggregated_df: Spark DataFrame returned by aggregate_for_vectorization
+    :param word_out_col: str, the column of whitespace delimited words for each context
+    :param context_len_col: str, the column storing the number of comments in each context
+    """
+    result = aggregated_df.agg(
+        fn.sum(context_len_col).alias("num_comments"),
+        fn.sum(fn.size(fn.split(aggregated_df[word_out_col], " "))).alias(
+            "num_tokens"
+        ),
+    ).head()
+    return result.num_comments or 0, result.num_tokens or 0
+
+
 def filter_out_top_users(
     dataframe, author_col="author", exclude_top_perc=DEFAULT_USER_EXCLUDE
 ):
@@ -366,6 +429,58 @@ def filter_by_time_between_submission_and_comment(
     return result_df
 
 
+def log_partition_size_stats(dataframe, name="DataFrame"):
+    """Logs the number of partitions and the min, mean, max and standard deviation of the number of rows in each partition.
+    This requires a pass over the data, so should only be used for diagnostics.
+
+    :param dataframe: Spark DataFrame
+    :param name: str, name of the dataframe in log messages
+    """
+    stats = (
+        dataframe.groupBy(fn.spark_partition_id().alias("partition"))
+        .count()
+        .agg(
+            fn.count("*").alias("partitions"),
+            fn.min("count").alias("min"),
+            fn.mean("count").alias("mean"),
+            fn.max("count").alias("max"),
+            fn.stddev("count").alias("stddev"),
+        )
+        .collect()[0]
+    )
+    logger.info(
+        "%s partition sizes in rows: {partitions: %s, min: %s, mean: %s, max: %s, stddev: %s}",
+        name,
+        stats["partitions"],
+        stats["min"],
+        stats["mean"],
+        stats["max"],
+        stats["stddev"],
+    )
+    return stats
+
+
+def get_hot_keys(dataframe, key_col, threshold=DEFAULT_SKEW_THRESHOLD):
+    """Returns the list of values of key_col that appear in more than threshold rows of the dataframe
+
+    :param dataframe: Spark DataFrame
+    :param key_col: str, the column to count values of
+    :param threshold: int, keys with more rows than this are returned
+    """
+    hot_keys = [
+        r[key_col]
+        for r in dataframe.groupBy(key_col)
+        .count()
+        .where(fn.col("count") > threshold)
+        .select(key_col)
+        .collect()
+    ]
+    logger.info(
+        "Found %s keys in %s with more than %s rows", len(hot_keys), key_col, threshold
+    )
+    return hot_keys
+
+
 def join_submissions_and_comments(
     submissions_df,
     comments_df,
@@ -374,10 +489,18 @@ def join_submissions_and_comments(
     comments_duplicate_col_prefix=COMMENTS,
     timestamp_col=CREATED_UTC,
     time_delta_col="time_to_comment_in_seconds",
+    max_time_delta=None,
+    min_time_delta=None,
+    skew_threshold=None,
+    num_salts=DEFAULT_NUM_SALTS,
+    log_partition_stats=False,
 ):
     """Returns a DataFrame with comments paired up with their submission using an inner join and computing the time delta between each submission and comment creation time.
     In the output, duplicate column names for the comments will be renamed using a prefix.
 
+    Time window filters are applied as part of the join condition, after first dropping comments created outside the window around any submission, so out of window comments are never shuffled or paired.
+    To handle megathreads, set skew_threshold. Comments of submissions with more than skew_threshold comments are randomly spread over num_salts join keys and those submissions are duplicated for each key, so no single partition gets the whole thread.
+
     :param submissions_df: Spark DataFrame containing submissions
     :param comments_df: Spark DataFrame containing comments
     :param submission_id_col: str, the id column in submissions to use for the join
@@ -385,27 +508,84 @@ def join_submissions_and_comments(
     :param comments_duplicate_col_prefix: str, prefix used to rename comments_df columns that overlap with submissions_df columns
     :param timestamp_col: str, the name of the input column storing timestamps, assumed to be the same for both submissions and comment
     :param time_delta_col: str, the output column where timedelta between submission and comment will be stored
+    :param max_time_delta: int or None, maximum time in seconds (exclusive) allowed between submission creation and creation of its comments
+    :param min_time_delta: int or None, minimum time in seconds (exclusive) allowed between submission creation and creation of its comments
+    :param skew_threshold: int or None, submissions with more comments than this are salted. None to turn off salting
+    :param num_salts: int, number of join keys each salted submission is spread over
+    :param log_partition_stats: boolean, set to True to log the row counts of partitions after the join, which requires an extra pass over the data
     """
     logger.debug("Renaming comments columns prior to join")
     renamed_comments = rename_columns(comments_df, prefix=comments_duplicate_col_prefix)
     logger.debug("Comments dataframe columns: %s", renamed_comments.schema.names)
     comments_timestamp_col = f"{COMMENTS}_{timestamp_col}"
+    has_timestamps = (
+        timestamp_col in submissions_df.columns
+        and comments_timestamp_col in renamed_comments.columns
+    )
+
+    join_condition = (
+        submissions_df[submission_id_col] == renamed_comments[comments_link_col]
+    )
+    if has_timestamps and (max_time_delta or min_time_delta):
+        submission_time = submissions_df[timestamp_col].cast("long")
+        comment_time = renamed_comments[comments_timestamp_col].cast("long")
+        time_bounds = submissions_df.agg(
+            fn.min(submission_time).alias("min"), fn.max(submission_time).alias("max")
+        ).collect()[0]
+        if max_time_delta and time_bounds["max"] is not None:
+            logger.debug(
+                "Removing comments created %s seconds after the last submission",
+                max_time_delta,
+            )
+            renamed_comments = renamed_comments.where(
+                comment_time < time_bounds["max"] + max_time_delta
+            )
+            join_condition &= comment_time - submission_time < max_time_delta
+        if min_time_delta and time_bounds["min"] is not None:
+            logger.debug(
+                "Removing comments created less than %s seconds after the first submission",
+                min_time_delta,
+            )
+            renamed_comments = renamed_comments.where(
+                comment_time > time_bounds["min"] + min_time_delta
+            )
+            join_condition &= comment_time - submission_time > min_time_delta
+
+    if skew_threshold is not None:
+        hot_keys = get_hot_keys(renamed_comments, comments_link_col, skew_threshold)
+        salted_submissions = submissions_df.withColumn(
+            SALT_COL,
+            fn.explode(
+                fn.when(
+                    submissions_df[submission_id_col].isin(hot_keys),
+                    fn.sequence(fn.lit(0), fn.lit(num_salts - 1)),
+                ).otherwise(fn.array(fn.lit(0)))
+            ),
+        )
+        salted_comments = renamed_comments.withColumn(
+            SALT_COL,
+            fn.when(
+                renamed_comments[comments_link_col].isin(hot_keys),
+                (fn.rand() * num_salts).cast("int"),
+            ).otherwise(fn.lit(0)),
+        )
+        join_condition &= salted_submissions[SALT_COL] == salted_comments[SALT_COL]
+        submissions_df = salted_submissions
+        renamed_comments = salted_comments
 
     logger.debug(
         "Joining submissons and comments where %s = %s",
         submission_id_col,
         comments_link_col,
     )
-    result_df = submissions_df.join(
-        renamed_comments,
-        submissions_df[submission_id_col] == renamed_comments[comments_link_col],
-    )
+    result_df = submissions_df.join(renamed_comments, join_condition)
+    if skew_threshold is not None:
+        result_df = result_df.drop(submissions_df[SALT_COL]).drop(
+            renamed_comments[SALT_COL]
+        )
 
     # Compute time delta in sections between comment and submissions if timestamp_col is present
-    if (
-        timestamp_col in result_df.columns
-        and comments_timestamp_col in result_df.columns
-    ):
+    if has_timestamps:
         logger.debug(
             "Computing time delta between %s and %s",
             time_delta_col,
@@ -416,6 +596,9 @@ def join_submissions_and_comments(
             result_df[comments_timestamp_col] - result_df[timestamp_col],
         )
 
+    if log_partition_stats:
+        log_partition_size_stats(result_df, "Joined submissions and comments")
+
     return result_df
 
 
@@ -427,6 +610,8 @@ def community2vec(
     min_sentence_length=2,
     exclude_top_perc=DEFAULT_USER_EXCLUDE,
     quiet=False,
+    subreddit_counts=False,
+    max_repeats=None,
 ):
     """Returns data for training community2vec using skipgrams (users as 'documents/context', subreddits as 'words') as Spark dataframes. Deleted comments are counted when determining the top most frequent values.
     Returns 2 dataframes: counts of subreddits (vocabulary for community2vec), subreddit comments/submissions aggregated into a list for each author
@@ -438,6 +623,8 @@ def community2vec(
     :param min_sentence_length: int, minimum size of context for c2v, min sentence length
     :param exclude_top_perc: float, the percentage of top most active users by number of comments to exclude from the final dataset
     :param quiet: Boolean, true to skip statsitics and plots
+    :param subreddit_counts: boolean, set to True to write each subreddit once per user with the user's comment count, e.g. 'nba:12'
+    :param max_repeats: int or None, the maximum number of times a subreddit is repeated for a user. Ignored when subreddit_counts is True
     """
     logger.debug("Building community2vec training data for Reddit %s data", reddit_type)
     if reddit_type in [COMMENTS, SUBMISSIONS]:
@@ -456,8 +643,19 @@ def community2vec(
             filtered_df,
             min_sentence_length=min_sentence_length,
             exclude_top_perc=exclude_top_perc,
+            subreddit_counts=subreddit_counts,
+            max_repeats=max_repeats,
         )
         if not quiet:
+            num_comments, num_tokens = get_corpus_size(context_word_df)
+            logger.info(
+                "User contexts have %s tokens for %s comments, a reduction of %.2f%%",
+                num_tokens,
+                num_comments,
+                100.0 * (1 - num_tokens / num_comments) if num_comments else 0.0,
+            )
+            print("Comments in user contexts:", num_comments)
+            print("Tokens in user contexts:", num_tokens)
             max_sentence_length = collect_max_context_length(context_word_df)
             logger.info("Maximium sentence length in data: %s", max_sentence_length)
             print("Maximum sentence length in data:", max_sentence_length)
@@ -477,6 +675,8 @@ def bag_of_words(
     type_for_top_n=COMMENTS,
     exclude_top_perc=DEFAULT_USER_EXCLUDE,
     quiet=False,
+    skew_threshold=None,
+    num_salts=DEFAULT_NUM_SALTS,
 ):
     """Returns the data for training bag of words models in a Spark DataFrame.
 
@@ -489,6 +689,8 @@ def bag_of_words(
     :param type_for_top_n: 'comments' or 'submissions'
     :param exclude_top_perc: float, the percentage of top most active users by number of comments to exclude from the final dataset. Note that only comments are filtered, not submissions
     :param quiet: boolean, set to True for verbose & computationally expensive dataframe comparisons
+    :param skew_threshold: int or None, submissions with more comments than this are salted to spread them over partitions during the join. None to turn off salting
+    :param num_salts: int, number of join keys each salted submission is spread over
     """
     logger.info(
         "Joining Reddit comments and submissions data into submission thread-level documents"
@@ -529,13 +731,16 @@ def bag_of_words(
         print_comparison_stats(submissions_df, filtered_submissions, top_n_df)
 
     filtered_submissions = prefix_id_column(filtered_submissions)
-    joined_df = join_submissions_and_comments(filtered_submissions, filtered_comments)
-
     # Keep only comments which come within a time window of the original submission
-    if max_time_delta:
-        joined_df = filter_by_time_between_submission_and_comment(
-            joined_df, max_time_delta=max_time_delta, min_time_delta=min_time_delta
-        )
+    joined_df = join_submissions_and_comments(
+        filtered_submissions,
+        filtered_comments,
+        max_time_delta=max_time_delta,
+        min_time_delta=min_time_delta,
+        skew_threshold=skew_threshold,
+        num_salts=num_salts,
+        log_partition_stats=not quiet,
+    )
     logger.debug("Finished joining submissions and comments data")
     return joined_df
 
@@ -594,6 +799,17 @@ c2v_parser.add_argument(
     default=DEFAULT_USER_EXCLUDE,
     help=f"The percentage of top most active users to exclude by number of comments over the time period. Defaults to {DEFAULT_USER_EXCLUDE}",
 )
+c2v_compression_group = c2v_parser.add_mutually_exclusive_group()
+c2v_compression_group.add_argument(
+    "--subreddit_counts",
+    action="store_true",
+    help=f"Use to write each subreddit once per user with the number of times they commented in it, separated by '{SUBREDDIT_COUNT_SEPARATOR}', rather than repeating the subreddit for every comment.",
+)
+c2v_compression_group.add_argument(
+    "--max_repeats",
+    type=int,
+    help="Use to repeat a subreddit at most this many times for a user, no matter how many times they commented in it.",
+)
 
 topic_modeling_parser = subparsers.add_parser(
     "bow",
@@ -644,6 +860,17 @@ topic_modeling_parser.add_argument(
     default=DEFAULT_USER_EXCLUDE,
     help="The percentage of top most active users to exclude by number of comments over the time period",
 )
+topic_modeling_parser.add_argument(
+    "--skew_threshold",
+    type=int,
+    help=f"Optionally salt the join keys of submissions with more than this number of comments, spreading megathreads over several partitions. A reasonable value is {DEFAULT_SKEW_THRESHOLD}. If this is not used, no salting is done.",
+)
+topic_modeling_parser.add_argument(
+    "--num_salts",
+    type=int,
+    default=DEFAULT_NUM_SALTS,
+    help=f"Number of join keys each salted submission is spread over. Defaults to {DEFAULT_NUM_SALTS}",
+)
 
 
 if __name__ == "__main__":
@@ -662,6 +889,8 @@ if __name__ == "__main__":
                 top_n=args.top_n,
                 exclude_top_perc=args.exclude_top_user_perc,
                 quiet=args.quiet,
+                subreddit_counts=args.subreddit_counts,
+                max_repeats=args.max_repeats,
             )
 
             logger.info("Writing subreddit counts to %s", args.subreddit_counts_csv)
@@ -687,6 +916,8 @@ if __name__ == "__main__":
                 type_for_top_n=args.type_for_top_n,
                 exclude_top_perc=args.exclude_top_user_perc,
                 quiet=args.quiet,
+                skew_threshold=args.skew_threshold,
+                num_salts=args.num_salts,
             )
             logger.info("Writing joined thread documents to %s", args.output)
             bag_of_words_df.write.parquet(args.output)
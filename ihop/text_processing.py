@@ -3,20 +3,31 @@
 .. TODO: set submission timeframe start and end dates
 """
 import argparse
+import collections
+import itertools
 import json
 import logging
 import os
+import zipfile
 
+import joblib
+import numpy as np
+import pyspark
 import pyspark.sql.functions as fn
 from pyspark.ml import Pipeline, PipelineModel
 from pyspark.ml.feature import (
     CountVectorizer,
     CountVectorizerModel,
+    HashingTF,
     RegexTokenizer,
     IDF,
     StopWordsRemover,
 )
+from pyspark.sql.types import IntegerType
+from pyspark.sql.window import Window
 import pytimeparse
+import regex
+import scipy.sparse
 
 
 import ihop.import_data
@@ -29,6 +40,15 @@ TOKENIZED_COL_NAME = "tokenized"
 FILTERED_TOKENS_COL_NAME = "tokensNoStopWords"
 VECTORIZED_CORPUS_FILENAME = "vectorized_corpus.parquet"
 
+# Java-style regex, also understood by the regex module used by the local pipeline
+DEFAULT_TOKENIZATION_PATTERN = r"([\p{L}\p{N}#@][\p{L}\p{N}\p{Pd}\p{Pc}\p{S}\p{P}]*[\p{L}\p{N}])|[\p{L}\p{N}]|[^\p{P}\s]"
+
+# Separates the terms that share a feature bucket when using the hashing trick
+HASHED_TERMS_SEPARATOR = "|"
+
+# Where Spark's StopWordsRemover default stop word lists live in the spark-mllib jar
+SPARK_STOP_WORDS_RESOURCE = "org/apache/spark/ml/feature/stopwords/{}.txt"
+
 
 def print_document_length_statistics(
     dataframe, tokenized_col=TOKENIZED_COL_NAME, doc_length_col="doc_length"
@@ -68,6 +88,10 @@ def prep_spark_corpus(
     vocab_size=262144,
     output_dir=None,
     corpus_output_name=VECTORIZED_CORPUS_FILENAME,
+    num_features=None,
+    term_frequency_dir=None,
+    month=None,
+    vocabulary_months=None,
 ):
     """Transforms a text data frame using the specified text processing pipeline options.
     Returns the transformed dataframe as a SparkCorpus and the SparkTextPreProcessingPipeline
@@ -79,13 +103,41 @@ def prep_spark_corpus(
     :param vocab_size: int, maximum vocab size,
     :param output_dir: None or str, directory to optionally save the corpus and pipeline. If this is None, they won't be saved
     :param corpus_output_name: str, filename of corpus used when output_dir is not None
+    :param num_features: None or int, set to use feature hashing with this many buckets instead of fitting a vocabulary
+    :param term_frequency_dir: None or str, directory of a SparkTermFrequencyTable. When set, the vocabulary is selected from the table instead of fitting a CountVectorizer
+    :param month: None or str, when set with term_frequency_dir the input corpus is added to the table under this month name
+    :param vocabulary_months: None or list of str, months in the table to select the vocabulary from. Defaults to only month, or all months in the table when month isn't set
     """
     logger.info("Prepping corpus for LDA with parameters: %s", locals())
     time_filtered_corpus = SparkCorpus.init_from_joined_dataframe(
         input_df, max_time_delta=max_time_delta, min_time_delta=min_time_delta
     )
+    vocabulary = None
+    if term_frequency_dir is not None:
+        term_frequency_table = SparkTermFrequencyTable(term_frequency_dir)
+        if month is not None:
+            tokenizing_pipeline = SparkTextPreprocessingPipeline()
+            term_frequency_table.add_month(
+                month,
+                tokenizing_pipeline.tokenize(time_filtered_corpus.document_dataframe),
+                tokenizing_pipeline.vectorizer_input_col,
+            )
+            if vocabulary_months is None:
+                vocabulary_months = [month]
+        vocabulary = term_frequency_table.select_vocabulary(
+            pyspark.sql.SparkSession.builder.getOrCreate(),
+            vocabulary_months,
+            min_doc_frequency,
+            max_doc_frequency,
+            vocab_size,
+        )
+
     preprocessing_pipeline = SparkTextPreprocessingPipeline(
-        minDF=min_doc_frequency, maxDF=max_doc_frequency, vocabSize=vocab_size
+        minDF=min_doc_frequency,
+        maxDF=max_doc_frequency,
+        vocabSize=vocab_size,
+        numFeatures=num_features,
+        vocabulary=vocabulary,
     )
     vectorized_corpus = SparkCorpus(
         preprocessing_pipeline.fit_transform(time_filtered_corpus.document_dataframe)
@@ -205,17 +257,25 @@ class SparkCorpus:
             raw_dataframe, max_time_delta, min_time_delta, time_delta_col
         )
 
-        grouped_submissions = (
-            filtered_df.orderBy(time_delta_col)
-            .groupBy(submission_id_col)
-            .agg(
-                fn.first(category_col).alias(category_col),
-                fn.first(submission_text_col).alias(submission_text_col),
-                fn.first(submission_title_col).alias(submission_title_col),
-                fn.concat_ws(" ", fn.collect_list(comments_text_col)).alias(
-                    DEFAULT_DOC_COL_NAME
+        # Comments are ordered by time within each submission, which avoids a global sort of all comments
+        grouped_submissions = filtered_df.groupBy(submission_id_col).agg(
+            fn.first(category_col).alias(category_col),
+            fn.first(submission_text_col).alias(submission_text_col),
+            fn.first(submission_title_col).alias(submission_title_col),
+            fn.concat_ws(
+                " ",
+                fn.transform(
+                    fn.array_sort(
+                        fn.collect_list(
+                            fn.struct(
+                                fn.col(time_delta_col).alias("time_delta"),
+                                fn.col(comments_text_col).alias("text"),
+                            )
+                        )
+                    ),
+                    lambda c: c["text"],
                 ),
-            )
+            ).alias(DEFAULT_DOC_COL_NAME),
         )
 
         document_dataframe = grouped_submissions.select(
@@ -298,6 +358,15 @@ class SparkCorpusIterator:
                 yield result
 
 
+class HashedVocabulary(dict):
+    """Index for hashed feature buckets, int -> str, where each bucket is named by its most frequent terms.
+    Buckets with no known terms are named by their index, so looking up terms for any feature is safe.
+    """
+
+    def __missing__(self, key):
+        return f"bucket_{key}"
+
+
 class SparkTextPreprocessingPipeline:
     """A text pre-processing pipeline that prepares text data for topic modeling
     """
@@ -305,6 +374,7 @@ class SparkTextPreprocessingPipeline:
     PIPELINE_OUTPUT_NAME = "SparkTextProcessingPipeline"
     MODEL_OUTPUT_NAME = "SparkTextProcessingModel"
     PARAMS_JSON = "text_processing_params.json"
+    HASHED_VOCABULARY_JSON = "hashed_vocabulary.json"
 
     def __init__(
         self,
@@ -312,7 +382,7 @@ class SparkTextPreprocessingPipeline:
         output_col=VECTORIZED_COL_NAME,
         tokens_col=TOKENIZED_COL_NAME,
         filtered_tokens_col=FILTERED_TOKENS_COL_NAME,
-        tokenization_pattern="([\p{L}\p{N}#@][\p{L}\p{N}\p{Pd}\p{Pc}\p{S}\p{P}]*[\p{L}\p{N}])|[\p{L}\p{N}]|[^\p{P}\s]",
+        tokenization_pattern=DEFAULT_TOKENIZATION_PATTERN,
         match_gaps=False,
         toLowercase=True,
         stopLanguage="english",
@@ -323,6 +393,8 @@ class SparkTextPreprocessingPipeline:
         vocabSize=262144,
         binary=False,
         useIDF=False,
+        numFeatures=None,
+        vocabulary=None,
     ):
         """Initializes a text preprocessing pipeline with Spark.
         Note: The tokenization pattern throws away punctuation pretty aggresively, is probably throwing away emojis
@@ -341,8 +413,15 @@ class SparkTextPreprocessingPipeline:
         :param vocabSize: int, max size of the vocabulary, passed to CountVectorizer
         :param binary: boolean, Set to True for binary term document flags, rather than term frequency counts
         :param useIDF: boolean, set to True to use inverse document frequency smoothing of counts.
+        :param numFeatures: None or int, set to use the hashing trick with this many feature buckets instead of a CountVectorizer. This skips fitting a vocabulary, so maxDF, minDF, minTF and vocabSize are ignored.
+        :param vocabulary: None or list of str, set to use a fixed vocabulary, such as one selected from a SparkTermFrequencyTable, instead of fitting the CountVectorizer. This skips fitting a vocabulary, so maxDF, minDF and vocabSize are ignored.
         """
-        logger.info("Parameters for SparkTextPreprocessingPipeline: %s", locals())
+        logger.info(
+            "Parameters for SparkTextPreprocessingPipeline: %s",
+            {k: v for k, v in locals().items() if k != "vocabulary"},
+        )
+        if numFeatures is not None and vocabulary is not None:
+            raise ValueError("Only one of numFeatures or vocabulary can be set")
         tokenizer = (
             RegexTokenizer(
                 inputCol=input_col, outputCol=tokens_col, toLowercase=toLowercase
@@ -378,21 +457,37 @@ class SparkTextPreprocessingPipeline:
             )
             pipeline_stages.append(stop_remover)
 
-        count_vectorizer = CountVectorizer(
-            inputCol=count_vec_in_col,
-            outputCol=output_col,
-            maxDF=maxDF,
-            minDF=minDF,
-            minTF=minTF,
-            vocabSize=vocabSize,
-            binary=binary,
-        )
+        if vocabulary is not None:
+            vectorizer = CountVectorizerModel.from_vocabulary(
+                vocabulary,
+                inputCol=count_vec_in_col,
+                outputCol=output_col,
+                minTF=minTF,
+                binary=binary,
+            )
+        elif numFeatures is None:
+            vectorizer = CountVectorizer(
+                inputCol=count_vec_in_col,
+                outputCol=output_col,
+                maxDF=maxDF,
+                minDF=minDF,
+                minTF=minTF,
+                vocabSize=vocabSize,
+                binary=binary,
+            )
+        else:
+            vectorizer = HashingTF(
+                inputCol=count_vec_in_col,
+                outputCol=output_col,
+                numFeatures=numFeatures,
+                binary=binary,
+            )
 
-        pipeline_stages.append(count_vectorizer)
+        pipeline_stages.append(vectorizer)
 
         if useIDF:
             count_vectorized_col = "count_vectorized"
-            count_vectorizer.setOutputCol(count_vectorized_col)
+            vectorizer.setOutputCol(count_vectorized_col)
             idf_stage = IDF(inputCol=count_vectorized_col, outputCol=output_col)
             pipeline_stages.append(idf_stage)
             logger.info(
@@ -401,31 +496,147 @@ class SparkTextPreprocessingPipeline:
                 idf_stage.getOutputCol(),
             )
 
-        logger.info(
-            "Using CountVectorizer with following parameters: {inputCol: %s, outputCol: %s, minDF: %s, maxDF: %s, minTF: %s, vocabSize: %s}",
-            count_vectorizer.getInputCol(),
-            count_vectorizer.getOutputCol(),
-            count_vectorizer.getMinDF(),
-            count_vectorizer.getMaxDF(),
-            count_vectorizer.getMinTF(),
-            count_vectorizer.getVocabSize(),
-        )
+        if vocabulary is not None:
+            logger.info(
+                "Using fixed vocabulary CountVectorizerModel with following parameters: {inputCol: %s, outputCol: %s, minTF: %s, vocabSize: %s}. Parameters maxDF, minDF and vocabSize are ignored.",
+                vectorizer.getInputCol(),
+                vectorizer.getOutputCol(),
+                vectorizer.getMinTF(),
+                len(vocabulary),
+            )
+        elif numFeatures is None:
+            logger.info(
+                "Using CountVectorizer with following parameters: {inputCol: %s, outputCol: %s, minDF: %s, maxDF: %s, minTF: %s, vocabSize: %s}",
+                vectorizer.getInputCol(),
+                vectorizer.getOutputCol(),
+                vectorizer.getMinDF(),
+                vectorizer.getMaxDF(),
+                vectorizer.getMinTF(),
+                vectorizer.getVocabSize(),
+            )
+        else:
+            logger.info(
+                "Using HashingTF with following parameters: {inputCol: %s, outputCol: %s, numFeatures: %s}. Parameters maxDF, minDF, minTF and vocabSize are ignored.",
+                vectorizer.getInputCol(),
+                vectorizer.getOutputCol(),
+                vectorizer.getNumFeatures(),
+            )
         self.pipeline = Pipeline(stages=pipeline_stages)
 
         logger.debug("Text transformation pipeline created")
         self.model = None
+        self.bucket_terms = None
+
+    @property
+    def vectorizer_input_col(self):
+        """The name of the tokens column that is input to the vectorizer stage"""
+        return self.pipeline.getStages()[self.vectorizer_stage_index].getInputCol()
+
+    @property
+    def vectorizer_stage_index(self):
+        """Index of the CountVectorizer or HashingTF stage in the pipeline"""
+        for i, stage in enumerate(self.pipeline.getStages()):
+            if isinstance(stage, (CountVectorizer, CountVectorizerModel, HashingTF)):
+                return i
+        raise ValueError("Pipeline has no vectorizer stage")
+
+    def tokenize(self, docs_dataframe):
+        """Returns the docs_dataframe with columns added by the tokenization and stop word removal stages only.
+        These stages don't need fitting, so this is cheap to call before the pipeline is fit.
+
+        :param docs_dataframe: Spark DataFrame
+        """
+        tokenizing_stages = self.pipeline.getStages()[: self.vectorizer_stage_index]
+        return PipelineModel(stages=tokenizing_stages).transform(docs_dataframe)
+
+    @property
+    def hashing_stage(self):
+        """The HashingTF stage of the pipeline, or None if a CountVectorizer is used"""
+        hashing_stages = [
+            s for s in self.pipeline.getStages() if isinstance(s, HashingTF)
+        ]
+        if len(hashing_stages) == 0:
+            return None
+        return hashing_stages[0]
+
+    def fit_transform(
+        self, docs_dataframe, sample_fraction=0.1, terms_per_bucket=3, seed=None
+    ):
+        """Fit the pipeline, then return results of the running transform on the docs_dataframe.
+        When using feature hashing, a sample of the documents is also used to find the most frequent terms in each bucket.
 
-    def fit_transform(self, docs_dataframe):
-        """Fit the pipeline, then return results of the running transform on the docs_dataframe
         :param docs_dataframe: Spark DataFrame
+        :param sample_fraction: float, fraction of documents sampled for naming feature buckets, only used with feature hashing
+        :param terms_per_bucket: int, how many of the most frequent terms to keep for each bucket, only used with feature hashing
+        :param seed: int or None, random seed for sampling documents, only used with feature hashing
         """
         logger.info("Fitting SparkTextPreprocessingPipeline")
         self.model = self.pipeline.fit(docs_dataframe)
-        return self.model.transform(docs_dataframe)
+        transformed_df = self.model.transform(docs_dataframe)
+        if self.hashing_stage is not None:
+            self.bucket_terms = self.get_hashed_bucket_terms(
+                transformed_df, sample_fraction, terms_per_bucket, seed
+            )
+        return transformed_df
+
+    def get_hashed_bucket_terms(
+        self, transformed_df, sample_fraction=0.1, terms_per_bucket=3, seed=None
+    ):
+        """Returns a dictionary mapping each feature bucket to its most frequent terms in a sample of the documents, {int -> list of str}.
+        Buckets that no sampled terms hash to are left out.
+
+        :param transformed_df: Spark DataFrame, output of the pipeline that still has the tokens column input to the HashingTF stage
+        :param sample_fraction: float, fraction of documents to sample
+        :param terms_per_bucket: int, how many of the most frequent terms to keep for each bucket
+        :param seed: int or None, random seed for sampling documents
+        """
+        hashing_stage = self.hashing_stage
+        logger.info(
+            "Finding the top %s terms in each hashed bucket from a %s sample of documents",
+            terms_per_bucket,
+            sample_fraction,
+        )
+        term_counts = (
+            transformed_df.select(hashing_stage.getInputCol())
+            .sample(fraction=sample_fraction, seed=seed)
+            .select(fn.explode(hashing_stage.getInputCol()).alias("term"))
+            .groupBy("term")
+            .count()
+            .withColumn("term_array", fn.array("term"))
+        )
+        term_hasher = HashingTF(
+            inputCol="term_array",
+            outputCol="term_vector",
+            numFeatures=hashing_stage.getNumFeatures(),
+        )
+        get_bucket_udf = fn.udf(lambda v: int(v.indices[0]), IntegerType())
+        bucket_window = Window.partitionBy("bucket").orderBy(
+            fn.desc("count"), fn.asc("term")
+        )
+        top_bucket_terms = (
+            term_hasher.transform(term_counts)
+            .withColumn("bucket", get_bucket_udf("term_vector"))
+            .withColumn("rank", fn.row_number().over(bucket_window))
+            .where(fn.col("rank") <= terms_per_bucket)
+            .select("bucket", "rank", "term")
+            .collect()
+        )
+        bucket_terms = {}
+        for row in sorted(top_bucket_terms, key=lambda r: (r["bucket"], r["rank"])):
+            bucket_terms.setdefault(row["bucket"], []).append(row["term"])
+        logger.info("Found terms for %s hashed buckets", len(bucket_terms))
+        return bucket_terms
 
     def get_id_to_word(self):
         vocab = {}
-        if self.model is not None:
+        if self.bucket_terms is not None:
+            vocab = HashedVocabulary(
+                {
+                    b: HASHED_TERMS_SEPARATOR.join(terms)
+                    for b, terms in self.bucket_terms.items()
+                }
+            )
+        elif self.model is not None:
             vectorizers = [
                 s for s in self.model.stages if isinstance(s, CountVectorizerModel)
             ]
@@ -433,6 +644,8 @@ class SparkTextPreprocessingPipeline:
         return vocab
 
     def get_word_to_id(self):
+        if self.bucket_terms is not None:
+            return {t: b for b, terms in self.bucket_terms.items() for t in terms}
         return {v: k for k, v in self.get_id_to_word().items()}
 
     def get_param_maps(self):
@@ -459,6 +672,9 @@ class SparkTextPreprocessingPipeline:
         self.pipeline.save(os.path.join(save_dir, self.PIPELINE_OUTPUT_NAME))
         if self.model is not None:
             self.model.save(os.path.join(save_dir, self.MODEL_OUTPUT_NAME))
+        if self.bucket_terms is not None:
+            with open(os.path.join(save_dir, self.HASHED_VOCABULARY_JSON), "w") as f:
+                json.dump(self.bucket_terms, f)
         logger.info("SparkTextPreprocessingPipeline saved")
         # Human readable params for organization purposes
         with open(os.path.join(save_dir, self.PARAMS_JSON), "w") as f:
@@ -481,10 +697,655 @@ class SparkTextPreprocessingPipeline:
         logger.debug("PipelineModel file found %s, loading PipelineModel", model_file)
         result.model = PipelineModel.load(model_file)
 
+        hashed_vocab_file = os.path.join(load_dir, cls.HASHED_VOCABULARY_JSON)
+        if os.path.exists(hashed_vocab_file):
+            logger.debug("Hashed vocabulary file found %s, loading", hashed_vocab_file)
+            with open(hashed_vocab_file) as f:
+                result.bucket_terms = {int(b): t for b, t in json.load(f).items()}
+
         logger.info("SparkTextPreprocessingPipeline sucessfully loaded")
         return result
 
 
+class SparkTermFrequencyTable:
+    """A persisted table of per month term statistics, storing the document frequency and total term frequency of each term for each month along with the number of documents in each month.
+    New months are added without touching the months already in the table and a vocabulary can be selected for any window of months without rescanning the corpus.
+    """
+
+    TERM_FREQUENCIES_PARQUET = "term_frequencies.parquet"
+    DOCUMENT_COUNTS_JSON = "document_counts.json"
+    MONTH_COL = "month"
+    TERM_COL = "term"
+    DOC_FREQ_COL = "df"
+    TERM_FREQ_COL = "tf"
+
+    def __init__(self, table_dir):
+        """Opens the table stored in table_dir, which is created when the first month is added
+
+        :param table_dir: str or path, directory storing the table
+        """
+        self.table_dir = table_dir
+        self.document_counts = {}
+        counts_file = os.path.join(table_dir, self.DOCUMENT_COUNTS_JSON)
+        if os.path.exists(counts_file):
+            with open(counts_file) as f:
+                self.document_counts = json.load(f)
+        logger.debug(
+            "SparkTermFrequencyTable in %s has months: %s", table_dir, self.months
+        )
+
+    @property
+    def months(self):
+        """Sorted list of months in the table"""
+        return sorted(self.document_counts.keys())
+
+    @property
+    def term_frequencies_path(self):
+        return os.path.join(self.table_dir, self.TERM_FREQUENCIES_PARQUET)
+
+    @classmethod
+    def count_terms(cls, tokens_dataframe, tokens_col=FILTERED_TOKENS_COL_NAME):
+        """Returns a Spark DataFrame with the document frequency and total frequency of each term in tokens_col
+
+        :param tokens_dataframe: Spark DataFrame, one document per row
+        :param tokens_col: str, array of strings column with the tokens of each document
+        """
+        doc_id_col = "doc_id"
+        return (
+            tokens_dataframe.select(
+                fn.monotonically_increasing_id().alias(doc_id_col), tokens_col
+            )
+            .select(doc_id_col, fn.explode(tokens_col).alias(cls.TERM_COL))
+            .groupBy(doc_id_col, cls.TERM_COL)
+            .count()
+            .groupBy(cls.TERM_COL)
+            .agg(
+                fn.count("*").alias(cls.DOC_FREQ_COL),
+                fn.sum("count").alias(cls.TERM_FREQ_COL),
+            )
+        )
+
+    def add_month(self, month, tokens_dataframe, tokens_col=FILTERED_TOKENS_COL_NAME):
+        """Counts terms in one month of documents and stores them in the table.
+        Only that month's partition is written, replacing it if the month is already in the table.
+
+        :param month: str, name of the month, e.g. '2021-05'
+        :param tokens_dataframe: Spark DataFrame, one document per row
+        :param tokens_col: str, array of strings column with the tokens of each document
+        """
+        logger.info("Adding month %s to SparkTermFrequencyTable", month)
+        num_docs = tokens_dataframe.count()
+        month_frequencies = self.count_terms(tokens_dataframe, tokens_col)
+        month_frequencies.write.parquet(
+            os.path.join(self.term_frequencies_path, f"{self.MONTH_COL}={month}"),
+            mode="overwrite",
+        )
+        self.document_counts[month] = num_docs
+        with open(os.path.join(self.table_dir, self.DOCUMENT_COUNTS_JSON), "w") as f:
+            json.dump(self.document_counts, f)
+        logger.info("Month %s added with %s documents", month, num_docs)
+
+    def get_term_frequencies(self, spark, months=None):
+        """Returns a Spark DataFrame with the summed document and term frequencies of each term over the months.
+        Only the partitions for the given months are read.
+
+        :param spark: SparkSession
+        :param months: list of str, months to include, defaults to all months in the table
+        """
+        months = self.months if months is None else months
+        missing_months = set(months) - set(self.document_counts)
+        if len(months) == 0 or len(missing_months) > 0:
+            raise ValueError(
+                f"Months must be non-empty and in the table, missing: {sorted(missing_months)}"
+            )
+        month_paths = [
+            os.path.join(self.term_frequencies_path, f"{self.MONTH_COL}={m}")
+            for m in months
+        ]
+        return (
+            spark.read.parquet(*month_paths)
+            .groupBy(self.TERM_COL)
+            .agg(
+                fn.sum(self.DOC_FREQ_COL).alias(self.DOC_FREQ_COL),
+                fn.sum(self.TERM_FREQ_COL).alias(self.TERM_FREQ_COL),
+            )
+        )
+
+    def get_num_docs(self, months=None):
+        """Returns the total number of documents in the months
+
+        :param months: list of str, months to include, defaults to all months in the table
+        """
+        months = self.months if months is None else months
+        return sum(self.document_counts[m] for m in months)
+
+    def select_vocabulary(
+        self, spark, months=None, minDF=0.05, maxDF=0.95, vocabSize=262144
+    ):
+        """Returns the vocabulary for a window of months as a list of terms, selected the same way as Spark's CountVectorizer.
+        Terms are ordered by decreasing frequency, with ties broken alphabetically.
+
+        :param spark: SparkSession
+        :param months: list of str, months to include, defaults to all months in the table
+        :param minDF: int or float, minimum document frequency, a fraction of documents in the window when less than 1
+        :param maxDF: int or float, maximum document frequency, a fraction of documents in the window when less than 1
+        :param vocabSize: int, maximum size of the vocabulary
+        """
+        term_frequencies = self.get_term_frequencies(spark, months)
+        num_docs = self.get_num_docs(months)
+        min_df = minDF if minDF >= 1.0 else minDF * num_docs
+        max_df = maxDF if maxDF >= 1.0 else maxDF * num_docs
+        if max_df < min_df:
+            raise ValueError(
+                f"maxDF ({maxDF}) must be greater than or equal to minDF ({minDF})"
+            )
+        vocabulary = [
+            row[self.TERM_COL]
+            for row in term_frequencies.where(
+                (fn.col(self.DOC_FREQ_COL) >= min_df)
+                & (fn.col(self.DOC_FREQ_COL) <= max_df)
+            )
+            .orderBy(fn.desc(self.TERM_FREQ_COL), fn.asc(self.TERM_COL))
+            .limit(vocabSize)
+            .select(self.TERM_COL)
+            .collect()
+        ]
+        logger.info(
+            "Selected vocabulary of size %s from %s documents", len(vocabulary), num_docs
+        )
+        return vocabulary
+
+
+def load_spark_stop_words(language="english"):
+    """Returns the default stop words for a language used by Spark's StopWordsRemover.
+    The list is read directly from the spark-mllib jar bundled with pyspark, so no JVM is needed.
+
+    :param language: str, a language supported by StopWordsRemover.loadDefaultStopWords
+    """
+    jars_dir = os.path.join(os.path.dirname(pyspark.__file__), "jars")
+    mllib_jars = sorted(
+        j for j in os.listdir(jars_dir) if j.startswith("spark-mllib_")
+    )
+    if len(mllib_jars) == 0:
+        raise FileNotFoundError(f"No spark-mllib jar found in {jars_dir}")
+
+    with zipfile.ZipFile(os.path.join(jars_dir, mllib_jars[0])) as jar:
+        stop_words_bytes = jar.read(SPARK_STOP_WORDS_RESOURCE.format(language))
+    return stop_words_bytes.decode("utf-8").splitlines()
+
+
+def tokenize_documents(
+    documents,
+    pattern=DEFAULT_TOKENIZATION_PATTERN,
+    match_gaps=False,
+    to_lowercase=True,
+    min_token_length=1,
+    stop_words=None,
+    stop_case_sensitive=False,
+):
+    """Returns a list of token lists for the documents, tokenizing and removing stop words the same way as Spark's RegexTokenizer and StopWordsRemover.
+
+    :param documents: iterable of str
+    :param pattern: str, regex pattern for tokens (or gaps between them), supports unicode classes like \\p{L}
+    :param match_gaps: boolean, True if the regex matches gaps between words, False to match tokens
+    :param to_lowercase: boolean, True to convert characters to lowercase before tokenizing
+    :param min_token_length: int, tokens shorter than this are dropped
+    :param stop_words: list of str or None, stop words to remove, None to skip stopping
+    :param stop_case_sensitive: boolean, True to make stop word removal case sensitive
+    """
+    compiled_pattern = regex.compile(pattern)
+    if stop_words is None:
+        stop_set = None
+    elif stop_case_sensitive:
+        stop_set = set(stop_words)
+    else:
+        stop_set = {w.lower() for w in stop_words}
+
+    results = []
+    for doc in documents:
+        text = "" if doc is None else doc
+        if to_lowercase:
+            text = text.lower()
+
+        if match_gaps:
+            tokens = []
+            start = 0
+            for match in compiled_pattern.finditer(text):
+                tokens.append(text[start : match.start()])
+                start = match.end()
+            tokens.append(text[start:])
+        else:
+            tokens = [match.group(0) for match in compiled_pattern.finditer(text)]
+
+        tokens = [t for t in tokens if len(t) >= min_token_length]
+        if stop_set is not None:
+            if stop_case_sensitive:
+                tokens = [t for t in tokens if t not in stop_set]
+            else:
+                tokens = [t for t in tokens if t.lower() not in stop_set]
+        results.append(tokens)
+
+    return results
+
+
+def count_document_terms(documents, tokenizer_params):
+    """Tokenizes the documents, then returns the number of documents along with document frequency and total frequency counts for each term as (int, Counter, Counter)
+
+    :param documents: iterable of str
+    :param tokenizer_params: dict, keyword arguments for tokenize_documents
+    """
+    num_docs = 0
+    doc_freqs = collections.Counter()
+    term_freqs = collections.Counter()
+    for tokens in tokenize_documents(documents, **tokenizer_params):
+        num_docs += 1
+        term_freqs.update(tokens)
+        doc_freqs.update(set(tokens))
+    return num_docs, doc_freqs, term_freqs
+
+
+def select_vocabulary(doc_freqs, term_freqs, num_docs, minDF, maxDF, vocabSize):
+    """Returns the vocabulary as a list of terms, selected the same way as Spark's CountVectorizer.
+    Terms outside the document frequency bounds are dropped, then the vocabSize most frequent terms are kept.
+    Terms are ordered by decreasing frequency, with ties broken alphabetically.
+
+    :param doc_freqs: dict, term -> number of documents the term appears in
+    :param term_freqs: dict, term -> total number of times the term appears in the corpus
+    :param num_docs: int, number of documents in the corpus
+    :param minDF: int or float, minimum document frequency, a fraction of num_docs when less than 1
+    :param maxDF: int or float, maximum document frequency, a fraction of num_docs when less than 1
+    :param vocabSize: int, maximum size of the vocabulary
+    """
+    min_df = minDF if minDF >= 1.0 else minDF * num_docs
+    max_df = maxDF if maxDF >= 1.0 else maxDF * num_docs
+    if max_df < min_df:
+        raise ValueError(
+            f"maxDF ({maxDF}) must be greater than or equal to minDF ({minDF})"
+        )
+    kept_terms = [t for t, df in doc_freqs.items() if min_df <= df <= max_df]
+    kept_terms.sort(key=lambda t: (-term_freqs[t], t))
+    return kept_terms[:vocabSize]
+
+
+def vectorize_documents(documents, tokenizer_params, word_to_id, minTF=0.0, binary=False):
+    """Returns term counts for the documents as a scipy CSR matrix of shape (num documents, vocabulary size), matching the output of Spark's CountVectorizerModel.
+
+    :param documents: iterable of str
+    :param tokenizer_params: dict, keyword arguments for tokenize_documents
+    :param word_to_id: dict, str -> int, the vocabulary index
+    :param minTF: int or float, ignore terms with a count (or fraction of the document's token count when less than 1) below this value in each document
+    :param binary: boolean, True for binary term document flags rather than counts
+    """
+    indptr = [0]
+    indices = []
+    data = []
+    for tokens in tokenize_documents(documents, **tokenizer_params):
+        term_counts = collections.Counter(
+            word_to_id[t] for t in tokens if t in word_to_id
+        )
+        effective_min_tf = minTF if minTF >= 1.0 else len(tokens) * minTF
+        for term_id, count in sorted(term_counts.items()):
+            if count >= effective_min_tf:
+                indices.append(term_id)
+                data.append(1.0 if binary else float(count))
+        indptr.append(len(indices))
+
+    return scipy.sparse.csr_matrix(
+        (data, indices, indptr), shape=(len(indptr) - 1, len(word_to_id))
+    )
+
+
+def chunk_documents(documents, chunk_size):
+    """Yields lists of at most chunk_size documents
+
+    :param documents: iterable of str
+    :param chunk_size: int, maximum number of documents in each chunk
+    """
+    doc_iter = iter(documents)
+    chunk = list(itertools.islice(doc_iter, chunk_size))
+    while len(chunk) > 0:
+        yield chunk
+        chunk = list(itertools.islice(doc_iter, chunk_size))
+
+
+class LocalTextPreprocessingPipeline:
+    """A text pre-processing pipeline with the same behavior as SparkTextPreprocessingPipeline that runs in local processes rather than Spark.
+    Useful for corpora that fit on a single machine, where starting the JVM costs more than the processing.
+    Output is a scipy CSR matrix of term counts (or TF-IDF values) rather than a Spark DataFrame.
+    """
+
+    PARAMS_JSON = SparkTextPreprocessingPipeline.PARAMS_JSON
+    VOCABULARY_JSON = "local_vocabulary.json"
+
+    def __init__(
+        self,
+        input_col=DEFAULT_DOC_COL_NAME,
+        output_col=VECTORIZED_COL_NAME,
+        tokens_col=TOKENIZED_COL_NAME,
+        filtered_tokens_col=FILTERED_TOKENS_COL_NAME,
+        tokenization_pattern=DEFAULT_TOKENIZATION_PATTERN,
+        match_gaps=False,
+        toLowercase=True,
+        stopLanguage="english",
+        stopCaseSensitive=False,
+        maxDF=0.95,
+        minDF=0.05,
+        minTF=0.0,
+        vocabSize=262144,
+        binary=False,
+        useIDF=False,
+        minTokenLength=1,
+        stopWords=None,
+        minDocFreq=0,
+        workers=1,
+        chunk_size=10000,
+    ):
+        """Initializes a local text preprocessing pipeline. Parameters match SparkTextPreprocessingPipeline, column names are only used to keep saved parameters interchangeable with the Spark pipeline.
+
+        :param input_col: str, the name of the column to be input to the pipeline
+        :param output_col: str, the name of the column to be output by the pipeline
+        :param tokens_col: str, the name for the intermediate column
+        :param tokenization_pattern: regex pattern passed to tokenizer
+        :param match_gaps: boolean, True if your regex matches gaps between words, False to match tokens
+        :param toLowercase: boolean, True to covert characters to lowercase before tokenizing
+        :param stopLanguage: str or None, the name of the language to use for stop word removal or None to skip stopping
+        :param stopCaseSensitive: boolean, True to make stop word removal case sensitive
+        :param maxDF: int or float, maximum document frequency expressed as a float percentage of documents in the corpus or a integer number of documents. Throw away terms that occur in more than that number of documents.
+        :param minDF: int or float, minimum number of documents a term must be in as a percentage of documents in the corpus or an integer number of documents. Throw away terms that occur in fewer than that number of docs.
+        :param minTF: int or float, ignore terms with frequency (float, fraction of document's token count) or count less than the given value for each document (affects transform only, not fitting)
+        :param vocabSize: int, max size of the vocabulary
+        :param binary: boolean, Set to True for binary term document flags, rather than term frequency counts
+        :param useIDF: boolean, set to True to use inverse document frequency smoothing of counts.
+        :param minTokenLength: int, tokens shorter than this are dropped
+        :param stopWords: list of str or None, explicit stop words that override the stopLanguage defaults
+        :param minDocFreq: int, terms in fewer documents than this get an IDF weight of 0
+        :param workers: int, number of processes used for tokenizing and vectorizing
+        :param chunk_size: int, number of documents sent to a worker process at a time
+        """
+        logger.info("Parameters for LocalTextPreprocessingPipeline: %s", locals())
+        self.input_col = input_col
+        self.output_col = output_col
+        self.tokens_col = tokens_col
+        self.filtered_tokens_col = filtered_tokens_col
+        self.tokenization_pattern = tokenization_pattern
+        self.match_gaps = match_gaps
+        self.toLowercase = toLowercase
+        self.minTokenLength = minTokenLength
+        if stopWords is None and stopLanguage is not None:
+            stopWords = load_spark_stop_words(stopLanguage)
+        self.stopWords = stopWords
+        self.stopCaseSensitive = stopCaseSensitive
+        self.maxDF = maxDF
+        self.minDF = minDF
+        self.minTF = minTF
+        self.vocabSize = vocabSize
+        self.binary = binary
+        self.useIDF = useIDF
+        self.minDocFreq = minDocFreq
+        self.workers = workers
+        self.chunk_size = chunk_size
+
+        self.vocabulary = None
+        self.idf = None
+
+    @property
+    def tokenizer_params(self):
+        """Keyword arguments for tokenize_documents matching this pipeline's settings"""
+        return {
+            "pattern": self.tokenization_pattern,
+            "match_gaps": self.match_gaps,
+            "to_lowercase": self.toLowercase,
+            "min_token_length": self.minTokenLength,
+            "stop_words": self.stopWords,
+            "stop_case_sensitive": self.stopCaseSensitive,
+        }
+
+    def fit_vocabulary(self, documents):
+        """Counts terms in the documents and selects the vocabulary from those counts
+
+        :param documents: iterable of str
+        """
+        logger.info("Fitting LocalTextPreprocessingPipeline with %s workers", self.workers)
+        chunk_counts = joblib.Parallel(n_jobs=self.workers)(
+            joblib.delayed(count_document_terms)(chunk, self.tokenizer_params)
+            for chunk in chunk_documents(documents, self.chunk_size)
+        )
+        num_docs = 0
+        doc_freqs = collections.Counter()
+        term_freqs = collections.Counter()
+        for chunk_docs, chunk_doc_freqs, chunk_term_freqs in chunk_counts:
+            num_docs += chunk_docs
+            doc_freqs.update(chunk_doc_freqs)
+            term_freqs.update(chunk_term_freqs)
+        logger.debug("Counted %s terms in %s documents", len(doc_freqs), num_docs)
+
+        self.vocabulary = select_vocabulary(
+            doc_freqs, term_freqs, num_docs, self.minDF, self.maxDF, self.vocabSize
+        )
+        self.idf = None
+        logger.info("Vocabulary size: %s", len(self.vocabulary))
+
+    def fit(self, documents):
+        """Fits the vocabulary (and IDF weights if useIDF is set) to the documents
+
+        :param documents: re-iterable collection of str, such as a list or pandas Series
+        """
+        self.fit_vocabulary(documents)
+        if self.useIDF:
+            self.idf = self.compute_idf(self.vectorize(documents))
+        return self
+
+    def vectorize(self, documents):
+        """Returns term counts for the documents as a scipy CSR matrix using the fitted vocabulary, without IDF weighting
+
+        :param documents: iterable of str
+        """
+        word_to_id = self.get_word_to_id()
+        chunk_matrices = joblib.Parallel(n_jobs=self.workers)(
+            joblib.delayed(vectorize_documents)(
+                chunk, self.tokenizer_params, word_to_id, self.minTF, self.binary
+            )
+            for chunk in chunk_documents(documents, self.chunk_size)
+        )
+        if len(chunk_matrices) == 0:
+            return scipy.sparse.csr_matrix((0, len(word_to_id)))
+        return scipy.sparse.vstack(chunk_matrices, format="csr")
+
+    def compute_idf(self, count_matrix):
+        """Returns IDF weights for each term in the vocabulary the same way as Spark's IDF: log((m + 1) / (df + 1)) for m documents
+
+        :param count_matrix: scipy sparse matrix of term counts, documents are rows
+        """
+        num_docs = count_matrix.shape[0]
+        doc_freqs = np.bincount(
+            count_matrix.indices[count_matrix.data > 0],
+            minlength=count_matrix.shape[1],
+        )
+        idf = np.log((num_docs + 1.0) / (doc_freqs + 1.0))
+        idf[doc_freqs < self.minDocFreq] = 0.0
+        return idf
+
+    def apply_idf(self, count_matrix):
+        """Returns the count matrix weighted by the fitted IDF values as a scipy CSR matrix
+
+        :param count_matrix: scipy sparse matrix of term counts, documents are rows
+        """
+        return scipy.sparse.csr_matrix(count_matrix.multiply(self.idf))
+
+    def transform(self, documents):
+        """Returns the vectorized documents as a scipy CSR matrix, IDF weighted if useIDF is set
+
+        :param documents: iterable of str
+        """
+        if self.vocabulary is None:
+            raise ValueError("LocalTextPreprocessingPipeline must be fit before transform")
+        vectorized = self.vectorize(documents)
+        if self.idf is not None:
+            vectorized = self.apply_idf(vectorized)
+        return vectorized
+
+    def fit_transform(self, documents):
+        """Fit the pipeline, then return results of running transform on the documents as a scipy CSR matrix.
+        The documents are only vectorized once, even when IDF weights are fit.
+
+        :param documents: re-iterable collection of str, such as a list or pandas Series
+        """
+        self.fit_vocabulary(documents)
+        vectorized = self.vectorize(documents)
+        if self.useIDF:
+            self.idf = self.compute_idf(vectorized)
+            vectorized = self.apply_idf(vectorized)
+        return vectorized
+
+    def get_id_to_word(self):
+        vocab = {}
+        if self.vocabulary is not None:
+            vocab = dict(enumerate(self.vocabulary))
+        return vocab
+
+    def get_word_to_id(self):
+        return {v: k for k, v in self.get_id_to_word().items()}
+
+    def get_param_maps(self):
+        """Collect the parameters for each stage, using the same names and layout as SparkTextPreprocessingPipeline.get_param_maps.
+        Returns a dictionary.
+        """
+        stage_maps = [
+            {
+                "inputCol": self.input_col,
+                "outputCol": self.tokens_col,
+                "pattern": self.tokenization_pattern,
+                "gaps": self.match_gaps,
+                "toLowercase": self.toLowercase,
+                "minTokenLength": self.minTokenLength,
+            }
+        ]
+        count_vec_in_col = self.tokens_col
+        if self.stopWords is not None:
+            count_vec_in_col = self.filtered_tokens_col
+            stage_maps.append(
+                {
+                    "inputCol": self.tokens_col,
+                    "outputCol": count_vec_in_col,
+                    "stopWords": self.stopWords,
+                    "caseSensitive": self.stopCaseSensitive,
+                }
+            )
+        count_vec_out_col = "count_vectorized" if self.useIDF else self.output_col
+        stage_maps.append(
+            {
+                "inputCol": count_vec_in_col,
+                "outputCol": count_vec_out_col,
+                "maxDF": self.maxDF,
+                "minDF": self.minDF,
+                "minTF": self.minTF,
+                "vocabSize": self.vocabSize,
+                "binary": self.binary,
+            }
+        )
+        if self.useIDF:
+            stage_maps.append(
+                {
+                    "inputCol": count_vec_out_col,
+                    "outputCol": self.output_col,
+                    "minDocFreq": self.minDocFreq,
+                }
+            )
+
+        result = {"stages": []}
+        for i, stage_map in enumerate(stage_maps):
+            stage_name = f"stage_{i}"
+            result["stages"].append(stage_name)
+            result[stage_name] = stage_map
+        return result
+
+    def save(self, save_dir):
+        """Saves the parameters and fitted vocabulary to the specified directory
+
+        :param save_dir: Directory to save the pipeline
+        """
+        logger.info("Saving LocalTextPreprocessingPipeline to directory: %s", save_dir)
+        os.makedirs(save_dir, exist_ok=True)
+        with open(os.path.join(save_dir, self.PARAMS_JSON), "w") as f:
+            json.dump(self.get_param_maps(), f)
+        if self.vocabulary is not None:
+            idf = None if self.idf is None else self.idf.tolist()
+            with open(os.path.join(save_dir, self.VOCABULARY_JSON), "w") as f:
+                json.dump({"vocabulary": self.vocabulary, "idf": idf}, f)
+        logger.info("LocalTextPreprocessingPipeline saved")
+
+    @classmethod
+    def init_from_param_maps(cls, param_maps, **kwargs):
+        """Returns an unfitted LocalTextPreprocessingPipeline configured from the stage parameters written by either text preprocessing pipeline's save method
+
+        :param param_maps: dict, as returned by get_param_maps
+        :param kwargs: other options, such as workers and chunk_size
+        """
+        params = {"stopLanguage": None, "useIDF": False}
+        for stage_name in param_maps["stages"]:
+            stage = param_maps[stage_name]
+            if "pattern" in stage:
+                params.update(
+                    input_col=stage["inputCol"],
+                    tokens_col=stage["outputCol"],
+                    tokenization_pattern=stage["pattern"],
+                    match_gaps=stage["gaps"],
+                    toLowercase=stage["toLowercase"],
+                    minTokenLength=stage.get("minTokenLength", 1),
+                )
+            elif "stopWords" in stage:
+                params.update(
+                    filtered_tokens_col=stage["outputCol"],
+                    stopWords=stage["stopWords"],
+                    stopCaseSensitive=stage["caseSensitive"],
+                )
+            elif "vocabSize" in stage:
+                params.update(
+                    output_col=stage["outputCol"],
+                    maxDF=stage["maxDF"],
+                    minDF=stage["minDF"],
+                    minTF=stage["minTF"],
+                    vocabSize=stage["vocabSize"],
+                    binary=stage["binary"],
+                )
+            elif "numFeatures" in stage:
+                raise ValueError(
+                    "Feature hashing is not supported by LocalTextPreprocessingPipeline"
+                )
+            elif "minDocFreq" in stage:
+                params.update(
+                    output_col=stage["outputCol"],
+                    useIDF=True,
+                    minDocFreq=stage["minDocFreq"],
+                )
+        params.update(kwargs)
+        return cls(**params)
+
+    @classmethod
+    def load(cls, load_dir, **kwargs):
+        """Loads a LocalTextPreprocessingPipeline from the specified directory.
+        The parameters JSON can also come from a saved SparkTextPreprocessingPipeline, in which case the pipeline is returned unfitted.
+
+        :param load_dir: Directory to load the pipeline from
+        :param kwargs: other options, such as workers and chunk_size
+        """
+        logger.info("Loading LocalTextPreprocessingPipeline from directory: %s", load_dir)
+        with open(os.path.join(load_dir, cls.PARAMS_JSON)) as f:
+            result = cls.init_from_param_maps(json.load(f), **kwargs)
+
+        vocab_file = os.path.join(load_dir, cls.VOCABULARY_JSON)
+        if os.path.exists(vocab_file):
+            logger.debug("Vocabulary file found %s, loading vocabulary", vocab_file)
+            with open(vocab_file) as f:
+                vocab_json = json.load(f)
+            result.vocabulary = vocab_json["vocabulary"]
+            if vocab_json["idf"] is not None:
+                result.idf = np.array(vocab_json["idf"])
+
+        logger.info("LocalTextPreprocessingPipeline sucessfully loaded")
+        return result
+
+
 def main(
     input_df,
     output_dir,
@@ -495,6 +1356,10 @@ def main(
     vocab_size=262144,
     corpus_output_name=VECTORIZED_CORPUS_FILENAME,
     quiet=False,
+    num_features=None,
+    term_frequency_dir=None,
+    month=None,
+    vocabulary_months=None,
 ):
     """Transforms the input corpus by fitting the document processing pipeline, saves results, then
     prints corpus statistics as appropriate.
@@ -506,6 +1371,10 @@ def main(
     :param max_doc_frequency: int or float, maximum number or percentage of documents a term appear to be included in the vocab
     :param vocab_size: int, max vocabulary size
     :param corpus_output_name: str, filename to save the transformed parquet corpus
+    :param num_features: None or int, set to use feature hashing with this many buckets instead of fitting a vocabulary
+    :param term_frequency_dir: None or str, directory of a SparkTermFrequencyTable to select the vocabulary from
+    :param month: None or str, name of the month to add the input corpus under in the SparkTermFrequencyTable
+    :param vocabulary_months: None or list of str, months in the SparkTermFrequencyTable to select the vocabulary from
     """
     logger.info("Fitting spark pipeline to input corpus")
     vectorized_corpus, _ = prep_spark_corpus(
@@ -517,6 +1386,10 @@ def main(
         vocab_size,
         output_dir,
         corpus_output_name,
+        num_features,
+        term_frequency_dir,
+        month,
+        vocabulary_months,
     )
 
     logger.info("Corpus transformed successfully")
@@ -585,6 +1458,24 @@ parser.add_argument(
     help="The maximum vocabulary size used by the CountVectorizer.",
     default=262144,
 )
+parser.add_argument(
+    "--num_features",
+    type=int,
+    help="Use the hashing trick with this many feature buckets instead of fitting a vocabulary with the CountVectorizer. Faster for exploratory runs, vocabulary size and document frequency options are ignored.",
+)
+parser.add_argument(
+    "--term_frequency_dir",
+    help="Directory of the per month term frequency table. When set, the vocabulary is selected from the table's document frequencies instead of fitting the CountVectorizer to the input.",
+)
+parser.add_argument(
+    "--month",
+    help="Add the input corpus to the term frequency table under this month name, e.g. '2021-05', replacing that month if it's already in the table.",
+)
+parser.add_argument(
+    "--vocabulary_months",
+    nargs="+",
+    help="Months in the term frequency table to select the vocabulary from. Defaults to --month if it is given, otherwise all months in the table.",
+)
 
 
 if __name__ == "__main__":
@@ -604,6 +1495,10 @@ if __name__ == "__main__":
             max_doc_frequency=args.max_doc_freq,
             vocab_size=args.vocab_size,
             quiet=args.quiet,
+            num_features=args.num_features,
+            term_frequency_dir=args.term_frequency_dir,
+            month=args.month,
+            vocabulary_months=args.vocabulary_months,
         )
     except Exception as e:
         logger.error("Fatal error during text_processing", exc_info=True)
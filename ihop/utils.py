@@ -16,6 +16,10 @@ logger = logging.getLogger(__name__)
 
 HADOOP_ENV = "HADOOP_HOME"
 
+# Vectors are clustered and visualized in single precision by default, which halves memory use and speeds up distance computations.
+# Pass dtype="float64" to clustering and visualization functions to check results in double precision.
+DEFAULT_VECTOR_DTYPE = "float32"
+
 DEFAULT_LOGGING_CONFIG = {
     "version": 1,
     "disable_existing_loggers": False,
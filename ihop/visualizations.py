@@ -11,8 +11,9 @@ import numpy as np
 import pandas as pd
 from sklearn.manifold import TSNE
 
-from ihop.community2vec import GensimCommunity2Vec
+from ihop.community2vec import load_vectors
 import ihop.utils
+from ihop.utils import DEFAULT_VECTOR_DTYPE
 
 logger = logging.getLogger(__name__)
 
@@ -78,18 +79,24 @@ def assign_other_category_column(
 
 
 def generate_tsne_dataframe(
-    c2v_path, key_col="subreddit", n_components=2, random_state=77, **kwargs
+    c2v_path,
+    key_col="subreddit",
+    n_components=2,
+    random_state=77,
+    dtype=DEFAULT_VECTOR_DTYPE,
+    **kwargs,
 ):
     """Fits a TSNE representation of the dataframe.
     Returns the result asPandas dataframe
 
-    :param c2v_path: str, path to a trained GensimCommunity2Vec model saved to disk
+    :param c2v_path: str, path to a trained community2vec model directory saved to disk
     :param key_col: str, column name for indexed values
     :param n_components: int, usually 2 or 3 dimensions, since the purpose of this is for creating visualizations
+    :param dtype: str or numpy dtype, type of the vectors TSNE is fit on
     :param kwargs: dict params passed to sklearn's TNSE model
     """
-    logger.debug("Loading community2vec model: %s", c2v_path)
-    c2v_model = GensimCommunity2Vec.load(c2v_path)
+    logger.debug("Loading community2vec vectors: %s", c2v_path)
+    c2v_model = load_vectors(c2v_path)
     logger.debug("Model %s successfully loaded", c2v_path)
     tsne_fitter = TSNE(
         **kwargs,
@@ -100,20 +107,16 @@ def generate_tsne_dataframe(
         square_distances=True,
         random_state=random_state,
     )
-    tsne_projection = tsne_fitter.fit_transform(c2v_model.get_normed_vectors())
+    tsne_projection = tsne_fitter.fit_transform(
+        np.asarray(c2v_model.get_normed_vectors(), dtype=dtype)
+    )
     logger.info("TSNE ran for %s iterations", tsne_fitter.n_iter_)
 
-    dataframe_elements = list()
-    for i, vocab_elem in enumerate(c2v_model.get_index_to_key()):
-        elem_proj = tsne_projection[i]
-        dataframe_elements.append((vocab_elem, *elem_proj))
-
-    # Generate columns for dataframe
-    cols = [key_col]
-    for i in range(1, n_components + 1):
-        cols.append(f"tsne_{i}")
-
-    return pd.DataFrame.from_records(dataframe_elements, columns=cols)
+    tsne_df = pd.DataFrame(
+        tsne_projection, columns=[f"tsne_{i}" for i in range(1, n_components + 1)]
+    )
+    tsne_df.insert(0, key_col, list(c2v_model.get_index_to_key()))
+    return tsne_df
 
 
 def load_tsne_dataframe(tsne_csv):
@@ -125,13 +128,14 @@ def load_tsne_dataframe(tsne_csv):
     return pd.read_csv(tsne_csv, header=0)
 
 
-def main(c2v_path, tsne_csv):
+def main(c2v_path, tsne_csv, dtype=DEFAULT_VECTOR_DTYPE):
     """Generates a TSNE
 
     :param c2v_path: str, Path to the trained GensimCommunity2Vec model
     :param tsne_csv: str, Path to the desired dataframe to store t-sne coordinates
+    :param dtype: str or numpy dtype, type of the vectors TSNE is fit on
     """
-    tsne_df = generate_tsne_dataframe(c2v_path)
+    tsne_df = generate_tsne_dataframe(c2v_path, dtype=dtype)
     logger.debug("Writing TSNE dataframe to %s", tsne_csv)
     tsne_df.to_csv(tsne_csv, index=False)
     logger.debug("TSNE Dataframe successfully written")
@@ -155,6 +159,11 @@ parser.add_argument(
     "tsne_csv",
     help="Path to a CSV file to write out TSNE (x,y) coordinates, so they can be later loaded as a DataFrame",
 )
+parser.add_argument(
+    "--float64",
+    action="store_true",
+    help="Use this flag to fit TSNE on float64 vectors rather than float32, for example to check the reproducibility of results.",
+)
 
 
 if __name__ == "__main__":
@@ -163,6 +172,10 @@ if __name__ == "__main__":
         config = ihop.utils.parse_config_file(args.config)
         ihop.utils.configure_logging(config[1])
         logger.debug("Script arguments: %s", args)
-        main(args.c2v_model, args.tsne_csv)
+        main(
+            args.c2v_model,
+            args.tsne_csv,
+            "float64" if args.float64 else DEFAULT_VECTOR_DTYPE,
+        )
     except Exception:
         logger.error("Fatal error while producing TSNE visualization", exc_info=True)
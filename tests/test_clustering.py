@@ -5,6 +5,7 @@ import math
 
 import gensim.models as gm
 import numpy as np
+import pandas as pd
 from sklearn.cluster import KMeans, AgglomerativeClustering
 import pytest
 
@@ -110,6 +111,10 @@ def test_cluster_model_serialization(vector_data, tmp_path):
         "aww",
         "NBA",
     }
+    assert (
+        loaded_model.get_cluster_assignments_as_series().to_dict()
+        == loaded_model.get_cluster_assignments_as_dict()
+    )
 
 
 def test_agglomerative_hierarchical_model(vector_data, tmp_path):
@@ -173,6 +178,331 @@ def test_main_sklearn(vector_data, tmp_path):
     assert clusters_csv.exists()
 
 
+@pytest.fixture
+def direction_clusters():
+    """Points scattered around three orthogonal directions with different norms, so only cosine similarity recovers the groups"""
+    rng = np.random.default_rng(3)
+    directions = np.eye(3, 8)
+    labels = np.repeat(np.arange(3), 20)
+    points = directions[labels] + rng.normal(scale=0.05, size=(60, 8))
+    points *= rng.uniform(0.1, 10, size=(60, 1))
+    return points, labels
+
+
+def test_spherical_kmeans(direction_clusters):
+    points, labels = direction_clusters
+    model = ic.SphericalKMeans(
+        n_clusters=3, batch_size=16, n_init=3, n_jobs=2, random_state=4
+    )
+    predicted = model.fit_predict(points)
+    assert ic.metrics.adjusted_rand_score(labels, predicted) == 1.0
+    assert np.allclose(np.linalg.norm(model.cluster_centers_, axis=1), 1.0)
+    assert model.inertia_ < 0.1 * len(points)
+    assert (model.predict(points * 2) == predicted).all()
+
+    same_seed = ic.SphericalKMeans(
+        n_clusters=3, batch_size=16, n_init=3, random_state=4
+    ).fit(points)
+    assert (same_seed.labels_ == predicted).all()
+
+    with pytest.raises(ValueError):
+        ic.SphericalKMeans(n_clusters=100).fit(points)
+
+
+def test_main_spherical_kmeans(direction_clusters, tmp_path):
+    points, _ = direction_clusters
+    index = {i: f"subreddit{i}" for i in range(len(points))}
+    model = ic.main(
+        ic.ClusteringModelFactory.SPHERICAL_KMEANS,
+        points,
+        index,
+        tmp_path,
+        {"n_clusters": 3, "batch_size": 16},
+    )
+    assert isinstance(model.clustering_model, ic.SphericalKMeans)
+    assert model.get_parameters()["n_init"] == 4
+    loaded = ic.ClusteringModel.load(tmp_path, points, index)
+    assert (loaded.predict(points) == model.clusters).all()
+
+
+def test_cluster_summary_index(direction_clusters, tmp_path):
+    points, labels = direction_clusters
+    index = {i: f"subreddit{i}" for i in range(len(points))}
+    counts = pd.Series(np.arange(len(points)), index=list(index.values()))
+    model = ic.main(
+        ic.ClusteringModelFactory.SPHERICAL_KMEANS,
+        points,
+        index,
+        tmp_path,
+        {"n_clusters": 3, "batch_size": 16},
+        datapoint_counts=counts,
+    )
+    summary_index = model.summary_index
+    assert summary_index.n_clusters == 3
+    assert list(summary_index.sizes) == [20, 20, 20]
+    assert np.all(summary_index.cohesion > 0.9)
+
+    cluster = summary_index.get_cluster("subreddit0")
+    members = summary_index.get_members(cluster)
+    assert sorted(members) == sorted(f"subreddit{i}" for i in range(20))
+    assert summary_index.get_medoid(cluster) == members[0]
+    row = summary_index.get_row(cluster)
+    distances = summary_index.distances[
+        summary_index.offsets[row] : summary_index.offsets[row + 1]
+    ]
+    assert np.all(np.diff(distances) >= 0)
+    assert summary_index.get_members(cluster, top_n=2, by_count=True) == [
+        "subreddit19",
+        "subreddit18",
+    ]
+
+    # The medoid has the smallest total cosine distance to the cluster's members
+    member_vectors = ic.normalize_rows(points[:20])
+    total_distances = (1 - member_vectors @ member_vectors.T).sum(axis=1)
+    assert f"subreddit{np.argmin(total_distances)}" == members[0]
+
+    loaded = ic.ClusteringModel.load(tmp_path, points, index).summary_index
+    assert isinstance(loaded.members, np.memmap)
+    assert loaded.get_members(cluster) == members
+    assert np.allclose(loaded.get_centroid(cluster), summary_index.get_centroid(cluster))
+    summary_df = loaded.get_summary_df(top_n=2)
+    assert list(summary_df.columns) == [
+        "cluster",
+        "size",
+        "cohesion",
+        "medoid",
+        "top_members",
+        "top_members_by_count",
+    ]
+    assert summary_df["top_members"].str.split().str.len().tolist() == [2, 2, 2]
+
+    with pytest.raises(KeyError):
+        summary_index.get_members(5)
+    without_counts = ic.ClusterSummaryIndex.build(points, labels, index)
+    with pytest.raises(ValueError):
+        without_counts.get_members(0, by_count=True)
+
+
+def test_get_knn_connectivity(direction_clusters):
+    points, labels = direction_clusters
+    connectivity = ic.get_knn_connectivity(points, n_neighbors=5, chunk_size=16)
+    assert connectivity.shape == (60, 60)
+    assert (connectivity != connectivity.T).nnz == 0
+    assert connectivity.diagonal().sum() == 0
+    assert (connectivity.getnnz(axis=1) >= 5).all()
+    rows, cols = connectivity.nonzero()
+    assert (labels[rows] == labels[cols]).all()
+
+
+def test_cut_merge_tree():
+    # ((0, 1), 2) and 3 merged last
+    children = np.array([[0, 1], [4, 2], [5, 3]])
+    assert list(ic.cut_merge_tree(children, 4, 4)) == [0, 1, 2, 3]
+    assert list(ic.cut_merge_tree(children, 4, 3)) == [0, 0, 1, 2]
+    assert list(ic.cut_merge_tree(children, 4, 2)) == [0, 0, 0, 1]
+    assert list(ic.cut_merge_tree(children, 4, 1)) == [0, 0, 0, 0]
+    with pytest.raises(ValueError):
+        ic.cut_merge_tree(children, 4, 0)
+
+
+def test_knn_agglomerative(direction_clusters, tmp_path):
+    points, labels = direction_clusters
+    index = {i: f"subreddit{i}" for i in range(len(points))}
+    model = ic.main(
+        ic.ClusteringModelFactory.KNN_AGGLOMERATIVE,
+        points,
+        index,
+        tmp_path,
+        {"n_clusters": 3, "n_neighbors": 5},
+    )
+    assert isinstance(model.clustering_model, ic.KnnAgglomerativeClustering)
+    assert ic.metrics.adjusted_rand_score(labels, model.clusters) == 1.0
+    assert model.clustering_model.children_.shape == (59, 2)
+
+    merge_tree = np.load(tmp_path / ic.ClusteringModel.MERGE_TREE_FILE)
+    assert (merge_tree["children"] == model.clustering_model.children_).all()
+    assert len(merge_tree["distances"]) == 59
+    assert len(set(ic.cut_merge_tree(merge_tree["children"], 60, 6))) == 6
+
+    loaded = ic.ClusteringModel.load(tmp_path, points, index)
+    assert (loaded.predict(points) == model.clusters).all()
+
+
+def test_labels_at(direction_clusters, tmp_path):
+    points, labels = direction_clusters
+    index = {i: f"subreddit{i}" for i in range(len(points))}
+    model = ic.main(
+        ic.ClusteringModelFactory.AGGLOMERATIVE,
+        points,
+        index,
+        tmp_path,
+        {"n_clusters": 3, "compute_full_tree": True},
+        cut_n_clusters=[2, 10],
+    )
+    assert ic.metrics.adjusted_rand_score(model.clusters, model.labels_at(3)) == 1.0
+    assert model.labels_at(10) is model.labels_at(10)
+    assert len(set(model.labels_at(1))) == 1
+
+    clusters_2 = pd.read_csv(tmp_path / "clusters_2.csv")
+    assert list(clusters_2.columns) == ["subreddit", "agglomerative"]
+    assert clusters_2["agglomerative"].nunique() == 2
+    assert pd.read_csv(tmp_path / "clusters_10.csv")["agglomerative"].nunique() == 10
+
+    loaded = ic.ClusteringModel.load(tmp_path, points, index)
+    assert (loaded.labels_at(10) == model.labels_at(10)).all()
+
+    kmeans = ic.ClusteringModel(points, KMeans(n_clusters=3), "kmeans", index)
+    with pytest.raises(ValueError):
+        kmeans.labels_at(3)
+
+
+def test_get_coassociation_matrix():
+    run_labels = np.array([[0, 0, 1, 1], [0, 0, 0, 1], [1, 0, 1, 0]])
+    coassociation = ic.get_coassociation_matrix(run_labels, chunk_size=3)
+    expected = np.array(
+        [
+            [3, 2, 2, 0],
+            [2, 3, 1, 1],
+            [2, 1, 3, 1],
+            [0, 1, 1, 3],
+        ]
+    )
+    assert np.allclose(coassociation.toarray(), expected / 3)
+
+    # Keeping 2 pairs per row drops the least frequent partners, then symmetrizes
+    pruned = ic.get_coassociation_matrix(run_labels, max_pairs=2)
+    assert (pruned != pruned.T).nnz == 0
+    assert np.allclose(pruned.diagonal(), 1.0)
+    assert pruned[0, 3] == 0
+
+    stability = ic.get_cluster_stability(run_labels, np.array([0, 0, 0, 1]))
+    assert np.allclose(stability, [2 / 3, 1 / 2, 1 / 2, 1.0])
+
+
+def test_get_cluster_stability_large_clusters():
+    # Clusters much larger than max_pairs that every run agrees on are fully stable
+    labels = np.repeat([0, 1], 500)
+    run_labels = np.vstack([labels, 1 - labels, labels, 1 - labels])
+    stability = ic.get_cluster_stability(run_labels, labels)
+    assert np.allclose(stability, 1.0)
+
+    # Splitting a cluster in half in one of the runs only counts that run against it
+    run_labels[0, :250] = 2
+    stability = ic.get_cluster_stability(run_labels, labels)
+    assert np.allclose(stability[:500], (3 + 249 / 499) / 4)
+    assert np.allclose(stability[500:], 1.0)
+
+
+def test_consensus_clustering(direction_clusters, tmp_path):
+    points, labels = direction_clusters
+    index = {i: f"subreddit{i}" for i in range(len(points))}
+    model = ic.main(
+        ic.ClusteringModelFactory.CONSENSUS,
+        points,
+        index,
+        tmp_path,
+        {
+            "n_clusters": 3,
+            "n_runs": 4,
+            "n_jobs": 2,
+            "base_params": {"batch_size": 16},
+        },
+    )
+    assert isinstance(model.clustering_model, ic.ConsensusClustering)
+    assert model.clustering_model.run_labels_.shape == (4, 60)
+    assert ic.metrics.adjusted_rand_score(labels, model.clusters) == 1.0
+    assert np.allclose(model.clustering_model.stability_, 1.0)
+
+    clusters = pd.read_csv(tmp_path / "clusters.csv")
+    assert list(clusters.columns) == ["subreddit", "consensus", ic.STABILITY_COL]
+    assert np.allclose(clusters[ic.STABILITY_COL], 1.0)
+
+    kmeans_consensus = ic.ConsensusClustering(
+        n_clusters=3, n_runs=2, base_model="kmeans", random_state=1
+    ).fit(points)
+    assert kmeans_consensus.labels_.shape == (60,)
+    with pytest.raises(ValueError):
+        ic.ConsensusClustering(n_clusters=3, base_model="other").fit(points)
+
+
+def test_is_plateau():
+    assert not ic.is_plateau([10.0, 5.0], 0.1, 2)
+    assert not ic.is_plateau([10.0, 5.0, 4.9, 4.85], 0.1, 3)
+    assert ic.is_plateau([10.0, 5.0, 4.9, 4.85], 0.1, 2)
+
+
+def test_sweep_n_clusters(direction_clusters):
+    points, _ = direction_clusters
+    vectors = ic.normalize_rows(points)
+    sweep = ic.sweep_n_clusters(
+        vectors,
+        [6, 2, 3, 4],
+        ic.ClusteringModelFactory.SPHERICAL_KMEANS,
+        {"batch_size": 16, "n_jobs": 1},
+        workers=2,
+        silhouette_sample_size=30,
+    )
+    assert list(sweep.columns) == [ic.N_CLUSTERS_COL, ic.METRIC_COL, ic.VALUE_COL]
+    assert list(sweep[ic.N_CLUSTERS_COL].unique()) == [2, 3, 4, 6]
+    assert set(sweep[ic.METRIC_COL]) == {
+        "Silhouette",
+        "Calinski-Harabasz",
+        "Davies-Bouldin",
+        ic.INERTIA,
+        ic.TRAINING_SECONDS,
+    }
+    silhouettes = sweep[sweep[ic.METRIC_COL] == "Silhouette"].set_index(
+        ic.N_CLUSTERS_COL
+    )[ic.VALUE_COL]
+    assert silhouettes.idxmax() == 3
+
+    # Inertia is nearly flat beyond the true 3 clusters, so the sweep stops after the second batch
+    stopped = ic.sweep_n_clusters(
+        vectors,
+        [2, 3, 4, 5, 6, 7],
+        cluster_params={"n_init": 10},
+        workers=2,
+        plateau_tolerance=0.5,
+        plateau_patience=1,
+    )
+    assert list(stopped[ic.N_CLUSTERS_COL].unique()) == [2, 3, 4, 5]
+
+
+def test_vector_dtype(direction_clusters):
+    points, _ = direction_clusters
+    model = ic.ClusteringModelFactory.init_clustering_model(
+        ic.ClusteringModelFactory.KMEANS, points, None, n_clusters=3
+    )
+    assert model.data.dtype == np.float32
+    model.train()
+    assert model.clustering_model.cluster_centers_.dtype == np.float32
+    assert (model.predict(points) == model.clusters).all()
+    assert model.get_metrics(silhouette_sample_size=30)["Silhouette"] > 0
+
+    float64_model = ic.ClusteringModelFactory.init_clustering_model(
+        ic.ClusteringModelFactory.SPHERICAL_KMEANS,
+        points,
+        None,
+        dtype="float64",
+        n_clusters=3,
+        n_jobs=1,
+    )
+    float64_model.train()
+    assert float64_model.clustering_model.cluster_centers_.dtype == np.float64
+    predicted = float64_model.predict(points.astype(np.float32))
+    assert (predicted == float64_model.clusters).all()
+
+
+def test_benchmark_vector_dtypes(direction_clusters):
+    points, _ = direction_clusters
+    results = ic.benchmark_vector_dtypes(
+        points, n_clusters=3, silhouette_sample_size=30, n_init=2, n_jobs=1
+    )
+    assert [r["dtype"] for r in results] == ["float32", "float64"]
+    assert results[0]["vectors_mb"] * 2 == results[1]["vectors_mb"]
+    assert results[1]["adjusted_rand_index"] == 1.0
+
+
 def test_gensim_lda(text_features):
     lda = ic.GensimLDAModel(
         text_features.corpus,
@@ -355,6 +685,42 @@ def test_get_contingency_table():
     assert np.array_equal(expected_table, result_table)
 
 
+def test_sparse_contingency_table(monkeypatch):
+    rng = np.random.default_rng(5)
+    clustering_1 = rng.integers(0, 30, size=200)
+    clustering_2 = rng.integers(0, 40, size=200)
+    counts_1 = rng.integers(0, 5, size=200)
+    counts_2 = rng.integers(1, 5, size=200)
+    indices_1 = sorted(set(clustering_1))
+    indices_2 = sorted(set(clustering_2))
+    dense = ic.get_contingency_table(
+        clustering_1, clustering_2, counts_1, counts_2, indices_1, indices_2
+    )
+    sparse = ic.get_contingency_table(
+        clustering_1, clustering_2, counts_1, counts_2, indices_1, indices_2, True
+    )
+    assert isinstance(dense, np.ndarray)
+    assert ic.scipy.sparse.issparse(sparse)
+    assert np.array_equal(dense, sparse.toarray())
+
+    dense_voi = ic.variation_of_information(
+        clustering_1, clustering_2, counts_1, counts_2, sparse=False
+    )
+    sparse_voi = ic.variation_of_information(
+        clustering_1, clustering_2, counts_1, counts_2, sparse=True
+    )
+    assert math.isclose(dense_voi, sparse_voi)
+
+    monkeypatch.setattr(ic, "SPARSE_CONTINGENCY_CELLS", 100)
+    assert ic.scipy.sparse.issparse(
+        ic.get_contingency_table(
+            clustering_1, clustering_2, counts_1, counts_2, indices_1, indices_2
+        )
+    )
+    with pytest.raises(ValueError):
+        ic.get_contingency_table([100], [0], [1], [1], indices_1, indices_2)
+
+
 def test_get_mutual_information():
     cont_table = np.array([[0, 2, 0], [0, 0, 2], [2, 0, 0]])
     probs = np.full((3,), 1 / 3)
@@ -429,9 +795,114 @@ def test_remap_clusters_union():
     assert remapping_2[leopards_idx] == 2
 
 
+def test_compare_clusterings_series():
+    clusters_1 = pd.Series([0, 0, 1, 1], index=["aww", "AskReddit", "nba", "nfl"])
+    clusters_2 = pd.Series([5, 6, 6, 7], index=["nfl", "nba", "AskReddit", "news"])
+    remapping_1, remapping_2, keys = ic.remap_clusters(clusters_1, clusters_2)
+    assert list(keys) == ["AskReddit", "nba", "nfl"]
+    assert list(remapping_1) == [0, 1, 1]
+    assert list(remapping_2) == [6, 6, 5]
+    assert remapping_2.dtype.kind == "i"
+
+    counts = pd.Series(
+        [4, 3, 2, 1, 9], index=["nfl", "nba", "AskReddit", "aww", "news"]
+    )
+    count_results = ic.compare_cluterings(
+        clusters_1,
+        clusters_2,
+        cluster_1_counts=counts,
+        cluster_2_counts=counts.to_dict(),
+    )
+    expected_voi = ic.variation_of_information(
+        remapping_1, remapping_2, np.array([2, 3, 4]), np.array([2, 3, 4])
+    )
+    assert math.isclose(
+        count_results[f"{ic.INTERSECT_COMMENT_PROB}_{ic.VOI}"], expected_voi
+    )
+
+    union_results = ic.compare_cluterings(
+        clusters_1.to_dict(), clusters_2, use_union=True
+    )
+    assert f"{ic.UNION_UNIFORM}_{ic.ADJUSTED_RAND_INDEX}" in union_results
+
+
 def test_maximum_matching():
     contingency_table = np.array([[0, 1, 2, 0], [4, 2, 0, 0], [1, 1, 1, 0]])
     pairs = ic.get_maximum_matching_pairs(contingency_table, np.array([0, 1, 2, 3]), np.array([0, 1, 2, 3]), missing_fill_value=None)
     expected = ([1, 0, 2, None], [0, 2, 1, 3])
     assert pairs[0] == expected[0]
     assert pairs[1] == expected[1]
+
+
+def test_get_optimal_matching_sparse():
+    # Rectangular tables with rows and columns that overlap with nothing, which have no full matching on their own
+    rng = np.random.default_rng(3)
+    contingency_table = rng.integers(0, 5, size=(30, 20)) * (rng.random((30, 20)) < 0.1)
+    contingency_table[4] = 0
+    for table in [contingency_table, contingency_table.T]:
+        dense_rows, dense_cols = ic.get_optimal_matching(table)
+        sparse_rows, sparse_cols = ic.get_optimal_matching(
+            ic.scipy.sparse.csr_matrix(table)
+        )
+        assert table[sparse_rows, sparse_cols].sum() == table[dense_rows, dense_cols].sum()
+        assert np.all(table[sparse_rows, sparse_cols] > 0)
+        assert len(set(sparse_rows)) == len(sparse_rows)
+        assert len(set(sparse_cols)) == len(sparse_cols)
+
+
+def test_maximum_matching_sparse_and_hungarian():
+    contingency_table = np.array([[3, 2], [2, 0]])
+    mapping = np.array([10, 11])
+    greedy = ic.get_maximum_matching_pairs(
+        ic.scipy.sparse.csr_matrix(contingency_table), mapping, mapping
+    )
+    assert greedy == ([10, 11, -1], [10, -1, 11])
+    hungarian = ic.get_maximum_matching_pairs(
+        contingency_table, mapping, mapping, matching=ic.HUNGARIAN_MATCHING
+    )
+    assert hungarian == ([10, 11], [11, 10])
+    sparse_hungarian = ic.get_maximum_matching_pairs(
+        ic.scipy.sparse.csr_matrix(contingency_table),
+        mapping,
+        mapping,
+        matching=ic.HUNGARIAN_MATCHING,
+    )
+    assert sparse_hungarian == hungarian
+    with pytest.raises(ValueError):
+        ic.get_maximum_matching_pairs(
+            contingency_table, mapping, mapping, matching="other"
+        )
+
+
+def test_segment_topics():
+    assert ic.segment_topics([[1, 2, 3]]) == [[(2, 1), (3, 1), (3, 2)]]
+    assert ic.segment_topics([[1, 2, 3]], ic.NPMI) == [
+        [(1, 2), (1, 3), (2, 1), (2, 3), (3, 1), (3, 2)]
+    ]
+    with pytest.raises(ValueError):
+        ic.segment_topics([[1, 2]], "c_v")
+
+
+def test_get_topic_coherences():
+    # 5 docs, term 1 in 3 docs, term 2 in 2 docs, together in 1 doc
+    segments = [[(1, 2)]]
+    term_counts = {1: 3, 2: 2}
+    pair_counts = {(1, 2): 1}
+    umass = ic.get_topic_coherences(segments, 5, term_counts, pair_counts)
+    assert math.isclose(umass[0], np.log(1 / 2), rel_tol=1e-6)
+    npmi = ic.get_topic_coherences(segments, 5, term_counts, pair_counts, ic.NPMI)
+    expected_npmi = np.log((1 / 5) / ((3 / 5) * (2 / 5))) / -np.log(1 / 5)
+    assert math.isclose(npmi[0], expected_npmi, rel_tol=1e-6)
+    # Missing terms don't cause errors
+    assert ic.get_topic_coherences([[(3, 4)]], 5, term_counts, pair_counts) == [0.0]
+
+
+def test_spark_lda_coherence_matches_gensim(text_features):
+    lda_model = ic.SparkLDAModel(
+        text_features.corpus, "test_spark", text_features.index, num_topics=2, seed=5
+    )
+    lda_model.train()
+    gensim_coherence = lda_model.get_coherence_model(topn=5).get_coherence()
+    spark_coherence = lda_model.get_coherence(topn=5)
+    assert math.isclose(gensim_coherence, spark_coherence, rel_tol=1e-6)
+    assert isinstance(lda_model.get_coherence(topn=5, measure=ic.NPMI), float)
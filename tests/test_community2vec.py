@@ -1,3 +1,5 @@
+import collections
+import json
 import os
 
 import gensim
@@ -72,6 +74,9 @@ def test_init_gensim_community2vec(spark, vocab_csv, sample_sentences):
         "seed": 1,
         "batch_words": 100,
         "sample": 0,
+        "max_repeats": None,
+        "count_weighting": "linear",
+        "warm_start_model": None,
     }
     assert c2v_model.get_params_as_dict() == expected_params
 
@@ -92,6 +97,40 @@ def test_gensim_community2vec_train_no_errors(vocab_csv, sample_sentences):
     assert "nba" in hockey_neighbors
     assert "funny" in hockey_neighbors
 
+    c2v_model.build_neighbor_index(5)
+    assert c2v_model.get_nearest_neighbors("hockey", 5) == hockey_neighbors
+    benchmark = c2v.benchmark_neighbor_index(c2v_model, c2v_model.neighbor_index, 3)
+    assert benchmark["recall"] == 1.0
+    assert benchmark["num_queries"] == 10
+
+
+def test_neighbor_index(tmp_path):
+    rng = np.random.default_rng(7)
+    vectors = rng.normal(size=(50, 8)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    keys = [f"sub{i}" for i in range(50)]
+    index = c2v.NeighborIndex.build(vectors, keys, k=10, chunk_size=7)
+    assert index.k == 10
+    assert index.neighbors.dtype == np.int32
+    assert index.scores.dtype == np.float16
+
+    similarities = vectors @ vectors.T
+    np.fill_diagonal(similarities, -np.inf)
+    expected = np.argsort(-similarities, axis=1)[:, :10]
+    assert np.all(index.neighbors == expected)
+
+    index.save(tmp_path)
+    loaded = c2v.NeighborIndex.load(tmp_path)
+    assert isinstance(loaded.neighbors, np.memmap)
+    batch = loaded.get_batch_nearest_neighbors(["sub3", "missing", "sub9"], 4)
+    assert batch[0] == [keys[i] for i in expected[3, :4]]
+    assert batch[1] == []
+    assert batch[2] == [keys[i] for i in expected[9, :4]]
+    scored = loaded.get_batch_nearest_neighbors(["sub3"], 2, return_scores=True)[0]
+    assert np.isclose(scored[0][1], similarities[3, expected[3, 0]], atol=1e-3)
+    with pytest.raises(ValueError):
+        loaded.get_nearest_neighbors("sub3", 11)
+
 
 
 def test_gensim_community2vec_compressed_sentences(sample_compressed):
@@ -121,6 +160,104 @@ def test_save_load_trained_community2vec_model(tmp_path, vocab_csv, sample_sente
     assert np.all(loaded_model.w2v_model.wv["AskReddit"] == vector)
 
 
+def test_warm_start_community2vec(tmp_path, vocab_csv, sample_sentences):
+    previous_vocab = c2v.get_vocabulary(vocab_csv)
+    previous_vocab.pop("hockey")
+    previous_model = c2v.GensimCommunity2Vec(
+        previous_vocab, sample_sentences, 9, 4, vector_size=25, epochs=2
+    )
+    previous_model.train(epoch_analogies=False)
+    previous_model.save(str(tmp_path / "previous"))
+
+    vocab = c2v.get_vocabulary(vocab_csv)
+    vocab.pop("news")
+    warm_model = c2v.GensimCommunity2Vec.init_from_previous_model(
+        str(tmp_path / "previous"), vocab, sample_sentences, 9, 4, epochs=1
+    )
+    wv = warm_model.w2v_model.wv
+    assert "hockey" in wv
+    # Subreddits missing from this month's vocabulary are dropped
+    assert "news" not in wv
+    assert set(wv.index_to_key) == set(vocab)
+    assert np.all(wv["AskReddit"] == previous_model.w2v_model.wv["AskReddit"])
+    previous_wv = previous_model.w2v_model.wv
+    assert np.all(
+        warm_model.w2v_model.syn1neg[wv.key_to_index["AskReddit"]]
+        == previous_model.w2v_model.syn1neg[previous_wv.key_to_index["AskReddit"]]
+    )
+    assert wv.get_vecattr("AskReddit", "count") == vocab["AskReddit"]
+    assert warm_model.get_params_as_dict()["warm_start_model"] == str(
+        tmp_path / "previous"
+    )
+    assert warm_model.epochs == 1
+    warm_model.train(epoch_analogies=False)
+    assert np.any(wv["AskReddit"] != previous_model.w2v_model.wv["AskReddit"])
+
+    with pytest.raises(ValueError):
+        c2v.GensimCommunity2Vec.init_from_previous_model(
+            str(tmp_path / "previous"), vocab, sample_sentences, 9, 4, vector_size=50
+        )
+
+
+def test_grid_search_warm_start(tmp_path, vocab_csv, sample_sentences):
+    previous_model = c2v.GensimCommunity2Vec(
+        c2v.get_vocabulary(vocab_csv), sample_sentences, 9, 4, vector_size=25
+    )
+    previous_model.train(epoch_analogies=False)
+    previous_model.save(str(tmp_path / "previous"))
+
+    grid_trainer = c2v.GridSearchTrainer(
+        vocab_csv,
+        sample_sentences,
+        4,
+        9,
+        str(tmp_path / "models"),
+        {"alpha": [0.02, 0.01]},
+        previous_model_dir=str(tmp_path / "previous"),
+        compare_cold_start=True,
+        neighbor_index_k=None,
+    )
+    grid_trainer.train(epochs=1)
+    model_df = grid_trainer.model_analogy_results_as_dataframe()
+    assert set(model_df["warm_start_model"]) == {str(tmp_path / "previous")}
+    assert "cold_start_analogy_accuracy" in model_df.columns
+    assert "cold_start_training_seconds" in model_df.columns
+    assert set(model_df["vector_size"]) == {25}
+
+    # Grid points with a different vector size than the previous model are skipped
+    mixed_grid = c2v.GridSearchTrainer(
+        vocab_csv,
+        sample_sentences,
+        4,
+        9,
+        str(tmp_path / "mixed"),
+        {"vector_size": [10, 25]},
+        previous_model_dir=str(tmp_path / "previous"),
+    )
+    assert mixed_grid.param_grid["vector_size"] == [25]
+    assert mixed_grid.num_models == 1
+    default_grid = c2v.GridSearchTrainer(
+        vocab_csv,
+        sample_sentences,
+        4,
+        9,
+        str(tmp_path / "default"),
+        previous_model_dir=str(tmp_path / "previous"),
+    )
+    assert default_grid.param_grid["vector_size"] == [25]
+    assert c2v.GridSearchTrainer.DEFAULT_PARAM_GRID["vector_size"] == [150]
+    with pytest.raises(ValueError):
+        c2v.GridSearchTrainer(
+            vocab_csv,
+            sample_sentences,
+            4,
+            9,
+            str(tmp_path / "other"),
+            {"vector_size": [10]},
+            previous_model_dir=str(tmp_path / "previous"),
+        )
+
+
 def test_save_vectors(tmp_path, vocab_csv, sample_sentences):
     save_path = str(tmp_path / "vectors.gz")
     c2v_model = c2v.GensimCommunity2Vec(
@@ -203,7 +340,14 @@ def test_grid_search_expand_param_grid_to_list(vocab_csv):
         assert param_dict["sample"] == 0.002
 
 
-def test_grid_search_train(tmp_path, vocab_csv, sample_sentences):
+def test_grid_search_train(tmp_path, vocab_csv, sample_sentences, monkeypatch):
+    index_builds = []
+    build_index = c2v.NeighborIndex.build
+    monkeypatch.setattr(
+        c2v.NeighborIndex,
+        "build",
+        lambda *args, **kwargs: index_builds.append(1) or build_index(*args, **kwargs),
+    )
     model_dir = str(tmp_path / "models")
     grid_trainer = c2v.GridSearchTrainer(
         vocab_csv,
@@ -227,6 +371,414 @@ def test_grid_search_train(tmp_path, vocab_csv, sample_sentences):
     assert (best_model_dir / "keyedVectors").exists()
     assert (best_model_dir / "word2vec.pickle").exists()
     assert (best_model_dir / "parameters.json").exists()
+    assert (best_model_dir / "neighbor_index" / "neighbor_ids.npy").exists()
+    assert c2v.GensimCommunity2Vec.load(str(best_model_dir)).neighbor_index.k == 9
+    # The index is only built for the final best model
+    assert len(index_builds) == 1
+
+    model_df = grid_trainer.model_analogy_results_as_dataframe()
+    assert model_df.shape == (2, 25)
+    assert "training_seconds" in model_df.columns
+    assert (model_df["mean_words_per_second"] > 0).all()
+    assert (best_model_dir / c2v.TELEMETRY_FILE_NAME).exists()
 
+
+def test_read_user_subreddit_counts(vocab_csv, sample_sentences):
+    vocab = c2v.get_vocabulary(vocab_csv)
+    key_to_index = {k: i for i, k in enumerate(vocab)}
+    offsets, ids, counts = c2v.read_user_subreddit_counts(sample_sentences, key_to_index)
+    assert offsets[0] == 0
+    assert offsets[-1] == len(ids) == len(counts)
+    assert np.all(np.diff(offsets) >= 2)
+    assert counts.sum() <= sum(vocab.values())
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        assert len(set(ids[start:end])) == end - start
+
+
+def test_sample_user_pairs():
+    offsets = np.array([0, 2, 5])
+    ids = np.array([0, 1, 2, 3, 4], dtype=np.int32)
+    counts = np.array([3, 1, 1, 1, 2])
+    rng = np.random.default_rng(0)
+    contexts, targets = c2v.sample_user_pairs(
+        offsets, ids, counts, np.array([0, 1]), 10.0, rng
+    )
+    assert np.all(contexts != targets)
+    # Subreddits from different users are never paired
+    assert np.all((contexts < 2) == (targets < 2))
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_pair_sampling_community2vec(vocab_csv, sample_sentences, tmp_path, workers):
+    c2v_model = c2v.PairSamplingCommunity2Vec(
+        c2v.get_vocabulary(vocab_csv),
+        sample_sentences,
+        4,
+        vector_size=8,
+        epochs=2,
+        negative=3,
+        pairs_per_comment=2.0,
+        batch_pairs=4,
+        workers=workers,
+    )
+    initial_vectors = c2v_model.wv.vectors.copy()
+    num_pairs, pairs_per_second = c2v_model.train(epoch_analogies=True)
+    assert num_pairs > 0
+    assert pairs_per_second > 0
+    assert len(c2v_model.training_stats) == 2
+    # Loss is cumulative and epoch_loss is each epoch's share, matching Gensim telemetry
+    losses = [r["loss"] for r in c2v_model.training_stats]
+    assert np.isclose(losses[1] - losses[0], c2v_model.training_stats[1]["epoch_loss"])
+    assert not np.allclose(initial_vectors, c2v_model.wv.vectors)
+    assert c2v_model.get_normed_vectors().shape == (10, 8)
+    assert len(c2v_model.get_nearest_neighbors("nba", topn=3)) == 3
+    assert c2v_model.get_index_to_key()[0] in {"AskReddit", "funny"}
+    acc, _ = c2v_model.score_analogies()
+    assert 0.0 <= acc <= 1.0
+
+    c2v_model.build_neighbor_index(k=3)
+    c2v_model.save(tmp_path / "pair_model")
+    loaded = c2v.PairSamplingCommunity2Vec.load(tmp_path / "pair_model")
+    assert loaded.get_params_as_dict() == c2v_model.get_params_as_dict()
+    assert loaded.get_index_to_key() == c2v_model.get_index_to_key()
+    assert np.allclose(loaded.wv.vectors, c2v_model.wv.vectors)
+    assert np.allclose(loaded.output_vectors, c2v_model.output_vectors)
+    assert loaded.neighbor_index.k == 3
+
+
+def test_grid_search_pair_sampling(tmp_path, vocab_csv, sample_sentences):
+    grid_trainer = c2v.GridSearchTrainer(
+        vocab_csv,
+        sample_sentences,
+        4,
+        9,
+        str(tmp_path / "models"),
+        {"pairs_per_comment": [0.5, 2.0], "vector_size": [8]},
+        neighbor_index_k=3,
+        pair_sampling=True,
+    )
+    grid_trainer.train(epochs=1, workers=1)
     model_df = grid_trainer.model_analogy_results_as_dataframe()
-    assert model_df.shape == (2, 17)
+    assert list(model_df["pairs_per_comment"]) == [0.5, 2.0]
+    loaded = c2v.PairSamplingCommunity2Vec.load(grid_trainer.best_model_path)
+    assert loaded.neighbor_index.k == 3
+    assert os.path.exists(grid_trainer.best_vectors_path)
+
+    with pytest.raises(ValueError):
+        c2v.GridSearchTrainer(
+            vocab_csv,
+            sample_sentences,
+            4,
+            9,
+            str(tmp_path / "other"),
+            previous_model_dir=str(tmp_path / "models"),
+            pair_sampling=True,
+        )
+
+    # Parallel corpus decoders are only used by Gensim models
+    with pytest.raises(ValueError):
+        c2v.train_with_hyperparam_tuning(
+            vocab_csv,
+            sample_sentences,
+            {"vector_size": [8]},
+            4,
+            9,
+            str(tmp_path / "decoders"),
+            1,
+            1,
+            None,
+            pair_sampling=True,
+            corpus_decoders=2,
+            shuffle_seed=1,
+        )
+    assert not os.path.exists(tmp_path / "decoders")
+
+
+def test_subreddit_count_sentences(tmp_path):
+    contexts_path = tmp_path / "contexts.txt"
+    contexts_path.write_text("nba:5 hockey:1 nba:2\nfunny pics funny funny\n")
+    assert [sorted(s) for s in c2v.SubredditCountSentences(str(contexts_path))] == [
+        ["hockey"] + ["nba"] * 7,
+        ["funny"] * 3 + ["pics"],
+    ]
+    capped = c2v.SubredditCountSentences(str(contexts_path), max_repeats=2)
+    assert [sorted(s) for s in capped] == [
+        ["hockey", "nba", "nba"],
+        ["funny", "funny", "pics"],
+    ]
+    log_weighted = c2v.SubredditCountSentences(
+        str(contexts_path), count_weighting="log"
+    )
+    assert [sorted(s) for s in log_weighted] == [
+        ["hockey", "nba", "nba", "nba"],
+        ["funny", "funny", "pics"],
+    ]
+    with pytest.raises(ValueError):
+        c2v.get_num_repeats(3, count_weighting="sqrt")
+
+
+def test_plain_contexts_unchanged(tmp_path, sample_sentences):
+    contexts_path = tmp_path / "contexts.txt"
+    contexts_path.write_text("a b a\nc d c c\n")
+    for path in [str(contexts_path), sample_sentences]:
+        baseline = list(gensim.models.word2vec.PathLineSentences(path))
+        assert not c2v.needs_count_expansion(path)
+        assert list(c2v.SubredditCountSentences(path)) == baseline
+    assert c2v.needs_count_expansion(str(contexts_path), max_repeats=2)
+    assert c2v.needs_count_expansion(str(contexts_path), count_weighting="log")
+
+
+def test_compressed_contexts(spark, tmp_path, vocab_csv):
+    contexts_path = tmp_path / "contexts.txt"
+    contexts_path.write_text(
+        "nba:5 hockey:1 AskReddit:2\nfunny:3 pics:1\nnews:2 politics:2 worldnews:1\n"
+    )
+    assert c2v.get_w2v_params_from_spark_df(spark, str(contexts_path)) == (3, 8)
+    assert c2v.get_w2v_params_from_spark_df(
+        spark, str(contexts_path), max_repeats=2
+    ) == (3, 5)
+    assert c2v.get_w2v_params_from_spark_df(
+        spark, str(contexts_path), count_weighting="log"
+    ) == (3, 6)
+
+    c2v_model = c2v.GensimCommunity2Vec.init_with_spark(
+        spark,
+        c2v.get_vocabulary(vocab_csv),
+        str(contexts_path),
+        vector_size=8,
+        epochs=1,
+        max_repeats=2,
+    )
+    assert c2v_model.max_comments == 5
+    c2v_model.train(epoch_analogies=False)
+    c2v_model.save(str(tmp_path / "model"))
+    loaded = c2v.GensimCommunity2Vec.load(str(tmp_path / "model"))
+    assert loaded.max_repeats == 2
+    assert loaded.count_weighting == "linear"
+
+    offsets, ids, counts = c2v.read_user_subreddit_counts(
+        str(contexts_path), c2v_model.wv.key_to_index
+    )
+    assert list(np.diff(offsets)) == [3, 2, 3]
+    assert counts.sum() == 17
+
+
+def test_load_vectors(tmp_path, vocab_csv, sample_sentences):
+    c2v_model = c2v.GensimCommunity2Vec(
+        c2v.get_vocabulary(vocab_csv), sample_sentences, 9, 4, vector_size=8
+    )
+    c2v_model.train(epoch_analogies=False)
+    c2v_model.build_neighbor_index(k=3)
+    c2v_model.save(str(tmp_path / "model"))
+
+    vectors = c2v.load_vectors(str(tmp_path / "model"))
+    assert isinstance(vectors.wv.vectors, np.memmap)
+    assert isinstance(vectors.get_normed_vectors(), np.memmap)
+    assert np.allclose(vectors.get_normed_vectors(), c2v_model.get_normed_vectors())
+    assert vectors.get_index_to_key() == c2v_model.get_index_to_key()
+    assert vectors.neighbor_index.k == 3
+    assert vectors.get_nearest_neighbors("nba", 3) == c2v_model.get_nearest_neighbors(
+        "nba", 3
+    )
+    assert vectors.get_nearest_neighbors("nba", 5) == c2v_model.get_nearest_neighbors(
+        "nba", 5
+    )
+    assert vectors.score_analogies()[0] == c2v_model.score_analogies()[0]
+
+    in_memory = c2v.load_vectors(str(tmp_path / "model"), mmap=None)
+    assert not isinstance(in_memory.wv.vectors, np.memmap)
+
+
+def test_training_telemetry(tmp_path, vocab_csv, sample_sentences):
+    c2v_model = c2v.GensimCommunity2Vec(
+        c2v.get_vocabulary(vocab_csv), sample_sentences, 9, 4, vector_size=8, epochs=3
+    )
+    c2v_model.train()
+    assert [r["epoch"] for r in c2v_model.training_stats] == [1, 2, 3]
+    # The sample sentences have 26 subreddit mentions
+    assert [r["words"] for r in c2v_model.training_stats] == [26, 26, 26]
+    for record in c2v_model.training_stats:
+        assert record["seconds"] > 0
+        assert record["words_per_second"] > 0
+        assert record["rss_mb"] > 0
+        assert 0.0 <= record["analogy_accuracy"] <= 1.0
+    alphas = [r["alpha"] for r in c2v_model.training_stats]
+    assert alphas == sorted(alphas, reverse=True)
+    # Loss is only computed on request
+    assert all(r["loss"] is None for r in c2v_model.training_stats)
+    c2v_model.training_stats = []
+    c2v_model.train(compute_loss=True)
+    losses = [r["loss"] for r in c2v_model.training_stats]
+    assert np.allclose(
+        np.diff(losses), [r["epoch_loss"] for r in c2v_model.training_stats[1:]]
+    )
+
+    c2v_model.save(str(tmp_path / "model"))
+    with open(tmp_path / "model" / c2v.TELEMETRY_FILE_NAME) as telemetry_file:
+        records = [json.loads(line) for line in telemetry_file]
+    assert records == c2v_model.training_stats
+
+    summary = c2v.summarize_training_stats(c2v_model.training_stats)
+    assert summary["max_rss_mb"] == max(r["rss_mb"] for r in records)
+    assert len(summary["epoch_analogy_accuracies"].split(",")) == 3
+    assert "mean_pairs_per_second" not in summary
+
+
+def test_deprecated_callbacks(vocab_csv, sample_sentences):
+    c2v_model = c2v.GensimCommunity2Vec(
+        c2v.get_vocabulary(vocab_csv), sample_sentences, 9, 4, vector_size=8, epochs=2
+    )
+    analogies_path = os.path.join(
+        os.path.dirname(c2v.__file__), "resources", "analogies", "subreddit_analogies.txt"
+    )
+    with pytest.deprecated_call():
+        loss_callback = c2v.EpochLossCallback()
+    with pytest.deprecated_call():
+        analogy_callback = c2v.AnalogyAccuracyCallback(analogies_path)
+    c2v_model.w2v_model.train(
+        c2v.SubredditCountSentences(sample_sentences),
+        total_examples=4,
+        epochs=2,
+        compute_loss=True,
+        callbacks=[loss_callback, analogy_callback],
+    )
+    assert [r["epoch"] for r in loss_callback.records] == [1, 2]
+    assert all(r["analogy_accuracy"] is not None for r in analogy_callback.records)
+
+
+@pytest.mark.parametrize("platform,expected_mb", [("linux", 2**10), ("darwin", 1)])
+def test_get_process_rss_mb_fallback(monkeypatch, platform, expected_mb):
+    def no_proc(*args, **kwargs):
+        raise OSError("No /proc")
+
+    monkeypatch.setattr(c2v, "open", no_proc, raising=False)
+    monkeypatch.setattr(c2v.sys, "platform", platform)
+    monkeypatch.setattr(
+        c2v.resource,
+        "getrusage",
+        lambda who: collections.namedtuple("Usage", "ru_maxrss")(2**20),
+    )
+    assert c2v.get_process_rss_mb() == expected_mb
+
+
+def test_calibrate_training_settings(tmp_path, vocab_csv, sample_sentences):
+    sample_path = str(tmp_path / "sample.txt")
+    assert c2v.write_context_sample(sample_sentences, sample_path, num_users=2) == (
+        2,
+        5,
+    )
+    with open(sample_path) as sample_file:
+        assert len(sample_file.readlines()) == 2
+
+    calibration = c2v.load_or_calibrate_training_settings(
+        str(tmp_path / "models"),
+        c2v.get_vocabulary(vocab_csv),
+        sample_sentences,
+        [1, 2],
+        [10, 1000],
+        vector_size=8,
+    )
+    assert len(calibration["results"]) == 4
+    assert calibration["workers"] in [1, 2]
+    assert calibration["batch_words"] in [10, 1000]
+    assert calibration["words_per_second"] == max(
+        r["words_per_second"] for r in calibration["results"]
+    )
+    assert calibration["num_users"] == 4
+    assert (tmp_path / "models" / c2v.CALIBRATION_JSON_NAME).exists()
+
+    # The saved calibration is reused without training again
+    reused = c2v.load_or_calibrate_training_settings(
+        str(tmp_path / "models"), {}, "missing_path", [3], [5]
+    )
+    assert reused == calibration
+
+
+def test_script_rejects_calibrate_with_pair_sampling(tmp_path, vocab_csv, sample_sentences):
+    import subprocess
+    import sys
+
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "ihop.community2vec",
+            "-c",
+            sample_sentences,
+            "-v",
+            vocab_csv,
+            "-o",
+            str(tmp_path),
+            "--pair_sampling",
+            "--calibrate",
+        ],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 2
+    assert "--calibrate can't be used with --pair_sampling" in result.stderr
+    assert not os.path.exists(tmp_path / c2v.CALIBRATION_JSON_NAME)
+
+
+@pytest.fixture
+def sharded_contexts(tmp_path, sample_sentences):
+    import bz2
+
+    shard_dir = tmp_path / "user_contexts"
+    shard_dir.mkdir()
+    with open(sample_sentences) as f:
+        lines = f.readlines()
+    for i, line in enumerate(lines):
+        with bz2.open(shard_dir / f"part-{i:05d}.bz2", "wt") as shard:
+            shard.write(line)
+    (shard_dir / "_SUCCESS").touch()
+    return str(shard_dir), [line.split() for line in lines]
+
+
+def test_sharded_context_sentences(sharded_contexts):
+    shard_dir, expected = sharded_contexts
+    sentences = c2v.ShardedContextSentences(shard_dir, decoders=2, queue_size=2)
+    assert len(sentences.shards) == 4
+    assert list(sentences) == expected
+    assert sentences.epoch_stats[0]["sentences"] == 4
+    assert sentences.epoch_stats[0]["words"] == sum(len(s) for s in expected)
+
+    shuffled = c2v.ShardedContextSentences(shard_dir, decoders=3, shuffle_seed=5)
+    first_epoch = list(shuffled)
+    second_epoch = list(shuffled)
+    assert sorted(map(sorted, first_epoch)) == sorted(map(sorted, expected))
+    assert shuffled.get_shard_order(0) != shuffled.get_shard_order(1)
+    assert first_epoch == list(
+        c2v.ShardedContextSentences(shard_dir, decoders=1, shuffle_seed=5)
+    )
+    assert len(second_epoch) == 4
+    assert shuffled.words_read == 2 * sum(len(s) for s in expected)
+
+
+
+def test_sharded_context_sentences_decoder_error(tmp_path):
+    corrupt_path = tmp_path / "part-00000.bz2"
+    corrupt_path.write_bytes(b"not bzip2 data")
+    with pytest.raises(RuntimeError):
+        list(c2v.ShardedContextSentences(str(corrupt_path)))
+
+
+def exit_without_sentinel(*args):
+    os._exit(1)
+
+
+def test_sharded_context_sentences_decoder_killed(sharded_contexts, monkeypatch):
+    shard_dir, _ = sharded_contexts
+    monkeypatch.setattr(c2v, "decode_context_shards", exit_without_sentinel)
+    monkeypatch.setattr(c2v.ShardedContextSentences, "DECODER_POLL_SECONDS", 0.1)
+    with pytest.raises(RuntimeError, match="exited with code 1"):
+        list(c2v.ShardedContextSentences(shard_dir, decoders=2))
+
+
+def test_train_with_corpus_decoders(sharded_contexts, vocab_csv):
+    shard_dir, _ = sharded_contexts
+    c2v_model = c2v.GensimCommunity2Vec(
+        c2v.get_vocabulary(vocab_csv), shard_dir, 9, 4, vector_size=8, epochs=2
+    )
+    c2v_model.train(epoch_analogies=False, corpus_decoders=2, shuffle_seed=1)
+    assert [r["words"] for r in c2v_model.training_stats] == [26, 26]
@@ -0,0 +1,75 @@
+"""Unit tests for ihop.drift.py
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import scipy.stats
+
+import ihop.community2vec as c2v
+from ihop.drift import (
+    DRIFT_SUMMARY_FILE_NAME,
+    MONTH_PAIR_DRIFT_FILE_NAME,
+    get_cosine_drift,
+    get_neighbor_churn,
+    main,
+)
+
+
+@pytest.fixture
+def model_paths(tmp_path, fixture_dir):
+    c2v_model = c2v.GensimCommunity2Vec(
+        c2v.get_vocabulary(os.path.join(fixture_dir, "vocab.csv")),
+        os.path.join(fixture_dir, "community2vec_sentences.txt"),
+        9,
+        4,
+        vector_size=8,
+        epochs=2,
+    )
+    c2v_model.train(epoch_analogies=False)
+    c2v_model.save(str(tmp_path / "month1"))
+
+    # The second month is the same model in a rotated space
+    rotation = scipy.stats.special_ortho_group.rvs(8, random_state=2)
+    c2v_model.w2v_model.wv.vectors = c2v_model.w2v_model.wv.vectors @ rotation
+    c2v_model.w2v_model.wv.norms = None
+    c2v_model.save(str(tmp_path / "month2"))
+    return {"month1": str(tmp_path / "month1"), "month2": str(tmp_path / "month2")}
+
+
+def test_get_neighbor_churn():
+    start = np.array([[1, 2, 3], [4, 5, 6], [7, 8, 9]])
+    end = np.array([[3, 2, 1], [4, 5, 10], [10, 11, 12]])
+    churn = get_neighbor_churn(start, end, chunk_size=2)
+    assert np.allclose(churn, [0.0, 0.5, 1.0])
+
+
+def test_get_cosine_drift():
+    rng = np.random.default_rng(4)
+    vectors = rng.normal(size=(20, 5))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    rotation = scipy.stats.special_ortho_group.rvs(5, random_state=1)
+    assert np.allclose(get_cosine_drift(vectors, vectors @ rotation), 0.0, atol=1e-6)
+
+    moved = (vectors @ rotation).copy()
+    moved[0] = -moved[0]
+    drift = get_cosine_drift(vectors, moved)
+    assert np.argmax(drift) == 0
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_drift_main(model_paths, tmp_path, workers):
+    output_dir = tmp_path / "drift"
+    main(model_paths, str(output_dir), k=3, workers=workers, chunk_size=4)
+    month_pair_drift = pd.read_parquet(output_dir / MONTH_PAIR_DRIFT_FILE_NAME)
+    assert len(month_pair_drift) == 10
+    assert set(month_pair_drift["start_month"]) == {"month1"}
+    assert set(month_pair_drift["end_month"]) == {"month2"}
+    assert np.allclose(month_pair_drift["cosine_drift"], 0.0, atol=1e-4)
+    assert np.allclose(month_pair_drift["neighbor_churn"], 0.0)
+
+    summary = pd.read_parquet(output_dir / DRIFT_SUMMARY_FILE_NAME)
+    assert len(summary) == 10
+    assert list(summary["num_month_pairs"]) == [1] * 10
+    assert summary["drift_rank"].is_monotonic_increasing
@@ -0,0 +1,67 @@
+"""Unit tests for ihop.embedding_store.py
+"""
+import os
+
+import gensim
+import numpy as np
+import pytest
+import scipy.stats
+
+from ihop.community2vec import VECTORS_FILE_NAME
+from ihop.embedding_store import AlignedEmbeddingStore
+
+
+def save_keyed_vectors(model_dir, keys, vectors):
+    os.makedirs(model_dir, exist_ok=True)
+    kv = gensim.models.KeyedVectors(vectors.shape[1])
+    kv.add_vectors(keys, vectors)
+    kv.save(os.path.join(model_dir, VECTORS_FILE_NAME))
+
+
+@pytest.fixture
+def rotated_models(tmp_path):
+    rng = np.random.default_rng(12)
+    base = rng.normal(size=(6, 4)).astype(np.float32)
+    base /= np.linalg.norm(base, axis=1, keepdims=True)
+    rotation = scipy.stats.special_ortho_group.rvs(4, random_state=3)
+    keys = ["a", "b", "c", "d", "e", "f"]
+    # The first month is missing subreddit 'f' and has an extra subreddit 'g', in a rotated space
+    save_keyed_vectors(
+        tmp_path / "month1",
+        keys[:5] + ["g"],
+        np.vstack([base[:5] @ rotation, rng.normal(size=(1, 4))]).astype(np.float32),
+    )
+    save_keyed_vectors(tmp_path / "month2", keys, base)
+    return {"month1": str(tmp_path / "month1"), "month2": str(tmp_path / "month2")}, base
+
+
+def test_build_aligned_embedding_store(rotated_models, tmp_path):
+    model_paths, base = rotated_models
+    store = AlignedEmbeddingStore.build(model_paths, tmp_path / "store")
+    assert store.reference_month == "month2"
+    assert store.vocabulary == ["a", "b", "c", "d", "e", "f", "g"]
+    assert store.vectors.shape == (2, 7, 4)
+
+    month1_vectors, month1_presence = store.get_month_vectors("month1")
+    assert list(month1_presence) == [True] * 5 + [False, True]
+    assert np.allclose(month1_vectors[:5], base[:5], atol=1e-5)
+    assert np.all(month1_vectors[5] == 0)
+    assert store.get_month_index_to_key("month1") == ["a", "b", "c", "d", "e", "g"]
+
+    loaded = AlignedEmbeddingStore.load(tmp_path / "store")
+    assert isinstance(loaded.vectors, np.memmap)
+    assert loaded.months == ["month1", "month2"]
+    trajectory, presence = loaded.get_trajectory("f")
+    assert list(presence) == [False, True]
+    assert np.allclose(trajectory[1], base[5])
+
+
+def test_build_float16_store(rotated_models, tmp_path):
+    model_paths, _ = rotated_models
+    store = AlignedEmbeddingStore.build(
+        model_paths, tmp_path / "store", reference_month="month1", dtype="float16"
+    )
+    assert store.vectors.dtype == np.float16
+    assert store.reference_month == "month1"
+    with pytest.raises(ValueError):
+        AlignedEmbeddingStore.build(model_paths, tmp_path / "other", "month3")
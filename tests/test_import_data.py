@@ -132,6 +132,32 @@ def test_aggregate_for_vectorization(context_dataframe):
     assert "movies personalfinance" in aggregate_result
 
 
+def test_aggregate_for_vectorization_compressed(context_dataframe):
+    counts_df = aggregate_for_vectorization(
+        context_dataframe, exclude_top_perc=0.0, subreddit_counts=True
+    )
+    counts_result = {
+        x.context_length: sorted(x.subreddit_concat.split())
+        for x in counts_df.collect()
+    }
+    assert counts_result == {
+        4: ["books:1", "fantasy:2", "scifi:1"],
+        2: ["movies:1", "personalfinance:1"],
+    }
+    assert get_corpus_size(counts_df) == (6, 5)
+
+    capped_df = aggregate_for_vectorization(
+        context_dataframe, exclude_top_perc=0.0, max_repeats=1
+    )
+    capped_result = sorted(
+        sorted(x.subreddit_concat.split()) for x in capped_df.collect()
+    )
+    assert capped_result == [
+        ["books", "fantasy", "scifi"],
+        ["movies", "personalfinance"],
+    ]
+
+
 def test_collect_max_context_length(context_dataframe):
     assert (
         collect_max_context_length(
@@ -277,6 +303,73 @@ def test_filter_time_stamp(spark, comments):
     assert joined_with_filter[0].time_to_comment_in_seconds == 50
 
 
+def test_join_with_time_window(spark, comments):
+    submissions_data = [
+        {
+            "id": "73hbg4",
+            "fullname_id": "t3_73hbg4",
+            "selftext": "A question about world building",
+            "title": "D&D world creation question!",
+            "created_utc": 1506815950,
+        },
+        {
+            "id": "73gee6",
+            "fullname_id": "t3_73gee6",
+            "selftext": "An opinion about basketball",
+            "title": "Basketball",
+            "created_utc": 1506815600,
+        },
+    ]
+    submissions_df = spark.createDataFrame(submissions_data)
+    joined = join_submissions_and_comments(
+        submissions_df, comments, max_time_delta=100
+    ).collect()
+    assert len(joined) == 1
+    assert joined[0].id == "73hbg4"
+    assert joined[0].comments_id == "98765a"
+    assert joined[0].time_to_comment_in_seconds == 50
+
+
+def test_salted_join_submissions_and_comments(spark):
+    submissions_df = spark.createDataFrame(
+        [
+            {"id": "a12", "fullname_id": "t3_a12", "title": "Megathread"},
+            {"id": "b12", "fullname_id": "t3_b12", "title": "Quiet thread"},
+        ]
+    )
+    comments_data = [
+        {"link_id": "t3_a12", "body": f"comment {i}", "id": f"a{i}"}
+        for i in range(20)
+    ] + [{"link_id": "t3_b12", "body": "lonely comment", "id": "b0"}]
+    comments_df = spark.createDataFrame(comments_data)
+    assert get_hot_keys(comments_df, "link_id", 5) == ["t3_a12"]
+
+    joined = join_submissions_and_comments(
+        submissions_df,
+        comments_df,
+        skew_threshold=5,
+        num_salts=4,
+        log_partition_stats=True,
+    )
+    assert SALT_COL not in joined.columns
+    assert sorted(joined.columns) == sorted(
+        join_submissions_and_comments(submissions_df, comments_df).columns
+    )
+    results = joined.collect()
+    assert len(results) == 21
+    assert set((r.id, r.comments_id) for r in results) == set(
+        [("a12", f"a{i}") for i in range(20)] + [("b12", "b0")]
+    )
+
+
+def test_log_partition_size_stats(spark):
+    stats = log_partition_size_stats(
+        spark.createDataFrame([{"a": i} for i in range(10)]).repartition(2)
+    )
+    assert stats["partitions"] == 2
+    assert stats["min"] + stats["max"] == 10
+
+
 def test_filter_out_top_users(spark):
     test_df = spark.createDataFrame(
         [
@@ -5,7 +5,15 @@ import pytest
 import numpy as np
 from pyspark.ml.linalg import SparseVector
 
-from ihop.text_processing import SparkCorpus, SparkTextPreprocessingPipeline
+from ihop.text_processing import (
+    HashedVocabulary,
+    LocalTextPreprocessingPipeline,
+    SparkCorpus,
+    SparkTermFrequencyTable,
+    SparkTextPreprocessingPipeline,
+    load_spark_stop_words,
+    select_vocabulary,
+)
 
 
 @pytest.fixture
@@ -211,6 +219,32 @@ def test_save_load_spark_pipeline(simple_vocab_df, tmp_path):
     assert pipeline_to_save.get_id_to_word() == pipeline_to_load.get_id_to_word()
 
 
+def test_hashing_spark_pipeline(simple_vocab_df, tmp_path):
+    pipeline = SparkTextPreprocessingPipeline(
+        "document_text", "vectorized", stopLanguage=None, numFeatures=64
+    )
+    corpus = SparkCorpus(
+        pipeline.fit_transform(simple_vocab_df, sample_fraction=1.0, seed=3)
+    )
+    assert isinstance(pipeline.get_id_to_word(), HashedVocabulary)
+
+    vector_docs = list(corpus.get_vectorized_column_iterator("vectorized"))
+    inv_index = pipeline.get_word_to_id()
+    a_id = inv_index["a"]
+    b_id = inv_index["b"]
+    assert all(0 <= i < 64 for i in [a_id, b_id])
+    assert vector_docs[0][1] == [(a_id, 3.0)]
+    assert vector_docs[1][1] == [(b_id, 3.0)]
+    assert pipeline.get_id_to_word()[a_id] in {"a", "a|b", "b|a"}
+    unused_bucket = min(set(range(64)) - {a_id, b_id})
+    assert pipeline.get_id_to_word()[unused_bucket] == f"bucket_{unused_bucket}"
+
+    pipeline.save(tmp_path)
+    pipeline_to_load = SparkTextPreprocessingPipeline.load(tmp_path)
+    assert pipeline_to_load.get_id_to_word() == pipeline.get_id_to_word()
+    assert pipeline_to_load.get_word_to_id() == inv_index
+
+
 def test_corpus_functions(simple_corpus):
     assert simple_corpus.collect_column_to_list("tokenized") == [
         ["a"] * 3,
@@ -221,3 +255,181 @@ def test_corpus_functions(simple_corpus):
     expected_vectorized = [[(0, 3.0)], [(1, 3.0)], [(0, 2.0), (1, 1.0)]]
     for i, l in enumerate(collect_vectorized):
         assert l == expected_vectorized[i]
+
+
+def test_load_spark_stop_words():
+    stop_words = load_spark_stop_words()
+    assert "the" in stop_words
+    assert "this" in stop_words
+    assert "sentence" not in stop_words
+
+
+def test_select_vocabulary():
+    doc_freqs = {"a": 3, "b": 2, "c": 1, "d": 2}
+    term_freqs = {"a": 10, "b": 4, "c": 1, "d": 4}
+    assert select_vocabulary(doc_freqs, term_freqs, 4, 0.0, 1000, 10) == [
+        "a",
+        "b",
+        "d",
+        "c",
+    ]
+    assert select_vocabulary(doc_freqs, term_freqs, 4, 2, 0.6, 10) == ["b", "d"]
+    assert select_vocabulary(doc_freqs, term_freqs, 4, 0.0, 1000, 2) == ["a", "b"]
+    with pytest.raises(ValueError):
+        select_vocabulary(doc_freqs, term_freqs, 4, 3, 2, 10)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_local_pipeline_matches_spark(corpus, workers):
+    spark_pipeline = SparkTextPreprocessingPipeline(
+        "document_text", "vectorized", maxDF=1000, minDF=0.0
+    )
+    spark_results = sorted(
+        spark_pipeline.fit_transform(corpus.document_dataframe).collect(),
+        key=lambda x: x.id,
+    )
+    local_pipeline = LocalTextPreprocessingPipeline(
+        "document_text", "vectorized", maxDF=1000, minDF=0.0, workers=workers, chunk_size=2
+    )
+    local_results = local_pipeline.fit_transform([r.document_text for r in spark_results])
+    assert local_results.shape == (4, len(spark_pipeline.get_id_to_word()))
+    assert set(local_pipeline.get_id_to_word().values()) == set(
+        spark_pipeline.get_id_to_word().values()
+    )
+
+    spark_id_to_word = spark_pipeline.get_id_to_word()
+    for i, row in enumerate(spark_results):
+        spark_counts = {
+            spark_id_to_word[int(j)]: v
+            for j, v in zip(row.vectorized.indices, row.vectorized.values)
+        }
+        local_row = local_results.getrow(i)
+        local_counts = {
+            local_pipeline.get_id_to_word()[j]: v
+            for j, v in zip(local_row.indices, local_row.data)
+        }
+        assert spark_counts == local_counts
+
+
+def test_local_pipeline_idf(simple_vocab_df):
+    documents = ["a a a", "b b b", "a a b"]
+    spark_pipeline = SparkTextPreprocessingPipeline(
+        "document_text", stopLanguage=None, minDF=0.0, maxDF=1000, useIDF=True
+    )
+    spark_results = sorted(
+        spark_pipeline.fit_transform(simple_vocab_df).collect(), key=lambda x: x.id
+    )
+    local_pipeline = LocalTextPreprocessingPipeline(
+        stopLanguage=None, minDF=0.0, maxDF=1000, useIDF=True
+    )
+    local_results = local_pipeline.fit_transform(documents).toarray()
+    spark_id_to_word = spark_pipeline.get_id_to_word()
+    local_word_to_id = local_pipeline.get_word_to_id()
+    for i, row in enumerate(spark_results):
+        for j, v in zip(row.vectorized.indices, row.vectorized.values):
+            assert np.isclose(local_results[i, local_word_to_id[spark_id_to_word[j]]], v)
+
+
+def test_save_load_local_pipeline(tmp_path):
+    documents = ["a a a", "b b b", "a a b"]
+    pipeline_to_save = LocalTextPreprocessingPipeline(
+        stopLanguage=None, minDF=0.0, useIDF=True
+    )
+    vectorized = pipeline_to_save.fit_transform(documents)
+    pipeline_to_save.save(tmp_path)
+
+    pipeline_to_load = LocalTextPreprocessingPipeline.load(tmp_path)
+    assert pipeline_to_load.get_param_maps() == pipeline_to_save.get_param_maps()
+    assert pipeline_to_load.get_id_to_word() == pipeline_to_save.get_id_to_word()
+    assert (pipeline_to_load.transform(documents) != vectorized).nnz == 0
+
+
+def test_local_pipeline_loads_spark_params(simple_vocab_df, tmp_path):
+    spark_pipeline = SparkTextPreprocessingPipeline("document_text", minDF=0.0)
+    spark_pipeline.fit_transform(simple_vocab_df)
+    spark_pipeline.save(tmp_path)
+
+    local_pipeline = LocalTextPreprocessingPipeline.load(tmp_path)
+    assert local_pipeline.vocabulary is None
+    assert local_pipeline.get_param_maps() == {
+        k: v if k == "stages" else {p: v[p] for p in local_pipeline.get_param_maps()[k]}
+        for k, v in spark_pipeline.get_param_maps().items()
+    }
+    local_pipeline.fit_transform(["a a a", "b b b", "a a b"])
+    assert set(local_pipeline.get_id_to_word().values()) == set(
+        spark_pipeline.get_id_to_word().values()
+    )
+
+
+def test_term_frequency_table(spark, tmp_path):
+    month_1 = spark.createDataFrame(
+        [{"tokensNoStopWords": t} for t in [["a", "a", "b"], ["a", "c"], ["c"]]]
+    )
+    month_2 = spark.createDataFrame(
+        [{"tokensNoStopWords": t} for t in [["b", "b", "b"], ["d"]]]
+    )
+    table = SparkTermFrequencyTable(tmp_path)
+    table.add_month("2021-01", month_1)
+    table.add_month("2021-02", month_1)
+    # Re-adding a month replaces it
+    table.add_month("2021-02", month_2)
+
+    table = SparkTermFrequencyTable(tmp_path)
+    assert table.months == ["2021-01", "2021-02"]
+    assert table.get_num_docs() == 5
+    frequencies = {
+        r.term: (r.df, r.tf) for r in table.get_term_frequencies(spark).collect()
+    }
+    assert frequencies == {"a": (2, 3), "b": (2, 4), "c": (2, 2), "d": (1, 1)}
+    assert table.select_vocabulary(spark, minDF=0.0, maxDF=1000) == [
+        "b",
+        "a",
+        "c",
+        "d",
+    ]
+    assert table.select_vocabulary(spark, minDF=2, maxDF=1000, vocabSize=2) == [
+        "b",
+        "a",
+    ]
+    assert table.select_vocabulary(spark, ["2021-01"], minDF=0.0, maxDF=1000) == [
+        "a",
+        "c",
+        "b",
+    ]
+    with pytest.raises(ValueError):
+        table.select_vocabulary(spark, ["2021-03"])
+
+
+def test_term_frequency_table_vocabulary_matches_spark(corpus, spark, tmp_path):
+    pipeline = SparkTextPreprocessingPipeline(
+        "document_text", "vectorized", maxDF=1000, minDF=0.0
+    )
+    transformed_corpus = pipeline.fit_transform(corpus.document_dataframe)
+
+    table = SparkTermFrequencyTable(tmp_path)
+    table.add_month(
+        "2021-01",
+        pipeline.tokenize(corpus.document_dataframe),
+        pipeline.vectorizer_input_col,
+    )
+    vocabulary = table.select_vocabulary(spark, minDF=0.0, maxDF=1000)
+    assert set(vocabulary) == set(pipeline.get_id_to_word().values())
+
+    fixed_pipeline = SparkTextPreprocessingPipeline(
+        "document_text", "vectorized", vocabulary=vocabulary
+    )
+    fixed_transformed = fixed_pipeline.fit_transform(corpus.document_dataframe)
+    fixed_id_to_word = fixed_pipeline.get_id_to_word()
+    assert fixed_id_to_word == dict(enumerate(vocabulary))
+    id_to_word = pipeline.get_id_to_word()
+    for row, fixed_row in zip(
+        transformed_corpus.orderBy("id").collect(),
+        fixed_transformed.orderBy("id").collect(),
+    ):
+        assert {
+            id_to_word[i]: v
+            for i, v in zip(row.vectorized.indices, row.vectorized.values)
+        } == {
+            fixed_id_to_word[i]: v
+            for i, v in zip(fixed_row.vectorized.indices, fixed_row.vectorized.values)
+        }
@@ -1,9 +1,11 @@
 """Tests for ihop.visualizations
 """
 import json
+import os
 
 import pandas as pd
 
+import ihop.community2vec as c2v
 import ihop.visualizations as iv
 
 
@@ -59,3 +61,25 @@ def test_assign_other_category_column_no_selection():
     )
     assert list(new_df["display_clusters"]) == ["2", "2", "4"]
 
+
+
+def test_generate_tsne_dataframe(tmp_path, fixture_dir):
+    c2v_model = c2v.GensimCommunity2Vec(
+        c2v.get_vocabulary(os.path.join(fixture_dir, "vocab.csv")),
+        os.path.join(fixture_dir, "community2vec_sentences.txt"),
+        9,
+        4,
+        vector_size=8,
+        epochs=2,
+    )
+    c2v_model.train(epoch_analogies=False)
+    c2v_model.save(str(tmp_path))
+    tsne_df = iv.generate_tsne_dataframe(str(tmp_path), perplexity=3)
+    assert list(tsne_df.columns) == ["subreddit", "tsne_1", "tsne_2"]
+    assert list(tsne_df["subreddit"]) == c2v_model.get_index_to_key()
+    assert tsne_df["tsne_1"].dtype == "float32"
+
+    float64_df = iv.generate_tsne_dataframe(
+        str(tmp_path), perplexity=3, dtype="float64"
+    )
+    assert float64_df.shape == tsne_df.shape